@@ -0,0 +1,115 @@
+"""
+Benchmark the per-row cost of verifying and parsing manifest fields (what
+indexing does for every row), comparing the previous implementation (compiling
+the format on every call and building strings a character at a time) with the
+compiled, cached validators and list parsing in gen3.utils.
+
+Usage:
+    python benchmarks/manifest_parsing.py [--rows 1000000]
+"""
+import argparse
+import re
+import time
+
+from gen3.utils import (
+    ACL_FORMAT,
+    AUTHZ_FORMAT,
+    MD5_FORMAT,
+    SIZE_FORMAT,
+    URL_FORMAT,
+    _parse_list_str,
+    _standardize_str,
+    _verify_format,
+)
+
+FORMATS = {
+    "md5": MD5_FORMAT,
+    "size": SIZE_FORMAT,
+    "acl": ACL_FORMAT,
+    "urls": URL_FORMAT,
+    "authz": AUTHZ_FORMAT,
+}
+LIST_FIELDS = ("urls", "acl", "authz")
+
+
+def _previous_verify_format(s, format):
+    r = re.compile(format)
+    if r.match(s) is not None:
+        return True
+    return False
+
+
+def _previous_standardize_str(s):
+    memory = []
+    s = s.replace(",", " ")
+    res = ""
+    for c in s:
+        if c != " ":
+            res += c
+            memory = []
+        elif not memory:
+            res += c
+            memory.append(" ")
+    return res
+
+
+def _previous_parse_list_str(s):
+    return [
+        element.strip().replace("'", "").replace('"', "").replace("%20", " ")
+        for element in _previous_standardize_str(s)
+        .strip()
+        .lstrip("[")
+        .rstrip("]")
+        .split(" ")
+    ]
+
+
+def _previous_parse_row(row):
+    for field, format in FORMATS.items():
+        _previous_verify_format(row[field], format)
+    for field in LIST_FIELDS:
+        _previous_parse_list_str(row[field])
+    _previous_standardize_str(row["file_name"])
+
+
+def _parse_row(row):
+    for field, format in FORMATS.items():
+        _verify_format(row[field], format)
+    for field in LIST_FIELDS:
+        _parse_list_str(row[field], unescape_spaces=True)
+    _standardize_str(row["file_name"])
+
+
+def _rows(count):
+    for i in range(count):
+        yield {
+            "md5": f"{i:032x}",
+            "size": str(i * 1024),
+            "acl": "['phs0001', 'phs0002']",
+            "urls": f"[s3://bucket/path/to/file_{i}.bam, gs://bucket/path/to/file_{i}.bam]",
+            "authz": "/programs/DEV/projects/test",
+            "file_name": f"file_{i}.bam",
+        }
+
+
+def _run(label, parse_row, rows):
+    start = time.perf_counter()
+    for row in _rows(rows):
+        parse_row(row)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<25} {elapsed:>8.2f}s total {elapsed / rows * 1e6:>8.2f} us/row")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    # cost of generating the rows, not included in either implementation
+    _run("generating rows only", lambda row: None, args.rows)
+    _run("previous", _previous_parse_row, args.rows)
+    _run("compiled and cached", _parse_row, args.rows)
+
+
+if __name__ == "__main__":
+    main()
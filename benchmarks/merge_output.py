@@ -0,0 +1,91 @@
+"""
+Benchmark writing the merged manifest in merge_guids_into_metadata, comparing
+the previous implementation (reopening the output file for every row with
+append_row_to_file) with the buffered single file handle, then run a whole
+merge of manifests with the given number of rows.
+
+Usage:
+    python benchmarks/merge_output.py [--rows 1000000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from gen3.tools.merge import (
+    _MergedManifestWriter,
+    append_row_to_file,
+    merge_guids_into_metadata,
+    write_header_to_file,
+)
+
+FIELDNAMES = ["guid", "submitted_sample_id", "dbgap_subject_id", "body_site"]
+
+
+def _rows(count):
+    for i in range(count):
+        yield {
+            "guid": f"dg.TEST/{i:08d}",
+            "submitted_sample_id": f"NWD{i:07d}",
+            "dbgap_subject_id": str(i),
+            "body_site": "Blood",
+        }
+
+
+def _previous_write(filename, rows, **kwargs):
+    write_header_to_file(filename, FIELDNAMES)
+    for row in _rows(rows):
+        append_row_to_file(filename, row, FIELDNAMES)
+
+
+def _buffered_write(filename, rows, **kwargs):
+    with _MergedManifestWriter(filename, FIELDNAMES, **kwargs) as output_file:
+        for row in _rows(rows):
+            output_file.writerow(row)
+
+
+def _run(label, function, *args, **kwargs):
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<25} {elapsed:>8.2f}s")
+
+
+def _write_manifests(directory, rows):
+    indexing_manifest = os.path.join(directory, "indexing.tsv")
+    with open(indexing_manifest, "w") as f:
+        f.write("guid\tsample_id\tmd5\n")
+        for i in range(rows):
+            f.write(f"dg.TEST/{i:08d}\tNWD{i:07d}\t{i:032x}\n")
+    metadata_manifest = os.path.join(directory, "metadata.tsv")
+    with open(metadata_manifest, "w") as f:
+        f.write("submitted_sample_id\tdbgap_subject_id\tbody_site\n")
+        for i in range(rows):
+            f.write(f"NWD{i:07d}\t{i}\tBlood\n")
+    return indexing_manifest, metadata_manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "merged.tsv")
+        _run("previous", _previous_write, output, args.rows)
+        _run("buffered", _buffered_write, output, args.rows)
+        _run("buffered, gzip", _buffered_write, output, args.rows, compression="gzip")
+
+        indexing_manifest, metadata_manifest = _write_manifests(directory, args.rows)
+        _run(
+            "whole merge",
+            merge_guids_into_metadata,
+            indexing_manifest,
+            metadata_manifest,
+            output_filename=output,
+            include_all_indexing_cols_in_output=False,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark requests/sec of the synchronous service clients against a local stub
+server, comparing one connection per call (module-level requests.get, what the
+clients used to do) with the pooled requests.Session the clients now share.
+
+Usage:
+    python benchmarks/session_pooling.py [--requests 2000] [--threads 8]
+"""
+import argparse
+import http.server
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from gen3.metadata import Gen3Metadata
+
+
+class _StubHandler(http.server.BaseHTTPRequestHandler):
+    # HTTP/1.1 so connections are kept alive between requests
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes, don't let Nagle delay the body
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b'{"guid": "stub"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _StubServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+def _run(label, get, total, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for _ in executor.map(get, range(total)):
+            pass
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {total / elapsed:>10.1f} requests/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    server = _StubServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://localhost:{server.server_address[1]}"
+    url = f"{endpoint}/metadata/stub"
+
+    try:
+        _run(
+            "new connection per request",
+            lambda _: requests.get(url).raise_for_status(),
+            args.requests,
+            args.threads,
+        )
+        with Gen3Metadata(endpoint, pool_maxsize=args.threads) as mds:
+            _run(
+                "pooled session (Gen3Metadata)",
+                lambda _: mds.get("stub"),
+                args.requests,
+                args.threads,
+            )
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
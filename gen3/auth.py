@@ -1,7 +1,21 @@
+import aiohttp
+import asyncio
+import base64
 import json
 from requests.auth import AuthBase
 import os
 import requests
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, cache file won't be locked
+    fcntl = None
+
+
+# refresh access tokens this many seconds before they actually expire
+TOKEN_EXPIRATION_BUFFER = 60
 
 
 class Gen3AuthError(Exception):
@@ -13,13 +27,22 @@ class Gen3Auth(AuthBase):
 
     Implements requests.auth.AuthBase in order to support JWT authentication.
     Generates access tokens from the provided refresh token file or string.
-    Automatically refreshes access tokens when they expire.
+    Automatically refreshes access tokens shortly before they expire, and when
+    a request fails with a 401/403. Refreshing is thread-safe, concurrent
+    requests wait for a single new token.
+
+    For aiohttp, which doesn't support custom auth, use the Authorization header
+    from async_get_auth_header(), which refreshes tokens without blocking the
+    event loop.
 
     Args:
         endpoint (str, opt): The URL of the data commons. Optional if working in a Gen3 Workspace.
         refresh_file (str, opt): The file containing the downloaded JSON web token. Optional if working in a Gen3 Workspace.
         refresh_token (str, opt): The JSON web token. Optional if working in a Gen3 Workspace.
         idp (str, opt): If working in a Gen3 Workspace, the IDP to use can be specified.
+        token_cache_file (str, opt): File to cache the access token in so that
+            multiple processes using the same credentials share one token instead
+            of each getting their own. Access is serialized with a lock file.
 
     Examples:
         This generates the Gen3Auth class pointed at the sandbox commons while
@@ -32,12 +55,25 @@ class Gen3Auth(AuthBase):
         >>> auth = Gen3Auth()
     """
 
-    def __init__(self, endpoint=None, refresh_file=None, refresh_token=None, idp=None):
+    def __init__(
+        self,
+        endpoint=None,
+        refresh_file=None,
+        refresh_token=None,
+        idp=None,
+        token_cache_file=None,
+    ):
         self._endpoint = endpoint
         self._refresh_file = refresh_file
         self._refresh_token = refresh_token
         self._wts_idp = idp
         self._access_token = None
+        self._access_token_exp = None
+        self._invalid_access_token = None
+        self._token_lock = threading.Lock()
+        self._async_token_lock = None
+        self._async_token_lock_loop = None
+        self._token_cache_file = token_cache_file
 
         self._use_wts = False
         self._wts_url = None
@@ -95,6 +131,18 @@ class Gen3Auth(AuthBase):
         request.register_hook("response", self._handle_401)
         return request
 
+    def __getstate__(self):
+        # locks can't be pickled, e.g. when passing this to a subprocess
+        state = self.__dict__.copy()
+        del state["_token_lock"]
+        state["_async_token_lock"] = None
+        state["_async_token_lock_loop"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._token_lock = threading.Lock()
+
     def _handle_401(self, response, **kwargs):
         """Handles failed requests when authorization failed.
 
@@ -116,7 +164,10 @@ class Gen3Auth(AuthBase):
         # copy the request to resend
         newreq = response.request.copy()
 
-        self._access_token = None
+        # only drop the token the request failed with, another thread may have
+        # already replaced it with a new one
+        failed_auth_value = response.request.headers.get("Authorization", "")
+        self._invalidate_access_token(failed_auth_value[len("Bearer ") :])
         newreq.headers["Authorization"] = self._get_auth_value()
 
         _response = response.connection.send(newreq, **kwargs)
@@ -129,34 +180,216 @@ class Gen3Auth(AuthBase):
         """Returns the Authorization header value for the request
 
         This gets called when added the Authorization header to the request.
-        This fetches the access token from the refresh token if the access token is missing.
+        This fetches the access token from the refresh token if the access token is
+        missing or about to expire.
 
         """
-        if not self._access_token:
-            if self._use_wts:
-                # attempt to get a token from the workspace-token-service
-                auth_url = "{}/token/".format(self._wts_url)
-                if self._wts_idp:
-                    auth_url += "?idp={}".format(self._wts_idp)
-                resp = requests.get(auth_url)
-                err_msg = "Failed to get an access token from WTS at {}:\n{}"
-                token_key = "token"
-            else:
-                # attempt to get a token from Fence
-                auth_url = "{}/user/credentials/cdis/access_token".format(
-                    self._endpoint
-                )
-                resp = requests.post(auth_url, json=self._refresh_token)
-                err_msg = "Failed to get an access token from Fence at {}:\n{}"
-                token_key = "access_token"
+        access_token = self._access_token
+        if not _is_token_usable(access_token, self._access_token_exp):
+            with self._token_lock:
+                # another thread may have refreshed it while we waited
+                if not _is_token_usable(self._access_token, self._access_token_exp):
+                    if self._token_cache_file:
+                        self._refresh_access_token_with_cache()
+                    else:
+                        self._set_access_token(self._fetch_access_token())
+                access_token = self._access_token
+
+        return "Bearer " + access_token
+
+    async def async_get_auth_header(self, session=None):
+        """Returns the Authorization header for an aiohttp request
+
+        Fetches a new access token if it's missing or about to expire, without
+        blocking the event loop. Only one coroutine fetches the token, the rest
+        wait for it.
 
-            assert resp.status_code == 200, err_msg.format(auth_url, resp.text)
+        Args:
+            session (aiohttp.ClientSession, optional): session to request a new
+                token with, a temporary one is used if not provided
+
+        Returns:
+            dict: {"Authorization": "Bearer <access token>"}
+        """
+        access_token = self._access_token
+        if not _is_token_usable(access_token, self._access_token_exp):
+            async with self._get_async_token_lock():
+                access_token = self._access_token
+                if not _is_token_usable(access_token, self._access_token_exp):
+                    if self._token_cache_file:
+                        # file locks block, so wait for them in a thread
+                        loop = asyncio.get_event_loop()
+                        auth_value = await loop.run_in_executor(
+                            None, self._get_auth_value
+                        )
+                        access_token = auth_value[len("Bearer ") :]
+                    else:
+                        access_token = await self._async_fetch_access_token(session)
+                        with self._token_lock:
+                            self._set_access_token(access_token)
+
+        return {"Authorization": "Bearer " + access_token}
+
+    def _get_async_token_lock(self):
+        """asyncio locks can only be used in the event loop they're created in"""
+        loop = asyncio.get_event_loop()
+        if self._async_token_lock is None or self._async_token_lock_loop is not loop:
+            self._async_token_lock = asyncio.Lock()
+            self._async_token_lock_loop = loop
+        return self._async_token_lock
+
+    def _invalidate_access_token(self, access_token):
+        """Forget the given access token, if it's still the current one, so the
+        next request gets a new one (without reading it back from the cache file).
+        """
+        with self._token_lock:
+            if access_token == self._access_token:
+                self._access_token = None
+                self._access_token_exp = None
+            self._invalid_access_token = access_token
+
+    def _set_access_token(self, access_token):
+        self._access_token = access_token
+        self._access_token_exp = _get_token_expiration(access_token)
+
+    def _refresh_access_token_with_cache(self):
+        """Use the token from the cache file if it's still good, otherwise get a
+        new one and cache it. Holds an exclusive lock on the cache for the whole
+        time so other processes wait for this token instead of getting their own.
+        """
+        with open(self._token_cache_file + ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
             try:
-                json_resp = resp.json()
-                self._access_token = json_resp[token_key]
-            except ValueError:  # cannot parse JSON
-                raise Gen3AuthError(err_msg.format(auth_url, resp.text))
-            except KeyError:  # no access_token in JSON response
-                raise Gen3AuthError(err_msg.format(auth_url, json_resp))
-
-        return "Bearer " + self._access_token
+                cached_token = None
+                try:
+                    with open(self._token_cache_file) as cache_file:
+                        cached_token = json.load(cache_file).get("access_token")
+                except (OSError, ValueError, AttributeError):
+                    pass
+
+                if cached_token != self._invalid_access_token and _is_token_usable(
+                    cached_token, _get_token_expiration(cached_token)
+                ):
+                    self._set_access_token(cached_token)
+                    return
+
+                self._set_access_token(self._fetch_access_token())
+                _write_private_file(
+                    self._token_cache_file,
+                    json.dumps({"access_token": self._access_token}),
+                )
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _fetch_access_token(self):
+        """Get a new access token from the WTS in a workspace, or Fence otherwise
+
+        Returns:
+            str: access token
+        """
+        if self._use_wts:
+            # attempt to get a token from the workspace-token-service
+            auth_url = "{}/token/".format(self._wts_url)
+            if self._wts_idp:
+                auth_url += "?idp={}".format(self._wts_idp)
+            resp = requests.get(auth_url)
+            err_msg = "Failed to get an access token from WTS at {}:\n{}"
+            token_key = "token"
+        else:
+            # attempt to get a token from Fence
+            auth_url = "{}/user/credentials/cdis/access_token".format(self._endpoint)
+            resp = requests.post(auth_url, json=self._refresh_token)
+            err_msg = "Failed to get an access token from Fence at {}:\n{}"
+            token_key = "access_token"
+
+        assert resp.status_code == 200, err_msg.format(auth_url, resp.text)
+        try:
+            json_resp = resp.json()
+            return json_resp[token_key]
+        except ValueError:  # cannot parse JSON
+            raise Gen3AuthError(err_msg.format(auth_url, resp.text))
+        except KeyError:  # no access_token in JSON response
+            raise Gen3AuthError(err_msg.format(auth_url, json_resp))
+
+    async def _async_fetch_access_token(self, session=None):
+        """Asynchronously get a new access token from the WTS in a workspace, or
+        Fence otherwise
+
+        Args:
+            session (aiohttp.ClientSession, optional): session to make the request
+                with, a temporary one is used if not provided
+
+        Returns:
+            str: access token
+        """
+        if session is None:
+            async with aiohttp.ClientSession() as session:
+                return await self._async_fetch_access_token(session)
+
+        if self._use_wts:
+            # attempt to get a token from the workspace-token-service
+            auth_url = "{}/token/".format(self._wts_url)
+            if self._wts_idp:
+                auth_url += "?idp={}".format(self._wts_idp)
+            request = session.get(auth_url)
+            err_msg = "Failed to get an access token from WTS at {}:\n{}"
+            token_key = "token"
+        else:
+            # attempt to get a token from Fence
+            auth_url = "{}/user/credentials/cdis/access_token".format(self._endpoint)
+            request = session.post(auth_url, json=self._refresh_token)
+            err_msg = "Failed to get an access token from Fence at {}:\n{}"
+            token_key = "access_token"
+
+        async with request as resp:
+            text = await resp.text()
+
+        if resp.status != 200:
+            raise Gen3AuthError(err_msg.format(auth_url, text))
+        try:
+            json_resp = json.loads(text)
+            return json_resp[token_key]
+        except ValueError:  # cannot parse JSON
+            raise Gen3AuthError(err_msg.format(auth_url, text))
+        except KeyError:  # no access_token in JSON response
+            raise Gen3AuthError(err_msg.format(auth_url, json_resp))
+
+
+def _get_token_expiration(token):
+    """Returns the "exp" claim of the given JWT, without verifying it
+
+    Args:
+        token (str): JWT
+
+    Returns:
+        int: expiration as seconds since the epoch, None if it can't be decoded
+    """
+    try:
+        payload = token.split(".")[1]
+        # base64url without padding
+        payload += "=" * (-len(payload) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except Exception:
+        return None
+
+
+def _is_token_usable(token, expiration):
+    """Returns whether the token exists and won't expire too soon. Tokens with an
+    unknown expiration are used until a request fails with them.
+    """
+    if not token:
+        return False
+    if expiration is None:
+        return True
+    return time.time() + TOKEN_EXPIRATION_BUFFER < expiration
+
+
+def _write_private_file(filename, content):
+    """Atomically replace the file with the content, readable only by the user"""
+    tmp_filename = "{}.{}.tmp".format(filename, os.getpid())
+    fd = os.open(tmp_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as tmp_file:
+        tmp_file.write(content)
+    os.replace(tmp_filename, filename)
@@ -1,12 +1,14 @@
 import json
 import requests
 
+from gen3.utils import DEFAULT_MAX_RETRIES, DEFAULT_POOL_MAXSIZE, SessionMixin
+
 
 class Gen3FileError(Exception):
     pass
 
 
-class Gen3File:
+class Gen3File(SessionMixin):
     """For interacting with Gen3 file management features.
 
     A class for interacting with the Gen3 file download services.
@@ -15,6 +17,11 @@ class Gen3File:
     Args:
         endpoint (str): The URL of the data commons.
         auth_provider (Gen3Auth): A Gen3Auth class instance.
+        session (requests.Session): session to make requests with instead of
+            creating one, it is NOT closed by this class
+        pool_maxsize (int): maximum number of connections kept alive per host
+        max_retries (int): retries for connection errors and 502/503/504
+            responses, 0 to disable
 
     Examples:
         This generates the Gen3File class pointed at the sandbox commons while
@@ -26,9 +33,17 @@ class Gen3File:
 
     """
 
-    def __init__(self, endpoint, auth_provider):
+    def __init__(
+        self,
+        endpoint,
+        auth_provider,
+        session=None,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        max_retries=DEFAULT_MAX_RETRIES,
+    ):
         self._auth_provider = auth_provider
         self._endpoint = endpoint
+        self._init_session(session, pool_maxsize, max_retries)
 
     def get_presigned_url(self, guid, protocol="http"):
         """Generates a presigned URL for a file.
@@ -47,7 +62,7 @@ class Gen3File:
         api_url = "{}/user/data/download/{}?protocol={}".format(
             self._endpoint, guid, protocol
         )
-        output = requests.get(api_url, auth=self._auth_provider).text
+        output = self._session.get(api_url, auth=self._auth_provider).text
         try:
             data = json.loads(output)
         except:
@@ -1,23 +1,37 @@
 import aiohttp
+import asyncio
 import backoff
 import requests
 import urllib.parse
 import logging
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 import indexclient.client as client
 
-from gen3.utils import DEFAULT_BACKOFF_SETTINGS
+from gen3.utils import (
+    AsyncSessionMixin,
+    DEFAULT_ASYNC_KEEPALIVE_TIMEOUT,
+    DEFAULT_ASYNC_MAX_CONNECTIONS_PER_HOST,
+    DEFAULT_BACKOFF_SETTINGS,
+)
 
 
-class Gen3Index:
+class Gen3Index(AsyncSessionMixin):
     """
 
     A class for interacting with the Gen3 Index services.
 
+    The async_* methods share a single pooled aiohttp session, use the instance
+    as an async context manager (or call async_close()) to clean it up.
+
     Args:
         endpoint (str): The URL of the data commons.
         auth_provider (Gen3Auth): A Gen3Auth class instance.
+        async_session (aiohttp.ClientSession): session for async_* methods to
+            use instead of creating their own, it is NOT closed by this class
+        max_connections_per_host (int): pool size for the async session
+        keepalive_timeout (float): seconds to keep idle async connections open
 
     Examples:
         This generates the Gen3Index class pointed at the sandbox commons while
@@ -29,7 +43,15 @@ class Gen3Index:
 
     """
 
-    def __init__(self, endpoint, auth_provider=None, service_location="index"):
+    def __init__(
+        self,
+        endpoint,
+        auth_provider=None,
+        service_location="index",
+        async_session=None,
+        max_connections_per_host=DEFAULT_ASYNC_MAX_CONNECTIONS_PER_HOST,
+        keepalive_timeout=DEFAULT_ASYNC_KEEPALIVE_TIMEOUT,
+    ):
         endpoint = endpoint.strip("/")
         # if running locally, indexd is deployed by itself without a location relative
         # to the commons
@@ -40,6 +62,9 @@ class Gen3Index:
             endpoint += "/" + service_location
 
         self.client = client.IndexClient(endpoint, auth=auth_provider)
+        self._init_async_session(
+            async_session, max_connections_per_host, keepalive_timeout
+        )
 
     ### Get Requests
     def is_healthy(self):
@@ -77,50 +102,132 @@ class Gen3Index:
         response.raise_for_status()
         return response.json()
 
-    @backoff.on_exception(backoff.expo, Exception, **DEFAULT_BACKOFF_SETTINGS)
     def get_all_records(self, limit=None, paginate=False, start=None):
         """
 
         Get a list of all records
 
+        NOTE: with paginate, every record is kept in memory, use iter_all_records
+              to stream them instead
+
+        Args:
+            limit (int): page size
+            paginate (bool): whether to get every page or only the first one
+            start (str): only get records with a did after this one
+
         """
-        all_records = []
-        url = "index/"
+        if paginate:
+            return list(self.iter_all_records(limit=limit, start=start))
 
-        if limit:
-            url += f"?limit={limit}"
+        return self._get_records_after(start, limit)
 
-        response = self.client._get(url)
-        response.raise_for_status()
+    def iter_all_records(self, limit=None, start=None):
+        """
+
+        Generator of all records, requested page by page (ordered by did) so that
+        only a couple pages are in memory at a time. The next page is requested
+        in the background while the current one is being processed.
 
-        records = response.json().get("records")
-        all_records.extend(records)
+        Args:
+            limit (int): page size
+            start (str): only get records with a did after this one, e.g. the last
+                did processed to resume
 
-        if paginate and records:
-            previous_did = None
-            start_did = records[-1].get("did")
+        Yields:
+            dict: indexd record
 
-            while start_did != previous_did:
-                previous_did = start_did
+        """
+        executor = ThreadPoolExecutor(max_workers=1)
+        next_page = executor.submit(self._get_records_after, start, limit)
+        try:
+            while True:
+                records = next_page.result()
+                if not records:
+                    break
 
-                params = {"start": f"{start_did}"}
-                url_parts = list(urllib.parse.urlparse(url))
-                query = dict(urllib.parse.parse_qsl(url_parts[4]))
-                query.update(params)
+                next_page = executor.submit(
+                    self._get_records_after, records[-1].get("did"), limit
+                )
+                yield from records
+        finally:
+            # if the generator was closed early, a request for the next page may
+            # already be running and can't be cancelled: let it finish in the
+            # background (its page is discarded) instead of waiting for it
+            next_page.cancel()
+            executor.shutdown(wait=False)
 
-                url_parts[4] = urllib.parse.urlencode(query)
+    async def async_iter_all_records(self, limit=None, start=None, _ssl=None):
+        """
 
-                url = urllib.parse.urlunparse(url_parts)
-                response = self.client._get(url)
-                response.raise_for_status()
+        Asynchronous generator of all records, requested page by page (ordered by
+        did) so that only a couple pages are in memory at a time. The next page is
+        requested while the current one is being processed.
 
-                records = response.json().get("records")
-                all_records.extend(records)
+        Args:
+            limit (int): page size
+            start (str): only get records with a did after this one, e.g. the last
+                did processed to resume
 
-                if records:
-                    start_did = response.json().get("records")[-1].get("did")
+        Yields:
+            dict: indexd record
 
-        return all_records
+        """
+        next_page = asyncio.ensure_future(
+            self._async_get_records_after(start, limit, _ssl)
+        )
+        try:
+            while True:
+                records = await next_page
+                if not records:
+                    break
+
+                next_page = asyncio.ensure_future(
+                    self._async_get_records_after(records[-1].get("did"), limit, _ssl)
+                )
+                for record in records:
+                    yield record
+        finally:
+            next_page.cancel()
+
+    @backoff.on_exception(backoff.expo, Exception, **DEFAULT_BACKOFF_SETTINGS)
+    def _get_records_after(self, start=None, limit=None):
+        """
+
+        Get a page of records with a did after start (all records when it's None)
+
+        """
+        params = {}
+        if start is not None:
+            params["start"] = start
+        if limit is not None:
+            params["limit"] = limit
+
+        response = self.client._get("index/", params=params)
+        response.raise_for_status()
+
+        return response.json().get("records")
+
+    @backoff.on_exception(backoff.expo, Exception, **DEFAULT_BACKOFF_SETTINGS)
+    async def _async_get_records_after(self, start=None, limit=None, _ssl=None):
+        """
+
+        Asynchronously get a page of records with a did after start (all records
+        when it's None)
+
+        """
+        params = {}
+        if start is not None:
+            params["start"] = start
+        if limit is not None:
+            params["limit"] = limit
+
+        url = f"{self.client.url}/index/"
+        session = await self._get_async_session()
+        async with session.get(url, params=params, ssl=_ssl) as response:
+            response.raise_for_status()
+            response = await response.json()
+
+        return response.get("records")
 
     @backoff.on_exception(backoff.expo, Exception, **DEFAULT_BACKOFF_SETTINGS)
     def get_records_on_page(self, limit=None, page=None):
@@ -154,13 +261,15 @@ class Gen3Index:
             guid (str): record guid
 
         Returns:
-            dict: indexd record
+            dict: indexd record, or None if there is no record for the guid
         """
         url = f"{self.client.url}/index/{guid}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, ssl=_ssl) as response:
-                response.raise_for_status()
-                response = await response.json()
+        session = await self._get_async_session()
+        async with session.get(url, ssl=_ssl) as response:
+            if response.status == 404:
+                return None
+            response.raise_for_status()
+            response = await response.json()
 
         return response
 
@@ -187,9 +296,9 @@ class Gen3Index:
         query = urllib.parse.urlencode(params)
 
         url = f"{self.client.url}/index" + "?" + query
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, ssl=_ssl) as response:
-                response = await response.json()
+        session = await self._get_async_session()
+        async with session.get(url, ssl=_ssl) as response:
+            response = await response.json()
 
         return response.get("records")
 
@@ -296,10 +405,10 @@ class Gen3Index:
         """
         query_params = urllib.parse.urlencode(params)
         url = f"{self.client.url}/index/?{query_params}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, ssl=_ssl) as response:
-                await response.raise_for_status()
-                response = await response.json()
+        session = await self._get_async_session()
+        async with session.get(url, ssl=_ssl) as response:
+            response.raise_for_status()
+            response = await response.json()
 
         return response
 
@@ -431,36 +540,37 @@ class Gen3Index:
         Returns:
             Document: json representation of an entry in indexd
         """
-        async with aiohttp.ClientSession() as session:
-            if urls is None:
-                urls = []
-
-            json = {
-                "urls": urls,
-                "form": "object",
-                "hashes": hashes,
-                "size": size,
-                "file_name": file_name,
-                "metadata": metadata,
-                "urls_metadata": urls_metadata,
-                "baseid": baseid,
-                "acl": acl,
-                "authz": authz,
-                "version": version,
-            }
+        if urls is None:
+            urls = []
+
+        json = {
+            "urls": urls,
+            "form": "object",
+            "hashes": hashes,
+            "size": size,
+            "file_name": file_name,
+            "metadata": metadata,
+            "urls_metadata": urls_metadata,
+            "baseid": baseid,
+            "acl": acl,
+            "authz": authz,
+            "version": version,
+        }
 
-            if did:
-                json["did"] = did
+        if did:
+            json["did"] = did
 
-            async with session.post(
-                f"{self.client.url}/index/",
-                json=json,
-                headers={"content-type": "application/json"},
-                ssl=_ssl,
-                auth=self.client.auth,
-            ) as response:
-                response.raise_for_status()
-                response = await response.json()
+        response = await self._async_request(
+            "POST",
+            f"{self.client.url}/index/",
+            auth=self.client.auth,
+            json=json,
+            headers={"content-type": "application/json"},
+            ssl=_ssl,
+        )
+        async with response:
+            response.raise_for_status()
+            response = await response.json()
 
         return response
 
@@ -591,6 +701,34 @@ class Gen3Index:
 
         return response.json()
 
+    @backoff.on_exception(backoff.expo, Exception, **DEFAULT_BACKOFF_SETTINGS)
+    async def async_get_records(self, dids, _ssl=None):
+        """
+        Asynchronous function to get a list of documents given a list of dids,
+        with a single request
+
+        Args:
+            dids (list): a list of record ids
+
+        Returns:
+            list: json representing index records, dids without a record are
+                left out. None if none of the dids have a record
+        """
+        response = await self._async_request(
+            "POST",
+            f"{self.client.url}/bulk/documents",
+            auth=self.client.auth,
+            json=dids,
+            ssl=_ssl,
+        )
+        async with response:
+            if response.status == 404:
+                return None
+            response.raise_for_status()
+            response = await response.json()
+
+        return response
+
     ### Put Requests
 
     @backoff.on_exception(backoff.expo, Exception, **DEFAULT_BACKOFF_SETTINGS)
@@ -678,43 +816,53 @@ class Gen3Index:
         acl=None,
         authz=None,
         urls_metadata=None,
+        rev=None,
+        _ssl=None,
     ):
         """
         Asynchronous function to update a record in indexd.
 
+        Only the attributes that are provided are updated.
+
         Args:
              guid: string
                  - record id
              body: json/dictionary format
                  - index record information that needs to be updated.
                  - can not update size or hash, use new version for that
+             rev: string
+                 - current revision of the record, it's requested from indexd
+                   if not provided
         """
-        async with aiohttp.ClientSession() as session:
-            updatable_attrs = {
-                "file_name": file_name,
-                "urls": urls,
-                "version": version,
-                "metadata": metadata,
-                "acl": acl,
-                "authz": authz,
-                "urls_metadata": urls_metadata,
-            }
-            record = await async_get_record(guid)
-            revision = record.get("rev")
-
-            for key, value in updatable_attrs.items():
-                if value is not None:
-                    record[key] = value
-
-            async with session.put(
-                f"{self.client.url}/index/{guid}/rev={revision}",
-                json=record,
-                headers={"content-type": "application/json"},
-                ssl=_ssl,
-                auth=self.client.auth,
-            ) as response:
-                response.raise_for_status()
-                response = await response.json()
+        updatable_attrs = {
+            "file_name": file_name,
+            "urls": urls,
+            "version": version,
+            "metadata": metadata,
+            "acl": acl,
+            "authz": authz,
+            "urls_metadata": urls_metadata,
+        }
+        if rev is None:
+            record = await self.async_get_record(guid, _ssl=_ssl)
+            rev = (record or {}).get("rev")
+
+        json = {
+            key: value for key, value in updatable_attrs.items() if value is not None
+        }
+
+        response = await self._async_request(
+            "PUT",
+            f"{self.client.url}/index/{guid}",
+            auth=self.client.auth,
+            params={"rev": rev},
+            json=json,
+            headers={"content-type": "application/json"},
+            ssl=_ssl,
+        )
+        async with response:
+            response.raise_for_status()
+            response = await response.json()
 
         return response
 
@@ -767,11 +915,11 @@ class Gen3Index:
             List[records]: indexd records with urls matching pattern
         """
         url = f"{self.client.url}/_query/urls/q?include={pattern}"
-        async with aiohttp.ClientSession() as session:
-            logging.debug(f"request: {url}")
-            async with session.get(url, ssl=_ssl) as response:
-                response.raise_for_status()
-                response = await response.json()
+        session = await self._get_async_session()
+        logging.debug(f"request: {url}")
+        async with session.get(url, ssl=_ssl) as response:
+            response.raise_for_status()
+            response = await response.json()
 
         return response
 
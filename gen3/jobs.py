@@ -1,6 +1,7 @@
 """
 Contains class for interacting with Gen3's Job Dispatching Service(s).
 """
+
 import aiohttp
 import asyncio
 import backoff
@@ -8,10 +9,19 @@ import json
 import requests
 import urllib.parse
 import logging
+import random
 import sys
-import time
 
-from gen3.utils import append_query_params, DEFAULT_BACKOFF_SETTINGS
+from gen3.utils import (
+    append_query_params,
+    AsyncSessionMixin,
+    DEFAULT_ASYNC_KEEPALIVE_TIMEOUT,
+    DEFAULT_ASYNC_MAX_CONNECTIONS_PER_HOST,
+    DEFAULT_BACKOFF_SETTINGS,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_POOL_MAXSIZE,
+    SessionMixin,
+)
 
 # sower's "action" mapping to the relevant job
 INGEST_METADATA_JOB = "ingest-metadata-manifest"
@@ -20,11 +30,21 @@ INDEX_MANIFEST_JOB = "index-object-manifest"
 DOWNLOAD_MANIFEST_JOB = "download-indexd-manifest"
 MERGE_MANIFEST_JOB = "merge-manifests"
 
+# polling settings used while waiting for a job to finish, delays are in seconds
+DEFAULT_JOB_POLL_INITIAL_DELAY = 3
+DEFAULT_JOB_POLL_MAX_DELAY = 60
+JOB_POLL_BACKOFF_FACTOR = 1.5
+
 
-class Gen3Jobs:
+class Gen3Jobs(SessionMixin, AsyncSessionMixin):
     """
     A class for interacting with the Gen3's Job Dispatching Service(s).
 
+    The synchronous methods share a single pooled requests.Session, use the
+    instance as a context manager (or call close()) to clean it up. Similarly,
+    the async_* methods share a single pooled aiohttp session, use the instance
+    as an async context manager (or call async_close()) to clean it up.
+
     Examples:
         This generates the Gen3Jobs class pointed at the sandbox commons while
         using the credentials.json downloaded from the commons profile page.
@@ -34,7 +54,18 @@ class Gen3Jobs:
         ... sub = Gen3Jobs(endpoint, auth)
     """
 
-    def __init__(self, endpoint, auth_provider=None, service_location="job"):
+    def __init__(
+        self,
+        endpoint,
+        auth_provider=None,
+        service_location="job",
+        async_session=None,
+        max_connections_per_host=DEFAULT_ASYNC_MAX_CONNECTIONS_PER_HOST,
+        keepalive_timeout=DEFAULT_ASYNC_KEEPALIVE_TIMEOUT,
+        session=None,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        max_retries=DEFAULT_MAX_RETRIES,
+    ):
         """
         Initialization for instance of the class to setup basic endpoint info.
 
@@ -44,6 +75,20 @@ class Gen3Jobs:
                 token, required for admin endpoints
             service_location (str, optional): deployment location relative to the
                 endpoint provided
+            async_session (aiohttp.ClientSession, optional): session for async_*
+                methods to use instead of creating their own, it is NOT closed
+                by this class
+            max_connections_per_host (int, optional): pool size for the async
+                session
+            keepalive_timeout (float, optional): seconds to keep idle async
+                connections open
+            session (requests.Session, optional): session for the synchronous
+                methods to use instead of creating their own, it is NOT closed
+                by this class
+            pool_maxsize (int, optional): maximum number of connections kept
+                alive per host by the synchronous session
+            max_retries (int, optional): retries for connection errors and
+                502/503/504 responses on the synchronous session, 0 to disable
         """
         endpoint = endpoint.strip("/")
         # if running locally, mds is deployed by itself without a location relative
@@ -56,37 +101,135 @@ class Gen3Jobs:
 
         self.endpoint = endpoint.rstrip("/")
         self._auth_provider = auth_provider
+        self._init_session(session, pool_maxsize, max_retries)
+        self._init_async_session(
+            async_session, max_connections_per_host, keepalive_timeout
+        )
 
-    async def async_run_job_and_wait(self, job_name, job_input, _ssl=None, **kwargs):
+    async def async_run_job_and_wait(
+        self,
+        job_name,
+        job_input,
+        _ssl=None,
+        timeout=None,
+        initial_delay=DEFAULT_JOB_POLL_INITIAL_DELAY,
+        max_delay=DEFAULT_JOB_POLL_MAX_DELAY,
+        **kwargs,
+    ):
         """
         Asynchronous function to create a job, wait for output, and return. Will
-        sleep in a linear delay until the job is done, starting with 1 second.
+        poll the status with a capped, jittered exponential delay until the job
+        is done. Waiting does NOT block the event loop, so many jobs can be
+        awaited concurrently (see async_run_jobs_and_wait).
+
+        Cancelling the coroutine stops the polling (the job itself keeps running
+        in the jobs service).
 
         Args:
             _ssl (None, optional): whether or not to use ssl
             job_name (str): name for the job, can use globals in this file
             job_input (Dict): dictionary of input for the job
+            timeout (float, optional): maximum seconds to wait for the job to
+                finish and return output, None to wait forever
+            initial_delay (float, optional): seconds to wait before the first
+                status check
+            max_delay (float, optional): maximum seconds between status checks
 
         Returns:
             Dict: Response from the endpoint
+
+        Raises:
+            asyncio.TimeoutError: if the job didn't finish within timeout
+        """
+        return await asyncio.wait_for(
+            self._async_run_job_and_wait(
+                job_name, job_input, _ssl, initial_delay, max_delay
+            ),
+            timeout,
+        )
+
+    async def async_run_jobs_and_wait(
+        self,
+        jobs,
+        _ssl=None,
+        timeout=None,
+        initial_delay=DEFAULT_JOB_POLL_INITIAL_DELAY,
+        max_delay=DEFAULT_JOB_POLL_MAX_DELAY,
+        return_exceptions=False,
+        **kwargs,
+    ):
         """
-        job_create_response = await self.async_create_job(job_name, job_input)
+        Asynchronous function to create many jobs, wait for all of their output
+        concurrently, and return it.
+
+        Args:
+            jobs (List[Tuple[str, Dict]]): (job_name, job_input) for each job
+            _ssl (None, optional): whether or not to use ssl
+            timeout (float, optional): maximum seconds to wait for ALL the jobs
+                to finish, None to wait forever
+            initial_delay (float, optional): seconds to wait before the first
+                status check of each job
+            max_delay (float, optional): maximum seconds between status checks
+            return_exceptions (bool, optional): if True, a job failing returns
+                its exception in place of output instead of raising (and
+                cancelling the waits for the other jobs)
+
+        Returns:
+            List[Dict]: Response from the endpoint for each job, in the same
+                order as jobs
+
+        Raises:
+            asyncio.TimeoutError: if the jobs didn't finish within timeout
+        """
+        waits = [
+            asyncio.ensure_future(
+                self._async_run_job_and_wait(
+                    job_name, job_input, _ssl, initial_delay, max_delay
+                )
+            )
+            for job_name, job_input in jobs
+        ]
+        try:
+            return await asyncio.wait_for(
+                asyncio.gather(*waits, return_exceptions=return_exceptions), timeout
+            )
+        except BaseException:
+            # don't leave the rest of the jobs being polled in the background
+            for wait in waits:
+                wait.cancel()
+            raise
+
+    async def _async_run_job_and_wait(
+        self, job_name, job_input, _ssl, initial_delay, max_delay
+    ):
+        """
+        Create a job, poll until it's no longer running, and return its output.
+        See async_run_job_and_wait for args.
+        """
+        job_create_response = await self.async_create_job(
+            job_name, job_input, _ssl=_ssl
+        )
+        job_id = job_create_response.get("uid")
 
         status = {"status": "Running"}
-        sleep_time = 3
+        delay = initial_delay
         while status.get("status") == "Running":
-            logging.info(f"job still running, waiting for {sleep_time} seconds...")
-            time.sleep(sleep_time)
-            sleep_time *= 1.5
-            status = await self.async_get_status(job_create_response.get("uid"))
+            # "equal jitter" so concurrent jobs don't all poll at the same time
+            sleep_time = delay / 2 + random.uniform(0, delay / 2)
+            logging.info(
+                f"job {job_id} still running, waiting for {sleep_time:.1f} seconds..."
+            )
+            await asyncio.sleep(sleep_time)
+            delay = min(delay * JOB_POLL_BACKOFF_FACTOR, max_delay)
+            status = await self.async_get_status(job_id, _ssl=_ssl)
             logging.info(f"{status}")
 
-        logging.info(f"Job is finished!")
+        logging.info(f"Job {job_id} is finished!")
 
         if status.get("status") != "Completed":
             raise Exception(f"Job status not complete: {status.get('status')}.")
 
-        response = await self.async_get_output(job_create_response.get("uid"))
+        response = await self.async_get_output(job_id, _ssl=_ssl)
         return response
 
     def is_healthy(self):
@@ -97,7 +240,7 @@ class Gen3Jobs:
             bool: True if healthy
         """
         try:
-            response = requests.get(
+            response = self._session.get(
                 self.endpoint + "/_status", auth=self._auth_provider
             )
             response.raise_for_status()
@@ -115,7 +258,9 @@ class Gen3Jobs:
         Returns:
             str: the version
         """
-        response = requests.get(self.endpoint + "/_version", auth=self._auth_provider)
+        response = self._session.get(
+            self.endpoint + "/_version", auth=self._auth_provider
+        )
         response.raise_for_status()
         return response.json().get("version")
 
@@ -124,7 +269,7 @@ class Gen3Jobs:
         """
         List all jobs
         """
-        response = requests.get(self.endpoint + "/list", auth=self._auth_provider)
+        response = self._session.get(self.endpoint + "/list", auth=self._auth_provider)
         response.raise_for_status()
         return response.json()
 
@@ -141,7 +286,7 @@ class Gen3Jobs:
             Dict: Response from the endpoint
         """
         data = {"action": job_name, "input": job_input}
-        response = requests.post(
+        response = self._session.post(
             self.endpoint + "/dispatch", json=data, auth=self._auth_provider
         )
         response.raise_for_status()
@@ -149,29 +294,25 @@ class Gen3Jobs:
 
     @backoff.on_exception(backoff.expo, Exception, **DEFAULT_BACKOFF_SETTINGS)
     async def async_create_job(self, job_name, job_input, _ssl=None, **kwargs):
-        async with aiohttp.ClientSession() as session:
-            url = self.endpoint + f"/dispatch"
-            url_with_params = append_query_params(url, **kwargs)
-
-            data = json.dumps({"action": job_name, "input": job_input})
+        url = self.endpoint + f"/dispatch"
+        url_with_params = append_query_params(url, **kwargs)
 
-            # aiohttp only allows basic auth with their built in auth, so we
-            # need to manually add JWT auth header
-            headers = {"Authorization": self._auth_provider._get_auth_value()}
+        data = json.dumps({"action": job_name, "input": job_input})
 
-            async with session.post(
-                url_with_params, data=data, headers=headers, ssl=_ssl
-            ) as response:
-                response.raise_for_status()
-                response = await response.json(content_type=None)
-                return response
+        response = await self._async_request(
+            "POST", url_with_params, auth=self._auth_provider, data=data, ssl=_ssl
+        )
+        async with response:
+            response.raise_for_status()
+            response = await response.json(content_type=None)
+            return response
 
     @backoff.on_exception(backoff.expo, Exception, **DEFAULT_BACKOFF_SETTINGS)
     def get_status(self, job_id):
         """
         Get the status of a previously created job
         """
-        response = requests.get(
+        response = self._session.get(
             self.endpoint + f"/status?UID={job_id}", auth=self._auth_provider
         )
         response.raise_for_status()
@@ -179,27 +320,23 @@ class Gen3Jobs:
 
     @backoff.on_exception(backoff.expo, Exception, **DEFAULT_BACKOFF_SETTINGS)
     async def async_get_status(self, job_id, _ssl=None, **kwargs):
-        async with aiohttp.ClientSession() as session:
-            url = self.endpoint + f"/status?UID={job_id}"
-            url_with_params = append_query_params(url, **kwargs)
+        url = self.endpoint + f"/status?UID={job_id}"
+        url_with_params = append_query_params(url, **kwargs)
 
-            # aiohttp only allows basic auth with their built in auth, so we
-            # need to manually add JWT auth header
-            headers = {"Authorization": self._auth_provider._get_auth_value()}
-
-            async with session.get(
-                url_with_params, headers=headers, ssl=_ssl
-            ) as response:
-                response.raise_for_status()
-                response = await response.json(content_type=None)
-                return response
+        response = await self._async_request(
+            "GET", url_with_params, auth=self._auth_provider, ssl=_ssl
+        )
+        async with response:
+            response.raise_for_status()
+            response = await response.json(content_type=None)
+            return response
 
     @backoff.on_exception(backoff.expo, Exception, **DEFAULT_BACKOFF_SETTINGS)
     def get_output(self, job_id):
         """
         Get the output of a previously completed job
         """
-        response = requests.get(
+        response = self._session.get(
             self.endpoint + f"/output?UID={job_id}", auth=self._auth_provider
         )
         response.raise_for_status()
@@ -207,17 +344,13 @@ class Gen3Jobs:
 
     @backoff.on_exception(backoff.expo, Exception, **DEFAULT_BACKOFF_SETTINGS)
     async def async_get_output(self, job_id, _ssl=None, **kwargs):
-        async with aiohttp.ClientSession() as session:
-            url = self.endpoint + f"/output?UID={job_id}"
-            url_with_params = append_query_params(url, **kwargs)
-
-            # aiohttp only allows basic auth with their built in auth, so we
-            # need to manually add JWT auth header
-            headers = {"Authorization": self._auth_provider._get_auth_value()}
-
-            async with session.get(
-                url_with_params, headers=headers, ssl=_ssl
-            ) as response:
-                response.raise_for_status()
-                response = await response.json(content_type=None)
-                return response
+        url = self.endpoint + f"/output?UID={job_id}"
+        url_with_params = append_query_params(url, **kwargs)
+
+        response = await self._async_request(
+            "GET", url_with_params, auth=self._auth_provider, ssl=_ssl
+        )
+        async with response:
+            response.raise_for_status()
+            response = await response.json(content_type=None)
+            return response
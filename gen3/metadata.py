@@ -1,6 +1,7 @@
 """
 Contains class for interacting with Gen3's Metadata Service.
 """
+
 import aiohttp
 import backoff
 import requests
@@ -8,13 +9,27 @@ import urllib.parse
 import logging
 import sys
 
-from gen3.utils import append_query_params, DEFAULT_BACKOFF_SETTINGS
+from gen3.utils import (
+    append_query_params,
+    AsyncSessionMixin,
+    DEFAULT_ASYNC_KEEPALIVE_TIMEOUT,
+    DEFAULT_ASYNC_MAX_CONNECTIONS_PER_HOST,
+    DEFAULT_BACKOFF_SETTINGS,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_POOL_MAXSIZE,
+    SessionMixin,
+)
 
 
-class Gen3Metadata:
+class Gen3Metadata(SessionMixin, AsyncSessionMixin):
     """
     A class for interacting with the Gen3 Metadata services.
 
+    The synchronous methods share a single pooled requests.Session, use the
+    instance as a context manager (or call close()) to clean it up. Similarly,
+    the async_* methods share a single pooled aiohttp session, use the instance
+    as an async context manager (or call async_close()) to clean it up.
+
     Examples:
         This generates the Gen3Metadata class pointed at the sandbox commons while
         using the credentials.json downloaded from the commons profile page.
@@ -34,6 +49,12 @@ class Gen3Metadata:
         auth_provider=None,
         service_location="mds",
         admin_endpoint_suffix="-admin",
+        async_session=None,
+        max_connections_per_host=DEFAULT_ASYNC_MAX_CONNECTIONS_PER_HOST,
+        keepalive_timeout=DEFAULT_ASYNC_KEEPALIVE_TIMEOUT,
+        session=None,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        max_retries=DEFAULT_MAX_RETRIES,
     ):
         """
         Initialization for instance of the class to setup basic endpoint info.
@@ -44,6 +65,20 @@ class Gen3Metadata:
                 token, required for admin endpoints
             service_location (str, optional): deployment location relative to the
                 endpoint provided
+            async_session (aiohttp.ClientSession, optional): session for async_*
+                methods to use instead of creating their own, it is NOT closed
+                by this class
+            max_connections_per_host (int, optional): pool size for the async
+                session
+            keepalive_timeout (float, optional): seconds to keep idle async
+                connections open
+            session (requests.Session, optional): session for the synchronous
+                methods to use instead of creating their own, it is NOT closed
+                by this class
+            pool_maxsize (int, optional): maximum number of connections kept
+                alive per host by the synchronous session
+            max_retries (int, optional): retries for connection errors and
+                502/503/504 responses on the synchronous session, 0 to disable
         """
         endpoint = endpoint.strip("/")
         # if running locally, mds is deployed by itself without a location relative
@@ -58,6 +93,10 @@ class Gen3Metadata:
         self.endpoint = endpoint.rstrip("/")
         self.admin_endpoint = endpoint.rstrip("/") + admin_endpoint_suffix
         self._auth_provider = auth_provider
+        self._init_session(session, pool_maxsize, max_retries)
+        self._init_async_session(
+            async_session, max_connections_per_host, keepalive_timeout
+        )
 
     def is_healthy(self):
         """
@@ -67,7 +106,7 @@ class Gen3Metadata:
             bool: True if healthy
         """
         try:
-            response = requests.get(
+            response = self._session.get(
                 self.endpoint + "/_status", auth=self._auth_provider
             )
             response.raise_for_status()
@@ -85,7 +124,9 @@ class Gen3Metadata:
         Returns:
             str: the version
         """
-        response = requests.get(self.endpoint + "/version", auth=self._auth_provider)
+        response = self._session.get(
+            self.endpoint + "/version", auth=self._auth_provider
+        )
         response.raise_for_status()
         return response.text
 
@@ -97,7 +138,7 @@ class Gen3Metadata:
         Returns:
             List: list of metadata key paths
         """
-        response = requests.get(
+        response = self._session.get(
             self.admin_endpoint + "/metadata_index", auth=self._auth_provider
         )
         response.raise_for_status()
@@ -114,7 +155,7 @@ class Gen3Metadata:
         Returns:
             TYPE: Description
         """
-        response = requests.post(
+        response = self._session.post(
             self.admin_endpoint + f"/metadata_index/{path}", auth=self._auth_provider
         )
         response.raise_for_status()
@@ -131,7 +172,7 @@ class Gen3Metadata:
         Returns:
             TYPE: Description
         """
-        response = requests.delete(
+        response = self._session.delete(
             self.admin_endpoint + f"/metadata_index/{path}", auth=self._auth_provider
         )
         response.raise_for_status()
@@ -190,7 +231,7 @@ class Gen3Metadata:
             url, data=return_full_metadata, limit=limit, offset=offset, **kwargs
         )
         logging.debug(f"hitting: {url_with_params}")
-        response = requests.get(url_with_params, auth=self._auth_provider)
+        response = self._session.get(url_with_params, auth=self._auth_provider)
         response.raise_for_status()
 
         return response.json()
@@ -207,15 +248,15 @@ class Gen3Metadata:
         Returns:
             Dict: metadata for given guid
         """
-        async with aiohttp.ClientSession() as session:
-            url = self.endpoint + f"/metadata/{guid}"
-            url_with_params = append_query_params(url, **kwargs)
+        session = await self._get_async_session()
+        url = self.endpoint + f"/metadata/{guid}"
+        url_with_params = append_query_params(url, **kwargs)
 
-            logging.debug(f"hitting: {url_with_params}")
+        logging.debug(f"hitting: {url_with_params}")
 
-            async with session.get(url_with_params, ssl=_ssl) as response:
-                response.raise_for_status()
-                response = await response.json()
+        async with session.get(url_with_params, ssl=_ssl) as response:
+            response.raise_for_status()
+            response = await response.json()
 
         return response
 
@@ -234,7 +275,7 @@ class Gen3Metadata:
 
         url_with_params = append_query_params(url, **kwargs)
         logging.debug(f"hitting: {url_with_params}")
-        response = requests.get(url_with_params, auth=self._auth_provider)
+        response = self._session.get(url_with_params, auth=self._auth_provider)
         response.raise_for_status()
 
         return response.json()
@@ -265,13 +306,49 @@ class Gen3Metadata:
         url_with_params = append_query_params(url, overwrite=overwrite, **kwargs)
         logging.debug(f"hitting: {url_with_params}")
         logging.debug(f"data: {metadata_list}")
-        response = requests.post(
+        response = self._session.post(
             url_with_params, json=metadata_list, auth=self._auth_provider
         )
         response.raise_for_status()
 
         return response.json()
 
+    @backoff.on_exception(backoff.expo, Exception, **DEFAULT_BACKOFF_SETTINGS)
+    async def async_batch_create(
+        self, metadata_list, overwrite=True, _ssl=None, **kwargs
+    ):
+        """
+        Asynchronous function to create the list of metadata associated with the
+        list of guids, in a single request
+
+        Args:
+            metadata_list (List[Dict{"guid": "", "data": {}}]): list of metadata
+                objects in a specific format. Expects a dict with "guid" and "data"
+                fields where "data" is another JSON blob to add to the mds
+            overwrite (bool, optional): whether or not to overwrite existing data
+            _ssl (None, optional): whether or not to use ssl
+
+        Returns:
+            Dict{"created": [], "updated": [], "conflict": []}: guids by outcome
+        """
+        url = self.admin_endpoint + f"/metadata"
+        url_with_params = append_query_params(url, overwrite=overwrite, **kwargs)
+        logging.debug(f"hitting: {url_with_params}")
+        logging.debug(f"data: {metadata_list}")
+
+        response = await self._async_request(
+            "POST",
+            url_with_params,
+            auth=self._auth_provider,
+            json=metadata_list,
+            ssl=_ssl,
+        )
+        async with response:
+            response.raise_for_status()
+            response = await response.json()
+
+        return response
+
     @backoff.on_exception(backoff.expo, Exception, **DEFAULT_BACKOFF_SETTINGS)
     def create(self, guid, metadata, overwrite=False, **kwargs):
         """
@@ -288,7 +365,7 @@ class Gen3Metadata:
         url_with_params = append_query_params(url, overwrite=overwrite, **kwargs)
         logging.debug(f"hitting: {url_with_params}")
         logging.debug(f"data: {metadata}")
-        response = requests.post(
+        response = self._session.post(
             url_with_params, json=metadata, auth=self._auth_provider
         )
         response.raise_for_status()
@@ -307,19 +384,15 @@ class Gen3Metadata:
             overwrite (bool, optional): whether or not to overwrite existing data
             _ssl (None, optional): whether or not to use ssl
         """
-        async with aiohttp.ClientSession() as session:
-            url = self.admin_endpoint + f"/metadata/{guid}"
-            url_with_params = append_query_params(url, overwrite=overwrite, **kwargs)
-
-            # aiohttp only allows basic auth with their built in auth, so we
-            # need to manually add JWT auth header
-            headers = {"Authorization": self._auth_provider._get_auth_value()}
+        url = self.admin_endpoint + f"/metadata/{guid}"
+        url_with_params = append_query_params(url, overwrite=overwrite, **kwargs)
 
-            async with session.post(
-                url_with_params, json=metadata, headers=headers, ssl=_ssl
-            ) as response:
-                response.raise_for_status()
-                response = await response.json()
+        response = await self._async_request(
+            "POST", url_with_params, auth=self._auth_provider, json=metadata, ssl=_ssl
+        )
+        async with response:
+            response.raise_for_status()
+            response = await response.json()
 
         return response
 
@@ -338,7 +411,7 @@ class Gen3Metadata:
         url_with_params = append_query_params(url, **kwargs)
         logging.debug(f"hitting: {url_with_params}")
         logging.debug(f"data: {metadata}")
-        response = requests.put(
+        response = self._session.put(
             url_with_params, json=metadata, auth=self._auth_provider
         )
         response.raise_for_status()
@@ -356,19 +429,15 @@ class Gen3Metadata:
                 attached to the provided GUID as metadata
             _ssl (None, optional): whether or not to use ssl
         """
-        async with aiohttp.ClientSession() as session:
-            url = self.admin_endpoint + f"/metadata/{guid}"
-            url_with_params = append_query_params(url, **kwargs)
-
-            # aiohttp only allows basic auth with their built in auth, so we
-            # need to manually add JWT auth header
-            headers = {"Authorization": self._auth_provider._get_auth_value()}
+        url = self.admin_endpoint + f"/metadata/{guid}"
+        url_with_params = append_query_params(url, **kwargs)
 
-            async with session.put(
-                url_with_params, json=metadata, headers=headers, ssl=_ssl
-            ) as response:
-                response.raise_for_status()
-                response = await response.json()
+        response = await self._async_request(
+            "PUT", url_with_params, auth=self._auth_provider, json=metadata, ssl=_ssl
+        )
+        async with response:
+            response.raise_for_status()
+            response = await response.json()
 
         return response
 
@@ -384,7 +453,7 @@ class Gen3Metadata:
 
         url_with_params = append_query_params(url, **kwargs)
         logging.debug(f"hitting: {url_with_params}")
-        response = requests.delete(url_with_params, auth=self._auth_provider)
+        response = self._session.delete(url_with_params, auth=self._auth_provider)
         response.raise_for_status()
 
         return response.json()
@@ -4,6 +4,8 @@ import requests
 import pandas as pd
 import os
 
+from gen3.utils import DEFAULT_MAX_RETRIES, DEFAULT_POOL_MAXSIZE, SessionMixin
+
 
 class Gen3Error(Exception):
     pass
@@ -17,7 +19,7 @@ class Gen3UserError(Gen3Error):
     pass
 
 
-class Gen3Submission:
+class Gen3Submission(SessionMixin):
     """Submit/Export/Query data from a Gen3 Submission system.
 
     A class for interacting with the Gen3 submission services.
@@ -27,6 +29,11 @@ class Gen3Submission:
     Args:
         endpoint (str): The URL of the data commons.
         auth_provider (Gen3Auth): A Gen3Auth class instance.
+        session (requests.Session): session to make requests with instead of
+            creating one, it is NOT closed by this class
+        pool_maxsize (int): maximum number of connections kept alive per host
+        max_retries (int): retries for connection errors and 502/503/504
+            responses, 0 to disable
 
     Examples:
         This generates the Gen3Submission class pointed at the sandbox commons while
@@ -38,9 +45,17 @@ class Gen3Submission:
 
     """
 
-    def __init__(self, endpoint, auth_provider):
+    def __init__(
+        self,
+        endpoint,
+        auth_provider,
+        session=None,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        max_retries=DEFAULT_MAX_RETRIES,
+    ):
         self._auth_provider = auth_provider
         self._endpoint = endpoint
+        self._init_session(session, pool_maxsize, max_retries)
 
     def __export_file(self, filename, output):
         """Writes an API response to a file."""
@@ -54,7 +69,7 @@ class Gen3Submission:
     def get_programs(self):
         """List registered programs"""
         api_url = f"{self._endpoint}/api/v0/submission/"
-        output = requests.get(api_url, auth=self._auth_provider)
+        output = self._session.get(api_url, auth=self._auth_provider)
         output.raise_for_status()
         return output.json()
 
@@ -69,7 +84,7 @@ class Gen3Submission:
             >>> Gen3Submission.create_program(json)
         """
         api_url = "{}/api/v0/submission/".format(self._endpoint)
-        output = requests.post(api_url, auth=self._auth_provider, json=json)
+        output = self._session.post(api_url, auth=self._auth_provider, json=json)
         output.raise_for_status()
         return output.json()
 
@@ -88,7 +103,7 @@ class Gen3Submission:
 
         """
         api_url = "{}/api/v0/submission/{}".format(self._endpoint, program)
-        output = requests.delete(api_url, auth=self._auth_provider)
+        output = self._session.delete(api_url, auth=self._auth_provider)
         output.raise_for_status()
         return output
 
@@ -107,7 +122,7 @@ class Gen3Submission:
 
         """
         api_url = f"{self._endpoint}/api/v0/submission/{program}"
-        output = requests.get(api_url, auth=self._auth_provider)
+        output = self._session.get(api_url, auth=self._auth_provider)
         output.raise_for_status()
         return output.json()
 
@@ -123,7 +138,7 @@ class Gen3Submission:
             >>> Gen3Submission.create_project("DCF", json)
         """
         api_url = "{}/api/v0/submission/{}".format(self._endpoint, program)
-        output = requests.put(api_url, auth=self._auth_provider, json=json)
+        output = self._session.put(api_url, auth=self._auth_provider, json=json)
         output.raise_for_status()
         return output.json()
 
@@ -143,7 +158,7 @@ class Gen3Submission:
 
         """
         api_url = "{}/api/v0/submission/{}/{}".format(self._endpoint, program, project)
-        output = requests.delete(api_url, auth=self._auth_provider)
+        output = self._session.delete(api_url, auth=self._auth_provider)
         output.raise_for_status()
         return output
 
@@ -160,7 +175,7 @@ class Gen3Submission:
 
         """
         api_url = f"{self._endpoint}/api/v0/submission/{program}/{project}/_dictionary"
-        output = requests.get(api_url, auth=self._auth_provider)
+        output = self._session.get(api_url, auth=self._auth_provider)
         output.raise_for_status()
         return output.json()
 
@@ -177,7 +192,7 @@ class Gen3Submission:
 
         """
         api_url = f"{self._endpoint}/api/v0/submission/{program}/{project}/open"
-        output = requests.put(api_url, auth=self._auth_provider)
+        output = self._session.put(api_url, auth=self._auth_provider)
         output.raise_for_status()
         return output.json()
 
@@ -198,7 +213,7 @@ class Gen3Submission:
 
         """
         api_url = "{}/api/v0/submission/{}/{}".format(self._endpoint, program, project)
-        output = requests.put(api_url, auth=self._auth_provider, json=json)
+        output = self._session.put(api_url, auth=self._auth_provider, json=json)
         output.raise_for_status()
         return output.json()
 
@@ -239,7 +254,7 @@ class Gen3Submission:
             uuids_to_delete = uuids[batch_size * i : batch_size * (i + 1)]
             if len(uuids_to_delete) == 0:
                 break
-            output = requests.delete(
+            output = self._session.delete(
                 "{}/{}".format(api_url, ",".join(uuids_to_delete)),
                 auth=self._auth_provider,
             )
@@ -329,7 +344,7 @@ class Gen3Submission:
         api_url = "{}/api/v0/submission/{}/{}/export?ids={}&format={}".format(
             self._endpoint, program, project, uuid, fileformat
         )
-        output = requests.get(api_url, auth=self._auth_provider).text
+        output = self._session.get(api_url, auth=self._auth_provider).text
         if filename is None:
             if fileformat == "json":
                 output = json.loads(output)
@@ -361,7 +376,7 @@ class Gen3Submission:
         api_url = "{}/api/v0/submission/{}/{}/export/?node_label={}&format={}".format(
             self._endpoint, program, project, node_type, fileformat
         )
-        output = requests.get(api_url, auth=self._auth_provider).text
+        output = self._session.get(api_url, auth=self._auth_provider).text
         if filename is None:
             if fileformat == "json":
                 output = json.loads(output)
@@ -396,7 +411,9 @@ class Gen3Submission:
 
         tries = 0
         while tries < max_tries:
-            output = requests.post(api_url, auth=self._auth_provider, json=query).text
+            output = self._session.post(
+                api_url, auth=self._auth_provider, json=query
+            ).text
             data = json.loads(output)
 
             if "errors" in data:
@@ -422,7 +439,7 @@ class Gen3Submission:
 
         """
         api_url = "{}/api/v0/submission/getschema".format(self._endpoint)
-        output = requests.get(api_url).text
+        output = self._session.get(api_url).text
         data = json.loads(output)
         return data
 
@@ -445,7 +462,7 @@ class Gen3Submission:
         api_url = "{}/api/v0/submission/_dictionary/{}".format(
             self._endpoint, node_type
         )
-        output = requests.get(api_url).text
+        output = self._session.get(api_url).text
         data = json.loads(output)
         return data
 
@@ -477,7 +494,7 @@ class Gen3Submission:
 
         """
         api_url = f"{self._endpoint}/api/v0/submission/{program}/{project}/manifest"
-        output = requests.get(api_url, auth=self._auth_provider)
+        output = self._session.get(api_url, auth=self._auth_provider)
         return output
 
     def submit_file(self, project_id, filename, chunk_size=30, row_offset=0):
@@ -558,7 +575,7 @@ class Gen3Submission:
             )
 
             try:
-                response = requests.put(
+                response = self._session.put(
                     api_url,
                     auth=self._auth_provider,
                     data=chunk.to_csv(sep="\t", index=False),
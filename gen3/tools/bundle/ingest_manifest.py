@@ -9,7 +9,13 @@ import re
 
 from drsclient.client import DrsClient
 from gen3.auth import Gen3Auth
-from gen3.utils import UUID_FORMAT, SIZE_FORMAT, _verify_format, _standardize_str
+from gen3.utils import (
+    UUID_FORMAT,
+    SIZE_FORMAT,
+    _verify_format,
+    _split_list_str,
+    _parse_list_str,
+)
 from gen3.tools.indexing.manifest_columns import (
     GUID_COLUMN_NAMES,
     SIZE_COLUMN_NAMES,
@@ -146,15 +152,8 @@ def _verify_and_process_bundle_manifest(manifest_file, manifest_file_delimiter="
                         )
                         pass_verification = False
                 elif key in IDS_COLUMN_NAME:
-                    standard = (
-                        _standardize_str(value)
-                        .strip()
-                        .lstrip("[")
-                        .rstrip("]")
-                        .split(" ")
-                    )
                     item_ids = []
-                    for item in standard:
+                    for item in _split_list_str(value):
                         item_id = item.replace("'", "").replace('"', "")
                         if item_id == record["name"]:
                             logging.error(
@@ -190,18 +189,7 @@ def _verify_and_process_bundle_manifest(manifest_file, manifest_file_delimiter="
                 ):
                     if not value:
                         continue
-                    standard = (
-                        _standardize_str(value)
-                        .strip()
-                        .lstrip("[")
-                        .rstrip("]")
-                        .split(" ")
-                    )
-                    values = []
-                    for element in standard:
-                        v = element.strip().replace("'", "").replace('"', "")
-                        if v:
-                            values.append(v)
+                    values = [v for v in _parse_list_str(value) if v]
                     k = "aliases"
                     if key in CHECKSUMS_COLUMN_NAME:
                         k = "checksum"
@@ -5,45 +5,81 @@ multiple processes and coroutines using Python's asyncio library.
 
 The default manifest format created is a Comma-Separated Value file (csv)
 with rows for every record. A header row is created with field names:
-guid,authz,acl,file_size,md5,urls,file_name
+guid,urls,authz,acl,md5,file_size,file_name
 
 Fields that are lists (like acl, authz, and urls) separate the values with spaces.
 
+The manifest can also be written as gzip compressed csv or Parquet (where lists
+are kept as lists), see manifest_formats.
+
+Pages of records are requested concurrently (up to max_concurrent_requests at a
+time) and written to the output in page order as soon as they're available, so
+only that many pages are ever held in memory. The output is written to
+"{output_filename}.partial" and only moved to the output filename once complete.
+
+After every page written, the number of pages and bytes written are recorded in a
+"{output_filename}.checkpoint" file (except for Parquet, which can't be resumed).
+If a download fails part way through, running it again with resume=True (or
+--resume) continues from the checkpoint instead of starting over.
+    NOTE: indexd pages are offsets, so records created or deleted while resuming a
+          download can shift records between pages already written and pages
+          still to request. Resume soon after a failure.
+
+Given a previous manifest and the time it was downloaded (since), an incremental
+download also writes a "delta" manifest with only the records created or updated
+since then, plus "tombstone" rows for records in the previous manifest that no
+longer exist. The delta has the same columns as the manifest, plus a "change"
+column with one of: created, updated, deleted.
+    NOTE: indexd can't filter records by date, so every record is still listed
+          (paging by did, which stays fast deep into the listing) and changes are
+          determined from each record's created_date/updated_date.
+    NOTE: paging by did means each page depends on the last did of the one
+          before, so an incremental download is a single serial listing,
+          formatted in this process. It can't be resumed and doesn't use
+          num_processes.
+
 Attributes:
     CURRENT_DIR (str): directory this file is in
     INDEXD_RECORD_PAGE_SIZE (int): number of records to request per page
-    MAX_CONCURRENT_REQUESTS (int): maximum number of desired concurrent requests across
-        processes/threads
-    TMP_FOLDER (str): Folder directory for placing temporary files
-        NOTE - We have to use a temporary folder b/c Python's file writing is not
-              thread-safe so we can't have all processes writing to the same file.
-              To workaround this, we have each process write to a file and concat
-              them all post-processing.
+    MAX_CONCURRENT_REQUESTS (int): maximum number of desired concurrent requests
+    NUM_PROCESSES (int): default number of processes to format records with
 """
+
 import asyncio
 import click
-import time
-import csv
-import glob
+import datetime
+import json
 import logging
+import math
 import os
 import sys
-import shutil
-import math
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 from gen3.index import Gen3Index
+from gen3.tools.indexing import manifest_formats
+from gen3.tools.indexing.manifest_formats import MANIFEST_COLUMNS
+from gen3.utils import create_async_session
 
 INDEXD_RECORD_PAGE_SIZE = 1024
 MAX_CONCURRENT_REQUESTS = 24
+NUM_PROCESSES = 4
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
-TMP_FOLDER = os.path.abspath(CURRENT_DIR + "/tmp") + "/"
+
+INDEXD_DATE_FORMATS = ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d")
 
 
 async def async_download_object_manifest(
     commons_url,
     output_filename="object-manifest.csv",
-    num_processes=4,
+    num_processes=None,
     max_concurrent_requests=MAX_CONCURRENT_REQUESTS,
+    resume=False,
+    previous_manifest=None,
+    since=None,
+    delta_filename=None,
+    output_format=None,
 ):
     """
     Download all file object records into a manifest csv
@@ -52,24 +88,63 @@ async def async_download_object_manifest(
         commons_url (str): root domain for commons where indexd lives
         output_filename (str, optional): filename for output
         num_processes (int, optional): number of parallel python processes to use for
-          hitting indexd api and processing
+          formatting records into rows, 1 to format them in this process. Defaults
+          to NUM_PROCESSES
         max_concurrent_requests (int): the maximum number of concurrent requests allowed
-            NOTE: This is the TOTAL number, not just for this process. Used to help
-            determine how many requests a process should be making at one time
+        resume (bool, optional): continue a previous, failed download to the same
+            output_filename from its checkpoint, instead of starting over
+        previous_manifest (str, optional): manifest from a previous download, to
+            also write a delta of the changes since then. Records are then listed
+            serially and formatted in this process, so this can't be combined with
+            resume or num_processes
+        since (datetime.datetime|str, optional): when previous_manifest was
+            downloaded, records created or updated after this are considered
+            changed. Naive datetimes are UTC, like indexd's dates.
+        delta_filename (str, optional): filename for the delta output, defaults
+            to output_filename with a ".delta" suffix before the extension
+        output_format (str, optional): one of manifest_formats.OUTPUT_FORMATS
+            ("csv", "csv.gz" or "parquet"), determined from the extension of
+            output_filename if not specified
     """
     start_time = time.perf_counter()
     logging.info(f"start time: {start_time}")
 
-    # ensure tmp directory exists and is empty
-    os.makedirs(TMP_FOLDER, exist_ok=True)
-    for file in os.listdir(TMP_FOLDER):
-        file_path = os.path.join(TMP_FOLDER, file)
-        if os.path.isfile(file_path):
-            os.unlink(file_path)
-
-    result = await _write_all_index_records_to_file(
-        commons_url, output_filename, num_processes, max_concurrent_requests
-    )
+    output_format = manifest_formats.get_output_format(output_filename, output_format)
+    if resume and output_format == manifest_formats.PARQUET:
+        raise ValueError("Parquet output can't be resumed")
+
+    if previous_manifest:
+        if since is None:
+            raise ValueError("since is required for an incremental download")
+        if resume:
+            raise ValueError("An incremental download can't be resumed")
+        if num_processes not in (None, 1):
+            raise ValueError(
+                "An incremental download is a single serial listing, "
+                "num_processes isn't supported"
+            )
+        if not delta_filename:
+            delta_filename = manifest_formats.add_filename_suffix(
+                output_filename, ".delta", output_format
+            )
+        await _write_index_record_changes_to_file(
+            commons_url,
+            output_filename,
+            previous_manifest,
+            _parse_date(since),
+            delta_filename,
+            max_concurrent_requests,
+            output_format,
+        )
+    else:
+        await _write_all_index_records_to_file(
+            commons_url,
+            output_filename,
+            num_processes or NUM_PROCESSES,
+            max_concurrent_requests,
+            resume,
+            output_format,
+        )
 
     end_time = time.perf_counter()
     logging.info(f"end time: {end_time}")
@@ -77,20 +152,26 @@ async def async_download_object_manifest(
 
 
 async def _write_all_index_records_to_file(
-    commons_url, output_filename, num_processes, max_concurrent_requests
+    commons_url,
+    output_filename,
+    num_processes,
+    max_concurrent_requests,
+    resume,
+    output_format,
 ):
     """
-    Spins up number of processes provided to parse indexd records and eventually
-    write to a single output file manifest.
+    Requests every page of indexd records, formats them into rows (in a pool of
+    processes if num_processes > 1) and writes them to a single output file
+    manifest, in page order, checkpointing progress as it goes.
 
     Args:
         commons_url (str): root domain for commons where indexd lives
         output_filename (str, optional): filename for output
         num_processes (int, optional): number of parallel python processes to use for
-          hitting indexd api and processing
+          formatting records into rows
         max_concurrent_requests (int): the maximum number of concurrent requests allowed
-            NOTE: This is the TOTAL number, not just for this process. Used to help
-            determine how many requests a process should be making at one time
+        resume (bool): continue from the checkpoint of a previous download
+        output_format (str): one of manifest_formats.OUTPUT_FORMATS
     """
     index = Gen3Index(commons_url)
     logging.debug(f"requesting indexd stats...")
@@ -102,214 +183,458 @@ async def _write_all_index_records_to_file(
     logging.debug(f"max page: {max_page}")
     logging.debug(f"num processes: {num_processes}")
 
-    pages = [x for x in range(max_page + 1)]
+    max_requests = max(int(max_concurrent_requests), 1)
+    logging.debug(f"max concurrent requests: {max_requests}")
+
+    # default ssl handling unless it's explicitly http://
+    ssl = None
+    if "https" not in commons_url:
+        ssl = False
 
-    # batch pages into subprocesses
-    chunk_size = int(math.ceil(float(len(pages)) / num_processes))
-    logging.debug(f"page chunk size: {chunk_size}")
+    output_filename = os.path.abspath(output_filename)
+    partial_filename = output_filename + ".partial"
+    checkpoint = _Checkpoint(
+        output_filename + ".checkpoint", commons_url, INDEXD_RECORD_PAGE_SIZE
+    )
 
-    if not chunk_size:
-        page_chunks = []
+    first_page = 0
+    if resume and checkpoint.load() and os.path.isfile(partial_filename):
+        first_page = checkpoint.pages_written
+        logging.info(
+            f"resuming download from page {first_page} of {max_page + 1} "
+            f"({checkpoint.offset} bytes already written to {partial_filename})"
+        )
+        writer = manifest_formats.open_manifest_writer(
+            partial_filename,
+            output_format,
+            MANIFEST_COLUMNS,
+            resume_offset=checkpoint.offset,
+        )
     else:
-        page_chunks = [
-            pages[i : i + chunk_size] for i in range(0, len(pages), chunk_size)
-        ]
-
-    processes = []
-    for x in range(len(page_chunks)):
-        pages = ",".join(map(str, page_chunks[x]))
-
-        # call the cli function below and pass in chunks of pages for each process
-        command = (
-            f"python {CURRENT_DIR}/download_manifest.py --commons_url "
-            f"{commons_url} --pages {pages} --num_processes {num_processes} "
-            f"--max_concurrent_requests {max_concurrent_requests}"
+        if resume:
+            logging.warning(f"no checkpoint to resume from, starting from page 0")
+        writer = manifest_formats.open_manifest_writer(
+            partial_filename, output_format, MANIFEST_COLUMNS
         )
-        logging.info(command)
+        if writer.resumable:
+            checkpoint.save(0, writer.tell())
+        else:
+            checkpoint = None
+
+    executor = ProcessPoolExecutor(num_processes) if num_processes > 1 else None
+    try:
+        async with create_async_session(
+            max_connections_per_host=max_requests
+        ) as session:
+            index = Gen3Index(commons_url, async_session=session)
+            await _write_pages_in_order(
+                index,
+                range(first_page, max_page + 1),
+                max_requests,
+                executor,
+                ssl,
+                writer,
+                checkpoint,
+            )
+    finally:
+        writer.close()
+        if executor:
+            executor.shutdown()
+
+    os.replace(partial_filename, output_filename)
+    if checkpoint:
+        checkpoint.remove()
 
-        process = await asyncio.create_subprocess_shell(command)
+    logging.info(f"done writing output to file {output_filename}")
 
-        logging.info(f"Process_{process.pid} - Started w/: {command}")
-        processes.append(process)
 
-    for process in processes:
-        # wait for the subprocesses to finish
-        stdout, stderr = await process.communicate()
+async def _write_index_record_changes_to_file(
+    commons_url,
+    output_filename,
+    previous_manifest,
+    since,
+    delta_filename,
+    max_concurrent_requests,
+    output_format,
+):
+    """
+    Stream every indexd record (by did) into a new manifest, and write the ones
+    created/updated since the previous manifest, along with tombstones for the
+    ones deleted from it, to a delta manifest.
 
-        if process.returncode == 0:
-            logging.info(f"Process_{process.pid} - Done")
-        else:
-            logging.info(f"Process_{process.pid} - FAILED")
+    This is a single serial listing: every page starts after the last did of the
+    page before, so pages are requested one at a time and formatted in this
+    process, and there's no checkpoint to resume from.
 
-    logging.info(f"done processing, combining outputs to single file {output_filename}")
+    Args:
+        commons_url (str): root domain for commons where indexd lives
+        output_filename (str): filename for output
+        previous_manifest (str): manifest from a previous download, in any format
+        since (datetime.datetime): when previous_manifest was downloaded (UTC)
+        delta_filename (str): filename for the delta output
+        max_concurrent_requests (int): the maximum number of concurrent requests allowed
+        output_format (str): one of manifest_formats.OUTPUT_FORMATS
+    """
+    # only the guids are needed, to tell created records from updated ones and
+    # to find deleted ones
+    previous_guids = set(
+        manifest_formats.read_manifest_column(previous_manifest, "guid")
+    )
+    logging.info(f"{len(previous_guids)} records in previous manifest")
+
+    # default ssl handling unless it's explicitly http://
+    ssl = None
+    if "https" not in commons_url:
+        ssl = False
+
+    changes = {"created": 0, "updated": 0, "deleted": 0}
+    output_filename = os.path.abspath(output_filename)
+    delta_filename = os.path.abspath(delta_filename)
+    delta_columns = MANIFEST_COLUMNS + ["change"]
+
+    async with create_async_session(
+        max_connections_per_host=max(int(max_concurrent_requests), 1)
+    ) as session:
+        index = Gen3Index(commons_url, async_session=session)
+        with manifest_formats.open_manifest_writer(
+            output_filename + ".partial", output_format, MANIFEST_COLUMNS
+        ) as writer, manifest_formats.open_manifest_writer(
+            delta_filename + ".partial", output_format, delta_columns
+        ) as delta_writer:
+
+            def _write_page(records, record_changes):
+                writer.write(manifest_formats.format_records(records, output_format))
+
+                changed = [
+                    (record, change)
+                    for record, change in zip(records, record_changes)
+                    if change
+                ]
+                if changed:
+                    columns = manifest_formats.records_to_columns(
+                        [record for record, _ in changed]
+                    )
+                    columns["change"] = [change for _, change in changed]
+                    delta_writer.write(
+                        manifest_formats.encode_columns(columns, output_format)
+                    )
+
+            records = []
+            record_changes = []
+            async for record in index.async_iter_all_records(
+                limit=INDEXD_RECORD_PAGE_SIZE, _ssl=ssl
+            ):
+                guid = record.get("did")
+                if guid in previous_guids:
+                    previous_guids.discard(guid)
+                    change = "updated" if _changed_since(record, since) else None
+                else:
+                    change = "created"
+                if change:
+                    changes[change] += 1
+
+                records.append(record)
+                record_changes.append(change)
+                if len(records) >= INDEXD_RECORD_PAGE_SIZE:
+                    _write_page(records, record_changes)
+                    records = []
+                    record_changes = []
 
-    # remove existing output if it exists
-    if os.path.isfile(output_filename):
-        os.unlink(output_filename)
+            if records:
+                _write_page(records, record_changes)
+
+            # whatever is left in the previous manifest doesn't exist anymore
+            if previous_guids:
+                deleted = sorted(previous_guids)
+                columns = manifest_formats.records_to_columns(
+                    [{"did": guid} for guid in deleted]
+                )
+                columns["change"] = ["deleted"] * len(deleted)
+                delta_writer.write(
+                    manifest_formats.encode_columns(columns, output_format)
+                )
+                changes["deleted"] += len(deleted)
+
+    os.replace(output_filename + ".partial", output_filename)
+    os.replace(delta_filename + ".partial", delta_filename)
+
+    logging.info(f"changes since {since}: {changes}")
+    logging.info(
+        f"done writing output to file {output_filename} and delta to {delta_filename}"
+    )
 
-    with open(output_filename, "wb") as outfile:
-        outfile.write("guid,urls,authz,acl,md5,file_size,file_name\n".encode("utf8"))
-        for filename in glob.glob(TMP_FOLDER + "*"):
-            if output_filename == filename:
-                # don't want to copy the output into the output
-                continue
-            logging.info(f"combining {filename} into {output_filename}")
-            with open(filename, "rb") as readfile:
-                shutil.copyfileobj(readfile, outfile)
 
-    logging.info(f"done writing output to file {output_filename}")
+def _changed_since(record, since):
+    """
+    Whether the indexd record was updated (or created) after since.
 
+    Args:
+        record (dict): indexd record
+        since (datetime.datetime): naive UTC datetime
 
-@click.command()
-@click.option(
-    "--commons_url", help="Root domain (url) for a commons containing indexd."
-)
-@click.option(
-    "--pages",
-    help='Comma-Separated string of integers representing pages. ex: "2,4,5,6"',
-)
-@click.option(
-    "--num_processes",
-    type=int,
-    help="number of processes you are running so we can make sure we don't open "
-    'too many http connections. ex: "4"',
-)
-@click.option(
-    "--max_concurrent_requests",
-    type=int,
-    help="number of processes you are running so we can make sure we don't open "
-    'too many http connections. ex: "4"',
-)
-def write_page_records_to_files(
-    commons_url, pages, num_processes, max_concurrent_requests
-):
+    Returns:
+        bool: whether it changed, True if it doesn't have dates to tell
+    """
+    last_changed = record.get("updated_date") or record.get("created_date")
+    if not last_changed:
+        return True
+    return _parse_date(last_changed) > since
+
+
+def _parse_date(value):
     """
-    Command line interface function for requesting a number of pages of
-    records from indexd and writing to a file in that process. num_processes
-    is only used to calculate how many open connections this process should request.
+    Parse a date from indexd (or given by the user) to compare with others.
 
     Args:
-        commons_url (str): root domain for commons where indexd lives
-        pages (List[int/str]): List of indexd pages to request
-        num_processes (int): number of concurrent processes being requested
-            (including this one)
-        max_concurrent_requests (int): the maximum number of concurrent requests allowed
-            NOTE: This is the TOTAL number, not just for this process. Used to help
-            determine how many requests a process should be making at one time
+        value (datetime.datetime|str): datetime, or an ISO 8601 date/datetime
+            string like indexd's "2019-11-24T18:29:48.218761"
 
-    Raises:
-        AttributeError: No pages specified to get records from
+    Returns:
+        datetime.datetime: naive datetime in UTC
     """
-    if not pages:
-        raise AttributeError("No pages specified to get records from.")
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return value
+
+    for date_format in INDEXD_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    raise ValueError(f"Unable to parse date: {value}")
 
-    pages = pages.strip().split(",")
-    loop = asyncio.get_event_loop()
-    result = loop.run_until_complete(
-        _get_records_and_write_to_file(
-            commons_url, pages, num_processes, max_concurrent_requests
-        )
-    )
-    return result
 
+class _Checkpoint:
+    """
+    Progress of a download: how many pages (from the first) have been written
+    to the partial output, and its size in bytes after the last of them.
+    """
 
-async def _get_records_and_write_to_file(
-    commons_url, pages, num_processes, max_concurrent_requests
+    def __init__(self, filename, commons_url, page_size):
+        self.filename = filename
+        self.commons_url = commons_url
+        self.page_size = page_size
+        self.pages_written = 0
+        self.offset = 0
+
+    def load(self):
+        """
+        Load progress from the checkpoint file.
+
+        Returns:
+            bool: whether there was a usable checkpoint for the same commons and
+                page size
+        """
+        try:
+            with open(self.filename) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return False
+
+        if (
+            checkpoint.get("commons_url") != self.commons_url
+            or checkpoint.get("page_size") != self.page_size
+        ):
+            logging.warning(
+                f"ignoring checkpoint {self.filename} for a different download: "
+                f"{checkpoint}"
+            )
+            return False
+
+        self.pages_written = checkpoint["pages_written"]
+        self.offset = checkpoint["offset"]
+        return True
+
+    def save(self, pages_written, offset):
+        """
+        Record progress, atomically replacing the checkpoint file.
+        """
+        self.pages_written = pages_written
+        self.offset = offset
+        tmp_filename = self.filename + ".tmp"
+        with open(tmp_filename, "w") as checkpoint_file:
+            json.dump(
+                {
+                    "commons_url": self.commons_url,
+                    "page_size": self.page_size,
+                    "pages_written": pages_written,
+                    "offset": offset,
+                },
+                checkpoint_file,
+            )
+        os.replace(tmp_filename, self.filename)
+
+    def remove(self):
+        if os.path.isfile(self.filename):
+            os.unlink(self.filename)
+
+
+async def _write_pages_in_order(
+    index, pages, window, executor, ssl, writer, checkpoint
 ):
     """
-    Getting indexd records and writing to a file. This function
-    creates semaphores to limit the number of concurrent http connections that
-    get opened to send requests to indexd.
+    Request and format pages concurrently, but write them to the file in order,
+    saving a checkpoint after each one.
 
-    It then uses asyncio to start a number of coroutines. Steps:
-        1) requests to indexd to get records (writes resulting records to a queue)
-        2) puts a final "DONE" in the queue to stop coroutine that will read from queue
-        3) reading those records from the queue and writing to a file
+    A sliding window of at most `window` pages are requested/formatted at a time,
+    the oldest one is written as soon as it's done before the next page is
+    requested, which bounds both the concurrent requests and the memory used.
 
     Args:
-        commons_url (str): root domain for commons where indexd lives
-        pages (List[int/str]): List of indexd pages to request
-        num_processes (int): number of concurrent processes being requested
-            (including this one)
+        index (Gen3Index): index client to make requests with
+        pages (Iterable[int]): indexd pages to request, in output order
+        window (int): maximum number of pages in flight
+        executor (concurrent.futures.Executor): executor to format rows in, None
+            to format them in the event loop
+        ssl (None|bool): ssl setting for requests
+        writer (manifest_formats.ManifestWriter): writer for the output
+        checkpoint (_Checkpoint): progress of the download, None if the output
+            can't be resumed
     """
-    max_requests = int(max_concurrent_requests / num_processes)
-    logging.debug(f"max concurrent requests per process: {max_requests}")
-    lock = asyncio.Semaphore(max_requests)
-    queue = asyncio.Queue()
-    write_to_file_task = asyncio.ensure_future(_parse_from_queue(queue))
-    await asyncio.gather(
-        *(
-            _put_records_from_page_in_queue(page, commons_url, lock, queue)
-            for page in pages
-        )
-    )
-    await queue.put("DONE")
-    await write_to_file_task
-
 
-async def _put_records_from_page_in_queue(page, commons_url, lock, queue):
+    def _write(encoded_page):
+        writer.write(encoded_page)
+        if checkpoint:
+            checkpoint.save(checkpoint.pages_written + 1, writer.tell())
+
+    in_flight = deque()
+    try:
+        for page in pages:
+            if len(in_flight) >= window:
+                _write(await in_flight.popleft())
+            in_flight.append(
+                asyncio.ensure_future(
+                    _get_page_rows(index, page, executor, ssl, writer.output_format)
+                )
+            )
+
+        while in_flight:
+            _write(await in_flight.popleft())
+    finally:
+        # only has anything left to cancel when we failed part way through
+        for future in in_flight:
+            future.cancel()
+
+
+async def _get_page_rows(index, page, executor, ssl, output_format):
     """
-    Gets a semaphore then requests records for the given page and
-    puts them in a queue.
+    Request a page of records and format them into manifest rows.
 
     Args:
-        commons_url (str): root domain for commons where indexd lives
-        page (int/str): indexd page to request
-        lock (asyncio.Semaphore): semaphones used to limit ammount of concurrent http
-            connections
-        queue (asyncio.Queue): queue to put indexd records in
+        index (Gen3Index): index client to make requests with
+        page (int): indexd page to request
+        executor (concurrent.futures.Executor): executor to format rows in, None
+            to format them in the event loop
+        ssl (None|bool): ssl setting for requests
+        output_format (str): one of manifest_formats.OUTPUT_FORMATS
+
+    Returns:
+        bytes|Dict[str, list]: see manifest_formats.encode_columns
     """
-    index = Gen3Index(commons_url)
-    async with lock:
-        # default ssl handling unless it's explicitly http://
-        ssl = None
-        if "https" not in commons_url:
-            ssl = False
-
-        records = await index.async_get_records_on_page(
-            page=page, limit=INDEXD_RECORD_PAGE_SIZE, _ssl=ssl
+    records = await index.async_get_records_on_page(
+        page=page, limit=INDEXD_RECORD_PAGE_SIZE, _ssl=ssl
+    )
+    logging.debug(f"got {len(records or [])} records on page {page}")
+
+    if executor:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            executor, manifest_formats.format_records, records, output_format
         )
-        await queue.put(records)
+    return manifest_formats.format_records(records, output_format)
 
 
-async def _parse_from_queue(queue):
+@click.command()
+@click.option(
+    "--commons_url",
+    help="Root domain (url) for a commons containing indexd.",
+    required=True,
+)
+@click.option(
+    "--output_filename",
+    help="The path to the output manifest",
+    default="object-manifest.csv",
+)
+@click.option(
+    "--num_processes",
+    type=int,
+    help=f"Number of processes to format records with, defaults to {NUM_PROCESSES}. "
+    "Not supported with --previous_manifest",
+)
+@click.option(
+    "--max_concurrent_requests",
+    type=int,
+    help="Maximum number of concurrent requests to indexd",
+    default=MAX_CONCURRENT_REQUESTS,
+)
+@click.option(
+    "--output_format",
+    type=click.Choice(manifest_formats.OUTPUT_FORMATS),
+    help="Format of the output, determined from the output filename if not specified",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="Continue a previous, failed download to the same output from its checkpoint. "
+    "Not supported with --previous_manifest",
+)
+@click.option(
+    "--previous_manifest",
+    help="Manifest from a previous download, to also write a delta of the changes. "
+    "Records are then listed in a single serial listing (paging by did), formatted in "
+    "this process and without a checkpoint to resume from",
+)
+@click.option(
+    "--since",
+    help="When the previous manifest was downloaded (UTC), ex: 2020-06-01T00:00:00",
+)
+@click.option(
+    "--delta_filename",
+    help="The path to the delta output, defaults to the output with a .delta suffix",
+)
+def download_object_manifest_cli(
+    commons_url,
+    output_filename,
+    num_processes,
+    max_concurrent_requests,
+    output_format,
+    resume,
+    previous_manifest,
+    since,
+    delta_filename,
+):
     """
-    Read from the queue and write to a file
+    Commandline interface for downloading a manifest of all file objects in indexd
 
     Args:
-        queue (asyncio.Queue): queue to read indexd records from
+        commons_url (str): root domain for commons where indexd lives
+        output_filename (str): filename for output
+        num_processes (int): number of processes to format records with
+        max_concurrent_requests (int): the maximum number of concurrent requests
+        output_format (str): csv, csv.gz or parquet
+        resume (bool): continue from the checkpoint of a previous download
+        previous_manifest (str): manifest from a previous download
+        since (str): when previous_manifest was downloaded
+        delta_filename (str): filename for the delta output
     """
     loop = asyncio.get_event_loop()
-    file_name = TMP_FOLDER + f"{os.getpid()}.csv"
-    with open(file_name, "w+", encoding="utf8") as file:
-        logging.info(f"Write to {file_name}")
-        csv_writer = csv.writer(file)
-
-        records = await queue.get()
-        while records != "DONE":
-            if records:
-                for record in list(records):
-                    manifest_row = [
-                        record.get("did"),
-                        " ".join(
-                            [url.replace(" ", "%20") for url in record.get("urls")]
-                        ),
-                        " ".join(
-                            [auth.replace(" ", "%20") for auth in record.get("authz")]
-                        ),
-                        " ".join([a.replace(" ", "%20") for a in record.get("acl")]),
-                        record.get("hashes", {}).get("md5"),
-                        record.get("size"),
-                        record.get("file_name"),
-                    ]
-                    loop.run_in_executor(None, csv_writer.writerow, manifest_row)
-
-            records = await queue.get()
-
-        file.flush()
+    loop.run_until_complete(
+        async_download_object_manifest(
+            commons_url,
+            output_filename=output_filename,
+            num_processes=num_processes,
+            max_concurrent_requests=max_concurrent_requests,
+            resume=resume,
+            previous_manifest=previous_manifest,
+            since=since,
+            delta_filename=delta_filename,
+            output_format=output_format,
+        )
+    )
 
 
 if __name__ == "__main__":
     logging.basicConfig(filename="output.log", level=logging.DEBUG)
     logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
-    write_page_records_to_files()
+    download_object_manifest_cli()
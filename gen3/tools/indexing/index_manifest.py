@@ -24,12 +24,19 @@ Attributes:
     ACLS (list(string)): supported acl column names
     URLS (list(string)): supported url column names
     AUTHZ (list(string)): supported authz column names
+    DEFAULT_MAX_CONCURRENT_REQUESTS (int): default maximum number of records
+        async_index_object_manifest indexes at once
+    BULK_DOCUMENTS_BATCH_SIZE (int): number of existing records to request at
+        once before indexing
 
 
 Usages:
     python index_manifest.py --commons_url https://giangb.planx-pla.net  --manifest_file path_to_manifest --auth "admin,admin" --replace_urls False --thread_num 10
     python index_manifest.py --commons_url https://giangb.planx-pla.net  --manifest_file path_to_manifest --api_key ./credentials.json --replace_urls False --thread_num 10
+    python index_manifest.py --commons_url https://giangb.planx-pla.net  --manifest_file path_to_manifest --api_key ./credentials.json --replace_urls False --max_concurrent_requests 200
 """
+import aiohttp
+import asyncio
 import os
 import csv
 import click
@@ -38,10 +45,12 @@ import logging
 from multiprocessing.dummy import Pool as ThreadPool
 import threading
 import copy
+import requests
 import sys
 import traceback
 
 from gen3.auth import Gen3Auth
+from gen3.index import Gen3Index
 from gen3.tools.indexing.manifest_columns import (
     GUID_COLUMN_NAMES,
     GUID_STANDARD_KEY,
@@ -67,11 +76,16 @@ from gen3.utils import (
     SIZE_FORMAT,
     _verify_format,
     _standardize_str,
+    _parse_list_str,
+    create_async_session,
 )
+from gen3.tools.utils import iter_batches
 import indexclient.client as client
 
-
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_MAX_CONCURRENT_REQUESTS = 200
+BULK_DOCUMENTS_BATCH_SIZE = 1000
+REQUIRED_FILEINFO_KEYS = {URLS_STANDARD_KEY, MD5_STANDARD_KEY, SIZE_STANDARD_KEY}
 
 
 class ThreadControl(object):
@@ -85,6 +99,135 @@ class ThreadControl(object):
         self.num_total_files = num_total_files
 
 
+# supported column names for each standard column, with the format values are
+# verified against and its name for errors (in order of precedence)
+STANDARD_COLUMNS = [
+    (GUID_COLUMN_NAMES, GUID_STANDARD_KEY, None, None),
+    (FILENAME_COLUMN_NAMES, FILENAME_STANDARD_KEY, None, None),
+    (MD5_COLUMN_NAMES, MD5_STANDARD_KEY, MD5_FORMAT, "md5"),
+    (ACLS_COLUMN_NAMES, ACL_STANDARD_KEY, ACL_FORMAT, "acl"),
+    (URLS_COLUMN_NAMES, URLS_STANDARD_KEY, URL_FORMAT, "urls"),
+    (AUTHZ_COLUMN_NAMES, AUTHZ_STANDARD_KEY, AUTHZ_FORMAT, "authz"),
+    (SIZE_COLUMN_NAMES, SIZE_STANDARD_KEY, SIZE_FORMAT, "int"),
+]
+
+
+def get_manifest_column_mapping(fieldnames, include_additional_columns=False):
+    """
+    Resolve the columns of a manifest to the standard columns, once for the
+    whole manifest
+
+    Args:
+        fieldnames(list(str)): column names in the manifest
+        include_additional_columns(bool): keep the columns that aren't standard
+
+    Returns:
+        column_mapping(list(tuple)): (column name, output column name, format,
+            format name) for the columns to read, format is None for columns that
+            aren't verified
+        output_fieldnames(list(str)): field names with the standard columns renamed
+    """
+    column_mapping = []
+    output_fieldnames = []
+    for column_name in fieldnames:
+        output_column_name = None
+        value_format = None
+        format_name = None
+        for (
+            column_names,
+            standard_key,
+            standard_format,
+            standard_format_name,
+        ) in STANDARD_COLUMNS:
+            if column_name.lower() in column_names:
+                output_column_name = standard_key
+                value_format = standard_format
+                format_name = standard_format_name
+                break
+
+        output_fieldnames.append(output_column_name or column_name)
+        if not output_column_name and include_additional_columns:
+            output_column_name = column_name
+
+        if output_column_name:
+            column_mapping.append(
+                (column_name, output_column_name, value_format, format_name)
+            )
+
+    return column_mapping, output_fieldnames
+
+
+def iter_fileinfos_from_tsv_manifest(
+    manifest_file, manifest_file_delimiter="\t", include_additional_columns=False
+):
+    """
+    Read and verify file infos from a tsv manifest, a row at a time
+
+    Rows that don't pass the validation are logged and yielded as invalid, so
+    the manifest can be processed without loading it whole.
+
+    Args:
+        manifest_file(str): the path to the input manifest
+        manifest_file_delimiter(str): delimiter
+        include_additional_columns(bool): keep the columns that aren't standard
+
+    Yields:
+        tuple: file info(dict) in the format returned by
+            get_and_verify_fileinfos_from_tsv_manifest and whether the row
+            passed the validation(bool)
+    """
+    with open(manifest_file, "r", encoding="utf-8-sig") as csvfile:
+        csvReader = csv.DictReader(csvfile, delimiter=manifest_file_delimiter)
+        column_mapping, _ = get_manifest_column_mapping(
+            csvReader.fieldnames or [], include_additional_columns
+        )
+
+        for row_number, row in enumerate(csvReader, 1):
+            output_row = {}
+            is_row_valid = True
+            for (
+                column_name,
+                output_column_name,
+                value_format,
+                format_name,
+            ) in column_mapping:
+                value = row[column_name]
+                if value_format and not _verify_format(value, value_format):
+                    logging.error(f"ERROR: {value} is not in {format_name} format")
+                    is_row_valid = False
+
+                try:
+                    output_row[output_column_name] = (
+                        int(value)
+                        if output_column_name == SIZE_STANDARD_KEY
+                        else value.strip()
+                    )
+                except ValueError:
+                    # don't break
+                    pass
+
+            if not REQUIRED_FILEINFO_KEYS.issubset(output_row.keys()):
+                is_row_valid = False
+
+            if not is_row_valid:
+                logging.error(
+                    f"row {row_number} with values {row} does not pass the validation"
+                )
+
+            yield output_row, is_row_valid
+
+
+def iter_fileinfos_from_manifest(manifest_file, include_additional_columns=False):
+    """
+    Wrapper for above function to determine the delimeter based on file extention
+    """
+    return iter_fileinfos_from_tsv_manifest(
+        manifest_file=manifest_file,
+        manifest_file_delimiter=_get_manifest_delimiter(manifest_file),
+        include_additional_columns=include_additional_columns,
+    )
+
+
 def get_and_verify_fileinfos_from_tsv_manifest(
     manifest_file, manifest_file_delimiter="\t", include_additional_columns=False
 ):
@@ -109,103 +252,22 @@ def get_and_verify_fileinfos_from_tsv_manifest(
         headers(list(str)): field names
 
     """
-    files = []
     with open(manifest_file, "r", encoding="utf-8-sig") as csvfile:
-        csvReader = csv.DictReader(csvfile, delimiter=manifest_file_delimiter)
-        fieldnames = csvReader.fieldnames
+        fieldnames = csv.DictReader(
+            csvfile, delimiter=manifest_file_delimiter
+        ).fieldnames
 
-        logging.debug(f"got fieldnames from {manifest_file}: {fieldnames}")
-        pass_verification = True
-        is_row_valid = True
-        for row_number, row in enumerate(csvReader, 1):
-            output_row = {}
-            for current_column_name in row.keys():
-                output_column_name = None
-                if current_column_name.lower() in GUID_COLUMN_NAMES:
-                    fieldnames[
-                        fieldnames.index(current_column_name)
-                    ] = GUID_STANDARD_KEY
-                    output_column_name = GUID_STANDARD_KEY
-                elif current_column_name.lower() in FILENAME_COLUMN_NAMES:
-                    fieldnames[
-                        fieldnames.index(current_column_name)
-                    ] = FILENAME_STANDARD_KEY
-                    output_column_name = FILENAME_STANDARD_KEY
-                elif current_column_name.lower() in MD5_COLUMN_NAMES:
-                    fieldnames[fieldnames.index(current_column_name)] = MD5_STANDARD_KEY
-                    output_column_name = MD5_STANDARD_KEY
-                    if not _verify_format(row[current_column_name], MD5_FORMAT):
-                        logging.error(
-                            f"ERROR: {row[current_column_name]} is not in md5 format"
-                        )
-                        is_row_valid = False
-                elif current_column_name.lower() in ACLS_COLUMN_NAMES:
-                    fieldnames[fieldnames.index(current_column_name)] = ACL_STANDARD_KEY
-                    output_column_name = ACL_STANDARD_KEY
-                    if not _verify_format(row[current_column_name], ACL_FORMAT):
-                        logging.error(
-                            f"ERROR: {row[current_column_name]} is not in acl format"
-                        )
-                        is_row_valid = False
-                elif current_column_name.lower() in URLS_COLUMN_NAMES:
-                    fieldnames[
-                        fieldnames.index(current_column_name)
-                    ] = URLS_STANDARD_KEY
-                    output_column_name = URLS_STANDARD_KEY
-                    if not _verify_format(row[current_column_name], URL_FORMAT):
-                        logging.error(
-                            f"ERROR: {row[current_column_name]} is not in urls format"
-                        )
-                        is_row_valid = False
-                elif current_column_name.lower() in AUTHZ_COLUMN_NAMES:
-                    fieldnames[
-                        fieldnames.index(current_column_name)
-                    ] = AUTHZ_STANDARD_KEY
-                    output_column_name = AUTHZ_STANDARD_KEY
-                    if not _verify_format(row[current_column_name], AUTHZ_FORMAT):
-                        logging.error(
-                            f"ERROR: {row[current_column_name]} is not in authz format"
-                        )
-                        is_row_valid = False
-                elif current_column_name.lower() in SIZE_COLUMN_NAMES:
-                    fieldnames[
-                        fieldnames.index(current_column_name)
-                    ] = SIZE_STANDARD_KEY
-                    output_column_name = SIZE_STANDARD_KEY
-                    if not _verify_format(row[current_column_name], SIZE_FORMAT):
-                        logging.error(
-                            f"ERROR: {row[current_column_name]} is not in int format"
-                        )
-                        is_row_valid = False
-                elif include_additional_columns:
-                    output_column_name = current_column_name
-
-                if output_column_name:
-                    try:
-                        output_row[output_column_name] = (
-                            int(row[current_column_name])
-                            if output_column_name == SIZE_STANDARD_KEY
-                            else row[current_column_name].strip()
-                        )
-                    except ValueError:
-                        # don't break
-                        pass
-
-            if not {URLS_STANDARD_KEY, MD5_STANDARD_KEY, SIZE_STANDARD_KEY}.issubset(
-                set(output_row.keys())
-            ):
-                is_row_valid = False
+    logging.debug(f"got fieldnames from {manifest_file}: {fieldnames}")
+    _, fieldnames = get_manifest_column_mapping(fieldnames or [])
 
-            if not is_row_valid:
-                logging.error(
-                    f"row {row_number} with values {row} does not pass the validation"
-                )
-
-                # overall verification fails, but reset row validity
-                pass_verification = False
-                is_row_valid = True
-
-            files.append(output_row)
+    files = []
+    pass_verification = True
+    for output_row, is_row_valid in iter_fileinfos_from_tsv_manifest(
+        manifest_file, manifest_file_delimiter, include_additional_columns
+    ):
+        # overall verification fails if any row is invalid
+        pass_verification = pass_verification and is_row_valid
+        files.append(output_row)
 
     if not pass_verification:
         logging.error("The manifest is not in the correct format!!!")
@@ -220,19 +282,20 @@ def get_and_verify_fileinfos_from_manifest(
     """
     Wrapper for above function to determine the delimeter based on file extention
     """
-    manifest_file_ext = os.path.splitext(manifest_file)
-    if manifest_file_ext[-1].lower() == ".tsv":
-        manifest_file_delimiter = "\t"
-    else:
-        manifest_file_delimiter = ","
-
     return get_and_verify_fileinfos_from_tsv_manifest(
         manifest_file=manifest_file,
-        manifest_file_delimiter=manifest_file_delimiter,
+        manifest_file_delimiter=_get_manifest_delimiter(manifest_file),
         include_additional_columns=include_additional_columns,
     )
 
 
+def _get_manifest_delimiter(manifest_file):
+    manifest_file_ext = os.path.splitext(manifest_file)
+    if manifest_file_ext[-1].lower() == ".tsv":
+        return "\t"
+    return ","
+
+
 def _write_csv(filename, files, fieldnames=None):
     """
     write to csv file
@@ -268,13 +331,163 @@ def _write_csv(filename, files, fieldnames=None):
     return filename
 
 
-def _index_record(indexclient, replace_urls, thread_control, fi):
+def _parse_list_field(fi, key):
+    """
+    Parse a list field (like acl, authz, and urls) from the manifest, separated
+    by commas or spaces and optionally in brackets with quoted values
+    """
+    if key not in fi or fi[key] == "[]" or not fi[key]:
+        return []
+
+    return _parse_list_str(fi[key], unescape_spaces=True)
+
+
+def _parse_file_info(fi):
+    """
+    Parse the fields of a file info from the manifest into indexd values
+
+    Args:
+        fi(dict): file info
+
+    Returns:
+        tuple: urls(list), authz(list), acl(list), file_name(str)
+    """
+    urls = _parse_list_field(fi, URLS_STANDARD_KEY)
+    authz = _parse_list_field(fi, AUTHZ_STANDARD_KEY)
+
+    if ACL_STANDARD_KEY in fi and fi[ACL_STANDARD_KEY].strip().lower() in {
+        "[u'open']",
+        "['open']",
+    }:
+        acl = ["*"]
+    else:
+        acl = _parse_list_field(fi, ACL_STANDARD_KEY)
+
+    if FILENAME_STANDARD_KEY in fi:
+        file_name = _standardize_str(fi[FILENAME_STANDARD_KEY])
+    else:
+        file_name = ""
+
+    return urls, authz, acl, file_name
+
+
+def _is_same_file(record, fi):
+    """
+    Whether an existing indexd record has the size/hash of the file info
+    """
+    return record.get(SIZE_STANDARD_KEY) == fi.get(SIZE_STANDARD_KEY) and record.get(
+        "hashes", {}
+    ).get(MD5_STANDARD_KEY) == fi.get(MD5_STANDARD_KEY)
+
+
+def _get_record_updates(record, urls, authz, acl, file_name, replace_urls):
+    """
+    Get the attributes of an existing indexd record that need to be updated to
+    match the manifest
+
+    Args:
+        record(dict): existing indexd record
+        urls(list), authz(list), acl(list), file_name(str): values from the manifest
+        replace_urls(bool): replace urls or not (otherwise missing ones are added)
+
+    Returns:
+        dict: attributes to update, empty if the record is up to date
+    """
+    updates = {}
+    record_urls = record.get(URLS_STANDARD_KEY) or []
+
+    if replace_urls and set(urls) != set(record_urls):
+        updates[URLS_STANDARD_KEY] = urls
+
+        # indexd doesn't like when records have metadata for non-existing
+        # urls
+        updates["urls_metadata"] = {
+            url: copy.deepcopy(metadata)
+            for url, metadata in (record.get("urls_metadata") or {}).items()
+            if url in urls
+        }
+
+    elif not replace_urls:
+        missing_urls = [url for url in urls if url not in record_urls]
+        if missing_urls:
+            updates[URLS_STANDARD_KEY] = record_urls + missing_urls
+
+    if set(record.get(ACL_STANDARD_KEY) or []) != set(acl):
+        updates[ACL_STANDARD_KEY] = acl
+
+    if set(record.get(AUTHZ_STANDARD_KEY) or []) != set(authz):
+        updates[AUTHZ_STANDARD_KEY] = authz
+
+    if record.get(FILENAME_STANDARD_KEY) != file_name:
+        updates[FILENAME_STANDARD_KEY] = file_name
+
+    return updates
+
+
+def _get_new_record(fi, urls, authz, acl, file_name):
+    """
+    Get the indexd record to create for the file info
+    """
+    if fi.get(GUID_STANDARD_KEY):
+        guid = fi.get(GUID_STANDARD_KEY, "").strip()
+    else:
+        guid = None
+
+    return {
+        "did": guid,
+        "hashes": {MD5_STANDARD_KEY: fi.get(MD5_STANDARD_KEY, "").strip()},
+        SIZE_STANDARD_KEY: fi.get(SIZE_STANDARD_KEY, 0),
+        ACL_STANDARD_KEY: acl,
+        AUTHZ_STANDARD_KEY: authz,
+        URLS_STANDARD_KEY: urls,
+        FILENAME_STANDARD_KEY: file_name,
+    }
+
+
+def _log_progress(thread_control):
+    thread_control.num_processed_files += 1
+    if (thread_control.num_processed_files * 10) % thread_control.num_total_files == 0:
+        logging.info(
+            "Progress: {}%".format(
+                thread_control.num_processed_files
+                * 100.0
+                / thread_control.num_total_files
+            )
+        )
+
+
+def _patch_document(doc, urls, authz, acl, file_name, replace_urls):
+    """
+    Patch an existing indexd record with the updates it needs to match the
+    manifest, if any
+
+    Args:
+        doc(Document): indexclient document of the existing record
+        urls(list), authz(list), acl(list), file_name(str): values from the manifest
+        replace_urls(bool): replace urls or not
+    """
+    updates = _get_record_updates(
+        doc.to_json(), urls, authz, acl, file_name, replace_urls
+    )
+    for key, value in updates.items():
+        setattr(doc, key, value)
+
+    if updates:
+        logging.info(f"updating {doc.did} to: {doc.to_json()}")
+        doc.patch()
+
+
+def _index_record(indexclient, replace_urls, thread_control, existing_records, fi):
     """
     Index single file
 
     Args:
         indexclient(IndexClient): indexd client
         replace_urls(bool): replace urls or not
+        existing_records(dict): existing indexd records by guid, prefetched for
+            all the guids in the manifest, or None to request the file's record.
+            The records created or updated are stored back in it, so later rows
+            with the same guid don't use a stale rev
         fi(dict): file info
 
     Returns:
@@ -283,133 +496,51 @@ def _index_record(indexclient, replace_urls, thread_control, fi):
     """
 
     try:
-        urls = (
-            [
-                element.strip().replace("'", "").replace('"', "").replace("%20", " ")
-                for element in _standardize_str(fi[URLS_STANDARD_KEY])
-                .strip()
-                .lstrip("[")
-                .rstrip("]")
-                .split(" ")
-            ]
-            if URLS_STANDARD_KEY in fi
-            and fi[URLS_STANDARD_KEY] != "[]"
-            and fi[URLS_STANDARD_KEY]
-            else []
-        )
-        authz = (
-            [
-                element.strip().replace("'", "").replace('"', "").replace("%20", " ")
-                for element in _standardize_str(fi[AUTHZ_STANDARD_KEY])
-                .strip()
-                .lstrip("[")
-                .rstrip("]")
-                .split(" ")
-            ]
-            if AUTHZ_STANDARD_KEY in fi
-            and fi[AUTHZ_STANDARD_KEY] != "[]"
-            and fi[AUTHZ_STANDARD_KEY]
-            else []
-        )
-
-        if ACL_STANDARD_KEY in fi:
-            if fi[ACL_STANDARD_KEY].strip().lower() in {"[u'open']", "['open']"}:
-                acl = ["*"]
-            else:
-                acl = (
-                    [
-                        element.strip()
-                        .replace("'", "")
-                        .replace('"', "")
-                        .replace("%20", " ")
-                        for element in _standardize_str(fi[ACL_STANDARD_KEY])
-                        .strip()
-                        .lstrip("[")
-                        .rstrip("]")
-                        .split(" ")
-                    ]
-                    if ACL_STANDARD_KEY in fi
-                    and fi[ACL_STANDARD_KEY] != "[]"
-                    and fi[ACL_STANDARD_KEY]
-                    else []
-                )
-        else:
-            acl = []
-
-        if FILENAME_STANDARD_KEY in fi:
-            file_name = _standardize_str(fi[FILENAME_STANDARD_KEY])
-        else:
-            file_name = ""
+        urls, authz, acl, file_name = _parse_file_info(fi)
 
         doc = None
 
-        if fi.get(GUID_STANDARD_KEY):
+        if existing_records is not None:
+            record = existing_records.get(fi.get(GUID_STANDARD_KEY))
+            if record is not None and "rev" in record:
+                doc = client.Document(
+                    indexclient, record["did"], json=copy.deepcopy(record)
+                )
+            elif record is not None:
+                # created by an earlier row, the response to the create doesn't
+                # have the rev needed to update it
+                doc = indexclient.get(record["did"])
+        elif fi.get(GUID_STANDARD_KEY):
             doc = indexclient.get(fi[GUID_STANDARD_KEY])
 
         if doc is not None:
-            if doc.size != fi.get(SIZE_STANDARD_KEY) or doc.hashes.get(
-                MD5_STANDARD_KEY
-            ) != fi.get(MD5_STANDARD_KEY):
+            if not _is_same_file(doc.to_json(), fi):
                 logging.error(
                     "The guid {} with different size/hash already exist. Can not index it without getting a new guid".format(
                         fi.get(GUID_STANDARD_KEY)
                     )
                 )
             else:
-                need_update = False
-
-                if replace_urls and set(urls) != set(doc.urls):
-                    doc.urls = urls
-                    need_update = True
-
-                    # indexd doesn't like when records have metadata for non-existing
-                    # urls
-                    new_urls_metadata = copy.deepcopy(doc.urls_metadata)
-                    for url, metadata in doc.urls_metadata.items():
-                        if url not in urls:
-                            del new_urls_metadata[url]
-                    doc.urls_metadata = new_urls_metadata
-
-                elif not replace_urls:
-                    for url in urls:
-                        if url not in doc.urls:
-                            doc.urls.append(url)
-                            need_update = True
-
-                if set(doc.acl) != set(acl):
-                    doc.acl = acl
-                    need_update = True
-
-                if set(doc.authz) != set(authz):
-                    doc.authz = authz
-                    need_update = True
-
-                if doc.file_name != file_name:
-                    doc.file_name = file_name
-                    need_update = True
-
-                if need_update:
-                    logging.info(f"updating {doc.did} to: {doc.to_json()}")
-                    doc.patch()
+                try:
+                    _patch_document(doc, urls, authz, acl, file_name, replace_urls)
+                except requests.HTTPError as e:
+                    if e.response is None or e.response.status_code != 409:
+                        raise
+                    # the record changed since it was requested (ex: by another
+                    # row with the same guid), request it again for its current rev
+                    doc = indexclient.get(doc.did)
+                    _patch_document(doc, urls, authz, acl, file_name, replace_urls)
+
+                if existing_records is not None:
+                    existing_records[doc.did] = doc.to_json()
         else:
-            if fi.get(GUID_STANDARD_KEY):
-                guid = fi.get(GUID_STANDARD_KEY, "").strip()
-            else:
-                guid = None
-
-            record = {
-                "did": guid,
-                "hashes": {MD5_STANDARD_KEY: fi.get(MD5_STANDARD_KEY, "").strip()},
-                SIZE_STANDARD_KEY: fi.get(SIZE_STANDARD_KEY, 0),
-                ACL_STANDARD_KEY: acl,
-                AUTHZ_STANDARD_KEY: authz,
-                URLS_STANDARD_KEY: urls,
-                FILENAME_STANDARD_KEY: file_name,
-            }
+            record = _get_new_record(fi, urls, authz, acl, file_name)
             logging.info(f"creating: {record}")
             doc = indexclient.create(**record)
 
             fi[GUID_STANDARD_KEY] = doc.did
+            if existing_records is not None:
+                existing_records[doc.did] = dict(record, did=doc.did)
 
     except Exception as e:
         # Don't break for any reason
@@ -421,17 +552,142 @@ def _index_record(indexclient, replace_urls, thread_control, fi):
             )
         )
 
-    thread_control.mutexLock.acquire()
-    thread_control.num_processed_files += 1
-    if (thread_control.num_processed_files * 10) % thread_control.num_total_files == 0:
-        logging.info(
-            "Progress: {}%".format(
-                thread_control.num_processed_files
-                * 100.0
-                / thread_control.num_total_files
+    with thread_control.mutexLock:
+        _log_progress(thread_control)
+
+
+async def _async_update_record(
+    index, record, urls, authz, acl, file_name, replace_urls, ssl
+):
+    """
+    Update an existing indexd record with the updates it needs to match the
+    manifest, if any
+
+    Args:
+        index(Gen3Index): index client to make requests with
+        record(dict): existing indexd record
+        urls(list), authz(list), acl(list), file_name(str): values from the manifest
+        replace_urls(bool): replace urls or not
+        ssl(None|bool): ssl setting for requests
+
+    Returns:
+        dict: the record with the updates and its new rev
+    """
+    updates = _get_record_updates(record, urls, authz, acl, file_name, replace_urls)
+    if not updates:
+        return record
+
+    logging.info(f"updating {record['did']} with: {updates}")
+    response = await index.async_update_record(
+        record["did"], rev=record.get("rev"), _ssl=ssl, **updates
+    )
+    return dict(record, rev=response.get("rev"), **updates)
+
+
+async def _async_index_record(
+    index, replace_urls, thread_control, existing_records, ssl, fi
+):
+    """
+    Index single file, asynchronously
+
+    Args:
+        index(Gen3Index): index client to make requests with
+        replace_urls(bool): replace urls or not
+        thread_control(ThreadControl): progress of the indexing
+        existing_records(dict): existing indexd records by guid, prefetched for
+            all the guids in the manifest, or None to request the file's record.
+            The records created or updated are stored back in it, so later rows
+            with the same guid don't use a stale rev
+        ssl(None|bool): ssl setting for requests
+        fi(dict): file info
+
+    Returns:
+        None
+    """
+    try:
+        urls, authz, acl, file_name = _parse_file_info(fi)
+
+        record = None
+
+        if existing_records is not None:
+            record = existing_records.get(fi.get(GUID_STANDARD_KEY))
+        elif fi.get(GUID_STANDARD_KEY):
+            record = await index.async_get_record(fi[GUID_STANDARD_KEY], _ssl=ssl)
+
+        if record is not None:
+            if not _is_same_file(record, fi):
+                logging.error(
+                    "The guid {} with different size/hash already exist. Can not index it without getting a new guid".format(
+                        fi.get(GUID_STANDARD_KEY)
+                    )
+                )
+            else:
+                try:
+                    record = await _async_update_record(
+                        index, record, urls, authz, acl, file_name, replace_urls, ssl
+                    )
+                except aiohttp.ClientResponseError as e:
+                    if e.status != 409:
+                        raise
+                    # the record changed since it was requested (ex: by another
+                    # row with the same guid), request it again for its current rev
+                    record = await index.async_get_record(record["did"], _ssl=ssl)
+                    record = await _async_update_record(
+                        index, record, urls, authz, acl, file_name, replace_urls, ssl
+                    )
+
+                if existing_records is not None:
+                    existing_records[record["did"]] = record
+        else:
+            record = _get_new_record(fi, urls, authz, acl, file_name)
+            logging.info(f"creating: {record}")
+            response = await index.async_create_record(**record, _ssl=ssl)
+
+            fi[GUID_STANDARD_KEY] = response.get("did")
+            if existing_records is not None:
+                existing_records[response.get("did")] = dict(
+                    record, did=response.get("did"), rev=response.get("rev")
+                )
+
+    except Exception as e:
+        # Don't break for any reason
+        exc_info = sys.exc_info()
+        traceback.print_exception(*exc_info)
+        logging.error(
+            "Can not update/create an indexd record with guid {}. Detail {}".format(
+                fi.get(GUID_STANDARD_KEY), e
             )
         )
-    thread_control.mutexLock.release()
+
+    _log_progress(thread_control)
+
+
+async def _async_run_workers(num_workers, items, process):
+    """
+    Process items with a fixed pool of workers pulling from a shared iterator, so
+    only num_workers items are in flight (and in memory as tasks) at a time no
+    matter how many items there are.
+
+    If any worker fails, the others are cancelled and the exception is raised.
+
+    Args:
+        num_workers(int): number of items to process at once
+        items(iterable): items to process
+        process(function): coroutine function processing a single item
+    """
+    items = iter(items)
+
+    async def _worker():
+        for item in items:
+            await process(item)
+
+    workers = [asyncio.ensure_future(_worker()) for _ in range(num_workers)]
+    try:
+        await asyncio.gather(*workers)
+    except BaseException:
+        for worker in workers:
+            worker.cancel()
+        raise
 
 
 def index_object_manifest(
@@ -442,6 +698,7 @@ def index_object_manifest(
     replace_urls=True,
     manifest_file_delimiter=None,
     output_filename="indexing-output-manifest.csv",
+    prefetch_existing_records=True,
 ):
     """
     Loop through all the files in the manifest, update/create records in indexd
@@ -454,6 +711,10 @@ def index_object_manifest(
         auth(Gen3Auth): Gen3 auth or tuple with basic auth name and password
         replace_urls(bool): flag to indicate if replace urls or not
         manifest_file_delimiter(str): manifest's delimiter
+        output_filename(str): path to the output manifest
+        prefetch_existing_records(bool): request the existing records for all the
+            guids in the manifest in batches (with indexd's bulk/documents) before
+            indexing, instead of one request per row
 
     Returns:
         files(list(dict)): list of file info
@@ -470,6 +731,196 @@ def index_object_manifest(
 
     """
     logging.info("Start the process ...")
+    commons_url = _get_index_url(commons_url)
+    indexclient = client.IndexClient(commons_url, "v0", auth=auth)
+
+    files, headers = _read_manifest_for_indexing(manifest_file, manifest_file_delimiter)
+
+    # Early terminate
+    if not files:
+        return None, None
+
+    pool = ThreadPool(thread_num)
+
+    try:
+        existing_records = None
+        if prefetch_existing_records:
+            existing_records = _get_existing_records(
+                Gen3Index(commons_url, auth_provider=auth), files, pool
+            )
+
+        thread_control = ThreadControl(num_total_files=len(files))
+        part_func = partial(
+            _index_record, indexclient, replace_urls, thread_control, existing_records
+        )
+
+        pool.map_async(part_func, files).get()
+    except KeyboardInterrupt:
+        pool.terminate()
+
+    # close the pool and wait for the work to finish
+    pool.close()
+    pool.join()
+
+    _write_indexing_output(output_filename, files, headers)
+
+    return files, headers
+
+
+def _get_existing_records(index, files, pool):
+    """
+    Request the existing indexd records for all the guids in the manifest, in
+    batches of BULK_DOCUMENTS_BATCH_SIZE
+
+    Args:
+        index(Gen3Index): index client to make requests with
+        files(list(dict)): list of file info
+        pool(ThreadPool): pool to request batches concurrently with
+
+    Returns:
+        dict: existing indexd records by guid
+    """
+    guids = list({fi[GUID_STANDARD_KEY] for fi in files if fi.get(GUID_STANDARD_KEY)})
+    batches = [
+        guids[i : i + BULK_DOCUMENTS_BATCH_SIZE]
+        for i in range(0, len(guids), BULK_DOCUMENTS_BATCH_SIZE)
+    ]
+    logging.info(
+        f"requesting existing records for {len(guids)} guids in {len(batches)} batches"
+    )
+
+    existing_records = {}
+    for records in pool.imap_unordered(index.get_records, batches):
+        for record in records or []:
+            existing_records[record["did"]] = record
+
+    logging.info(f"{len(existing_records)} records already exist in indexd")
+    return existing_records
+
+
+async def _async_get_existing_records(index, files, ssl, max_concurrent_requests):
+    """
+    Request the existing indexd records for all the guids in the manifest, in
+    batches of BULK_DOCUMENTS_BATCH_SIZE, asynchronously
+
+    Args:
+        index(Gen3Index): index client to make requests with
+        files(list(dict)): list of file info
+        ssl(None|bool): ssl setting for requests
+        max_concurrent_requests(int): maximum number of batches to request at once
+
+    Returns:
+        dict: existing indexd records by guid
+    """
+    guids = list({fi[GUID_STANDARD_KEY] for fi in files if fi.get(GUID_STANDARD_KEY)})
+    logging.info(
+        f"requesting existing records for {len(guids)} guids in batches of "
+        f"{BULK_DOCUMENTS_BATCH_SIZE}"
+    )
+
+    existing_records = {}
+
+    async def _get_batch(batch):
+        records = await index.async_get_records(batch, _ssl=ssl)
+        for record in records or []:
+            existing_records[record["did"]] = record
+
+    await _async_run_workers(
+        max_concurrent_requests,
+        iter_batches(guids, BULK_DOCUMENTS_BATCH_SIZE),
+        _get_batch,
+    )
+
+    logging.info(f"{len(existing_records)} records already exist in indexd")
+    return existing_records
+
+
+async def async_index_object_manifest(
+    commons_url,
+    manifest_file,
+    max_concurrent_requests=DEFAULT_MAX_CONCURRENT_REQUESTS,
+    auth=None,
+    replace_urls=True,
+    manifest_file_delimiter=None,
+    output_filename="indexing-output-manifest.csv",
+    prefetch_existing_records=True,
+):
+    """
+    Loop through all the files in the manifest, update/create records in indexd
+    update indexd if the url is not in the record url list or acl has changed.
+
+    Same as index_object_manifest, but records are indexed concurrently with
+    asyncio from a single thread, sharing one pooled session, instead of a
+    thread per concurrent request. A fixed pool of max_concurrent_requests workers
+    goes through the files, so memory doesn't grow with the size of the manifest
+    beyond the files themselves.
+
+    Args:
+        commons_url(str): common url
+        manifest_file(str): path to the manifest
+        max_concurrent_requests(int): maximum number of records to index at once
+        auth(Gen3Auth): Gen3 auth or tuple with basic auth name and password
+        replace_urls(bool): flag to indicate if replace urls or not
+        manifest_file_delimiter(str): manifest's delimiter
+        output_filename(str): path to the output manifest
+        prefetch_existing_records(bool): request the existing records for all the
+            guids in the manifest in batches (with indexd's bulk/documents) before
+            indexing, instead of one request per row
+
+    Returns:
+        files(list(dict)): list of file info, see index_object_manifest
+        headers(list(str)): list of fieldnames
+    """
+    logging.info("Start the process ...")
+    commons_url = _get_index_url(commons_url)
+
+    files, headers = _read_manifest_for_indexing(manifest_file, manifest_file_delimiter)
+
+    # Early terminate
+    if not files:
+        return None, None
+
+    # default ssl handling unless it's explicitly http://
+    ssl = None
+    if "https" not in commons_url:
+        ssl = False
+
+    max_concurrent_requests = max(int(max_concurrent_requests), 1)
+    thread_control = ThreadControl(num_total_files=len(files))
+
+    async with create_async_session(
+        max_connections_per_host=max_concurrent_requests
+    ) as session:
+        index = Gen3Index(commons_url, auth_provider=auth, async_session=session)
+
+        existing_records = None
+        if prefetch_existing_records:
+            existing_records = await _async_get_existing_records(
+                index, files, ssl, max_concurrent_requests
+            )
+
+        await _async_run_workers(
+            max_concurrent_requests,
+            files,
+            partial(
+                _async_index_record,
+                index,
+                replace_urls,
+                thread_control,
+                existing_records,
+                ssl,
+            ),
+        )
+
+    _write_indexing_output(output_filename, files, headers)
+
+    return files, headers
+
+
+def _get_index_url(commons_url):
+    """
+    Get the url of indexd for the commons
+    """
     service_location = "index"
     commons_url = commons_url.strip("/")
     # if running locally, indexd is deployed by itself without a location relative
@@ -480,8 +931,17 @@ def index_object_manifest(
     if not commons_url.endswith(service_location):
         commons_url += "/" + service_location
 
-    indexclient = client.IndexClient(commons_url, "v0", auth=auth)
+    return commons_url
 
+
+def _read_manifest_for_indexing(manifest_file, manifest_file_delimiter=None):
+    """
+    Read and verify the manifest to index
+
+    Returns:
+        files(list(dict)): list of file info, empty if it can't be read or is invalid
+        headers(list(str)): list of fieldnames for the output, including guid
+    """
     # if delimter not specified, try to get based on file ext
     if not manifest_file_delimiter:
         file_ext = os.path.splitext(manifest_file)
@@ -499,31 +959,23 @@ def index_object_manifest(
         exc_info = sys.exc_info()
         traceback.print_exception(*exc_info)
         logging.error("Can not read {}. Detail {}".format(manifest_file, e))
-        return None, None
+        return [], []
 
-    # Early terminate
     if not files:
-        return None, None
+        return [], []
 
     try:
         headers.index(GUID_STANDARD_KEY)
     except ValueError:
         headers.insert(0, GUID_STANDARD_KEY)
 
-    pool = ThreadPool(thread_num)
-
-    thread_control = ThreadControl(num_total_files=len(files))
-    part_func = partial(_index_record, indexclient, replace_urls, thread_control)
-
-    try:
-        pool.map_async(part_func, files).get()
-    except KeyboardInterrupt:
-        pool.terminate()
+    return files, headers
 
-    # close the pool and wait for the work to finish
-    pool.close()
-    pool.join()
 
+def _write_indexing_output(output_filename, files, headers):
+    """
+    Write the indexed files, with the guids of created records, to the output
+    """
     output_filename = os.path.abspath(output_filename)
     logging.info(f"Writing output to {output_filename}")
 
@@ -533,8 +985,6 @@ def index_object_manifest(
 
     _write_csv(os.path.join(CURRENT_DIR, output_filename), files, headers)
 
-    return files, headers
-
 
 @click.command()
 @click.option(
@@ -544,6 +994,11 @@ def index_object_manifest(
 )
 @click.option("--manifest_file", help="The path to input manifest")
 @click.option("--thread_num", type=int, help="Number of threads", default=1)
+@click.option(
+    "--max_concurrent_requests",
+    type=int,
+    help="Index asynchronously with up to this many concurrent requests, instead of with threads",
+)
 @click.option("--api_key", help="path to api key")
 @click.option("--auth", help="basic auth")
 @click.option("--replace_urls", type=bool, help="Replace urls or not", default=False)
@@ -561,6 +1016,7 @@ def index_object_manifest_cli(
     commons_url,
     manifest_file,
     thread_num,
+    max_concurrent_requests,
     api_key,
     auth,
     replace_urls,
@@ -574,6 +1030,8 @@ def index_object_manifest_cli(
         commons_url (str): root domain for common
         manifest_file (str): the full path to the manifest
         thread_num (int): number of threads being requested
+        max_concurrent_requests (int): index asynchronously with up to this many
+            concurrent requests instead, ignoring thread_num
         api_key (str): the path to api key
         auth(str): the basic auth
         replace_urls(bool): Replace urls or not
@@ -589,15 +1047,29 @@ def index_object_manifest_cli(
     else:
         auth = tuple(auth.split(",")) if auth else None
 
-    files, headers = index_object_manifest(
-        commons_url + "/index",
-        manifest_file,
-        int(thread_num),
-        auth,
-        replace_urls,
-        manifest_file_delimiter,
-        output_filename=out_manifest_file,
-    )
+    if max_concurrent_requests:
+        loop = asyncio.get_event_loop()
+        files, headers = loop.run_until_complete(
+            async_index_object_manifest(
+                commons_url + "/index",
+                manifest_file,
+                int(max_concurrent_requests),
+                auth,
+                replace_urls,
+                manifest_file_delimiter,
+                output_filename=out_manifest_file,
+            )
+        )
+    else:
+        files, headers = index_object_manifest(
+            commons_url + "/index",
+            manifest_file,
+            int(thread_num),
+            auth,
+            replace_urls,
+            manifest_file_delimiter,
+            output_filename=out_manifest_file,
+        )
 
 
 if __name__ == "__main__":
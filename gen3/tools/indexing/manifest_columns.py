@@ -1,10 +1,13 @@
 """
 Classes to be used in the identification and validation of manifest columns
 """
+
+import re
 import warnings
 from abc import ABC
 from enum import Enum, unique
 
+import pandas as pd
 import string
 from urllib.parse import urlparse
 from base64 import b64encode, b64decode
@@ -43,6 +46,9 @@ TYPE_COLUMN_NAME = ["type", "types"]
 
 ALIASES_COLUMN_NAME = ["alias", "aliases"]
 
+# characters that separate multiple values, see Validator._parse_multiple_values
+MULTIPLE_VALUES_SEPARATOR = r"[\s\[\],\"']"
+
 
 @unique
 class Columns(Enum):
@@ -96,6 +102,62 @@ class Validator(ABC):
             value = value[1:-1]
         self._validate_single_value(value)
 
+    def validate_batch(self, values):
+        """
+        Validates a whole column of values at once. Values are first matched
+        against a pattern of valid values in a single vectorized pass, and only
+        the values that don't match are validated one at a time with validate,
+        so the errors are the same as calling validate on each value.
+
+        Args:
+            values(list(str) or pandas.Series): values to be validated. missing
+                values (None or NaN) are validated as empty values
+
+        Returns:
+            list(tuple): (index, error) for each empty or invalid value, in the
+                order of values. index is the index of the value in values
+                (i.e. its position for a list, its label for a pandas.Series)
+                and error is the EmptyWarning, ValueError or MultiValueError
+                that validate raises for the value
+        """
+        values = pd.Series(values, dtype=object)
+        # object dtype so values are matched with the re module
+        values = values.where(values.notna(), "").astype(str).astype(object)
+        valid = values.str.match(self._valid_values_pattern).to_numpy(dtype=bool)
+
+        errors = []
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", EmptyWarning)
+            for index, value in values[~valid].items():
+                try:
+                    self.validate(value)
+                except (EmptyWarning, ValueError) as e:
+                    errors.append((index, e))
+        return errors
+
+    @staticmethod
+    def _get_valid_values_pattern(value_pattern, multiple_values=False):
+        """
+        Compiles a pattern that only matches valid values, for validate_batch.
+        Values that don't match it are not necessarily invalid, they are
+        validated one at a time
+
+        Args:
+            value_pattern(str): pattern of a single valid value
+            multiple_values(bool): whether to match one or more values as they
+                are extracted by _parse_multiple_values. if False, the value
+                can be enclosed by a pair of double quotes
+
+        Returns:
+            re.Pattern: compiled pattern
+        """
+        if multiple_values:
+            separator = MULTIPLE_VALUES_SEPARATOR
+            return re.compile(
+                rf"{separator}*(?:{value_pattern})(?:{separator}+(?:{value_pattern}))*{separator}*\Z"
+            )
+        return re.compile(rf'(?:{value_pattern}|"(?:{value_pattern})")\Z')
+
     def _validate_mulitple_values(self, values):
         """
         Validates all individual values that can be extracted from values
@@ -210,6 +272,11 @@ class MD5Validator(Validator):
             encoding
         """
         self._allow_base64_encoding = allow_base64_encoding
+        md5_pattern = "[0-9a-fA-F]{32}"
+        if allow_base64_encoding:
+            # 128 bits encode to 21 characters and one with 2 bits of padding
+            md5_pattern = f"{md5_pattern}|[A-Za-z0-9+/]{{21}}[AQgw]=="
+        self._valid_values_pattern = self._get_valid_values_pattern(md5_pattern)
 
     def _validate_single_value(self, md5_hash):
         """
@@ -263,6 +330,8 @@ class SizeValidator(Validator):
 
     ALLOWED_COLUMN_NAMES = SIZE_COLUMN_NAMES
 
+    _valid_values_pattern = Validator._get_valid_values_pattern("[0-9]+")
+
     @staticmethod
     def _validate_single_value(size):
         """
@@ -320,6 +389,17 @@ class URLValidator(Validator):
         self._allowed_protocols = allowed_protocols
         self._error_on_empty = error_on_empty
         self._expectation_message = f'expecting URL in format "<protocol>://<hostname>/<path>", with protocol being one of {self._allowed_protocols}'
+        # urlparse lowercases the protocol, other protocols are validated one
+        # at a time
+        protocols = "|".join(
+            re.escape(p) for p in self._allowed_protocols if p == p.lower()
+        )
+        hostname = "[A-Za-z0-9._~%!$&()*+=:@-]+"
+        path = r"/[^\s\x00-\x1f\x7f\[\],\"'?#;]+"
+        self._valid_values_pattern = self._get_valid_values_pattern(
+            f"(?:{protocols})://{hostname}{path}" if protocols else "(?!)",
+            multiple_values=True,
+        )
 
     def validate(self, urls):
         """
@@ -384,6 +464,10 @@ class AuthzValidator(Validator):
         """
         self._error_on_empty = False
         self._expectation_message = f'expecting authz resource in format "/<resource>/<subresource>/.../<subresource>"'
+        subresource = r"[^/\s\[\],\"']+"
+        self._valid_values_pattern = self._get_valid_values_pattern(
+            f"/+{subresource}(?:/{subresource})*/*", multiple_values=True
+        )
 
     def validate(self, authz_resources):
         """
@@ -0,0 +1,358 @@
+"""
+Output formats for object manifests downloaded from indexd.
+
+Records are converted a page at a time into columns (one list of values per
+field), which are then either encoded as CSV rows (optionally gzip compressed)
+or buffered into Parquet row groups.
+
+In CSV, fields that are lists (like acl, authz, and urls) separate the values
+with spaces (and spaces in the values are escaped as %20). In Parquet they're
+kept as lists of strings.
+
+Parquet support requires pyarrow, installed with the parquet extra
+(pip install "gen3[parquet]").
+
+Attributes:
+    CSV (str): Comma-Separated Value format
+    CSV_GZIP (str): gzip compressed Comma-Separated Value format. Each page is
+        compressed as a separate gzip member, the file is still a valid gzip file.
+    PARQUET (str): Apache Parquet format
+    OUTPUT_FORMATS (Tuple[str]): supported formats
+    MANIFEST_COLUMNS (List[str]): columns in a manifest, in order
+    LIST_COLUMNS (Set[str]): columns with a list of values
+    PARQUET_ROW_GROUP_SIZE (int): number of rows to buffer per Parquet row group
+"""
+
+import csv
+import gzip
+import io
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+CSV = "csv"
+CSV_GZIP = "csv.gz"
+PARQUET = "parquet"
+OUTPUT_FORMATS = (CSV, CSV_GZIP, PARQUET)
+FILE_EXTENSIONS = {CSV: ".csv", CSV_GZIP: ".csv.gz", PARQUET: ".parquet"}
+
+MANIFEST_COLUMNS = ["guid", "urls", "authz", "acl", "md5", "file_size", "file_name"]
+LIST_COLUMNS = {"urls", "authz", "acl"}
+INTEGER_COLUMNS = {"file_size"}
+
+PARQUET_ROW_GROUP_SIZE = 128 * 1024
+
+
+def get_output_format(filename, output_format=None):
+    """
+    Get the output format to use for the file, checking that it's supported.
+
+    Args:
+        filename (str): output filename, the format is determined from the
+            extension if not specified (.parquet, .gz, otherwise csv)
+        output_format (str, optional): one of OUTPUT_FORMATS
+
+    Returns:
+        str: one of OUTPUT_FORMATS
+
+    Raises:
+        ValueError: unknown output format
+        ImportError: pyarrow isn't installed for Parquet output
+    """
+    if not output_format:
+        lowercase_filename = filename.lower()
+        if lowercase_filename.endswith(".parquet"):
+            output_format = PARQUET
+        elif lowercase_filename.endswith(".gz"):
+            output_format = CSV_GZIP
+        else:
+            output_format = CSV
+
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(
+            f"Unknown output format {output_format}, must be one of {OUTPUT_FORMATS}"
+        )
+
+    if output_format == PARQUET and pyarrow is None:
+        raise ImportError(
+            "pyarrow is required for Parquet output, install it with the parquet "
+            'extra: pip install "gen3[parquet]"'
+        )
+
+    return output_format
+
+
+def add_filename_suffix(filename, suffix, output_format):
+    """
+    Add a suffix to the filename, before its extension.
+
+    Example:
+        add_filename_suffix("manifest.csv.gz", ".delta", CSV_GZIP)
+        -> "manifest.delta.csv.gz"
+    """
+    extension = FILE_EXTENSIONS[output_format]
+    if filename.lower().endswith(extension):
+        return filename[: -len(extension)] + suffix + filename[-len(extension) :]
+    return filename + suffix
+
+
+def records_to_columns(records):
+    """
+    Convert indexd records to manifest columns.
+
+    Args:
+        records (List[dict]): indexd records
+
+    Returns:
+        Dict[str, list]: values for each of MANIFEST_COLUMNS
+    """
+    columns = {column: [] for column in MANIFEST_COLUMNS}
+    for record in records or []:
+        columns["guid"].append(record.get("did"))
+        columns["urls"].append(list(record.get("urls") or []))
+        columns["authz"].append(list(record.get("authz") or []))
+        columns["acl"].append(list(record.get("acl") or []))
+        columns["md5"].append(record.get("hashes", {}).get("md5"))
+        columns["file_size"].append(record.get("size"))
+        columns["file_name"].append(record.get("file_name"))
+    return columns
+
+
+def encode_columns(columns, output_format):
+    """
+    Encode manifest columns for writing with a ManifestWriter.
+
+    Args:
+        columns (Dict[str, list]): values for each column
+        output_format (str): one of OUTPUT_FORMATS
+
+    Returns:
+        bytes|Dict[str, list]: encoded rows, or the columns as-is for Parquet
+    """
+    if output_format == PARQUET:
+        return columns
+
+    output = io.StringIO()
+    csv_writer = csv.writer(output)
+    csv_writer.writerows(
+        zip(*(_csv_values(column, values) for column, values in columns.items()))
+    )
+    data = output.getvalue().encode("utf8")
+
+    if output_format == CSV_GZIP:
+        return gzip.compress(data)
+    return data
+
+
+def format_records(records, output_format):
+    """
+    Convert indexd records and encode them for writing with a ManifestWriter.
+    Can be used in a process pool.
+
+    Args:
+        records (List[dict]): indexd records
+        output_format (str): one of OUTPUT_FORMATS
+
+    Returns:
+        bytes|Dict[str, list]: see encode_columns
+    """
+    return encode_columns(records_to_columns(records), output_format)
+
+
+def _csv_values(column, values):
+    if column in LIST_COLUMNS:
+        return [
+            " ".join([item.replace(" ", "%20") for item in value]) for value in values
+        ]
+    return values
+
+
+def open_manifest_writer(filename, output_format, columns, resume_offset=None):
+    """
+    Open a writer for the manifest file.
+
+    Args:
+        filename (str): file to write
+        output_format (str): one of OUTPUT_FORMATS
+        columns (List[str]): column names, in order
+        resume_offset (int, optional): continue writing a file previously written
+            up to this offset (see ManifestWriter.tell), instead of starting over.
+            Only for writers that are resumable.
+
+    Returns:
+        ManifestWriter: writer
+    """
+    if output_format == PARQUET:
+        if resume_offset is not None:
+            raise ValueError("Parquet output can't be resumed")
+        return _ParquetManifestWriter(filename, columns)
+    return _CsvManifestWriter(filename, output_format, columns, resume_offset)
+
+
+class ManifestWriter:
+    """
+    Writes pages of encoded columns (see encode_columns) to a manifest file.
+
+    Attributes:
+        output_format (str): one of OUTPUT_FORMATS
+        resumable (bool): whether the file can be resumed from an offset after
+            being partially written
+    """
+
+    output_format = None
+    resumable = False
+
+    def write(self, encoded_columns):
+        raise NotImplementedError()
+
+    def tell(self):
+        """
+        Returns:
+            int: offset the file can be resumed from, after what's been written
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        raise NotImplementedError()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _CsvManifestWriter(ManifestWriter):
+    resumable = True
+
+    def __init__(self, filename, output_format, columns, resume_offset=None):
+        self.output_format = output_format
+        if resume_offset is not None:
+            self._file = open(filename, "r+b")
+            # drop anything written after the offset
+            self._file.truncate(resume_offset)
+            self._file.seek(resume_offset)
+        else:
+            self._file = open(filename, "wb")
+            header = (",".join(columns) + "\n").encode("utf8")
+            if output_format == CSV_GZIP:
+                header = gzip.compress(header)
+            self._file.write(header)
+
+    def write(self, encoded_columns):
+        self._file.write(encoded_columns)
+        self._file.flush()
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetManifestWriter(ManifestWriter):
+    output_format = PARQUET
+
+    def __init__(self, filename, columns):
+        fields = []
+        for column in columns:
+            if column in LIST_COLUMNS:
+                field_type = pyarrow.list_(pyarrow.string())
+            elif column in INTEGER_COLUMNS:
+                field_type = pyarrow.int64()
+            else:
+                field_type = pyarrow.string()
+            fields.append(pyarrow.field(column, field_type))
+        self._schema = pyarrow.schema(fields)
+        self._writer = pyarrow.parquet.ParquetWriter(filename, self._schema)
+        self._buffer = {column: [] for column in columns}
+        self._buffered_rows = 0
+
+    def write(self, encoded_columns):
+        for column, values in encoded_columns.items():
+            self._buffer[column].extend(values)
+        self._buffered_rows = len(self._buffer[self._schema.names[0]])
+        if self._buffered_rows >= PARQUET_ROW_GROUP_SIZE:
+            self._flush()
+
+    def tell(self):
+        raise NotImplementedError("Parquet output can't be resumed")
+
+    def _flush(self):
+        if not self._buffered_rows:
+            return
+        table = pyarrow.Table.from_pydict(self._buffer, schema=self._schema)
+        self._writer.write_table(table)
+        self._buffer = {column: [] for column in self._schema.names}
+        self._buffered_rows = 0
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def read_manifest_column(filename, column, output_format=None):
+    """
+    Read the values of a column from a manifest written in any of the formats.
+
+    Args:
+        filename (str): manifest to read
+        column (str): column name
+        output_format (str, optional): one of OUTPUT_FORMATS, determined from the
+            filename if not specified
+
+    Returns:
+        Iterable: values of the column, as strings for CSV
+    """
+    output_format = get_output_format(filename, output_format)
+    if output_format == PARQUET:
+        return (
+            pyarrow.parquet.read_table(filename, columns=[column])
+            .column(column)
+            .to_pylist()
+        )
+    return _read_csv_column(filename, column, output_format)
+
+
+def read_manifest_rows(filename, output_format=None):
+    """
+    Read the rows of a manifest written in any of the formats, without loading the
+    whole manifest in memory.
+
+    Args:
+        filename (str): manifest to read
+        output_format (str, optional): one of OUTPUT_FORMATS, determined from the
+            filename if not specified
+
+    Returns:
+        Iterable[dict]: column:value for every row, values are strings for CSV
+            (lists separated with spaces)
+    """
+    output_format = get_output_format(filename, output_format)
+    if output_format == PARQUET:
+        return _read_parquet_rows(filename)
+    return _read_csv_rows(filename, output_format)
+
+
+def _read_csv_column(filename, column, output_format):
+    for row in _read_csv_rows(filename, output_format):
+        yield row.get(column)
+
+
+def _read_csv_rows(filename, output_format):
+    if output_format == CSV_GZIP:
+        manifest = gzip.open(filename, "rt", encoding="utf-8-sig", newline="")
+    else:
+        manifest = open(filename, encoding="utf-8-sig", newline="")
+    with manifest:
+        yield from csv.DictReader(manifest)
+
+
+def _read_parquet_rows(filename):
+    for batch in pyarrow.parquet.ParquetFile(filename).iter_batches():
+        columns = batch.to_pydict()
+        for values in zip(*columns.values()):
+            yield dict(zip(columns.keys(), values))
@@ -1,10 +1,17 @@
 import os
 import logging
 import csv
-import copy
+import json
+import math
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 
 from collections import OrderedDict
-from gen3.tools.indexing.index_manifest import get_and_verify_fileinfos_from_manifest
+from gen3.tools.indexing.index_manifest import (
+    get_and_verify_fileinfos_from_manifest,
+    iter_fileinfos_from_manifest,
+)
 from gen3.tools.indexing.manifest_columns import (
     GUID_STANDARD_KEY,
     SIZE_STANDARD_KEY,
@@ -14,6 +21,18 @@ from gen3.tools.indexing.manifest_columns import (
     AUTHZ_STANDARD_KEY,
 )
 
+# size in bytes of the input manifests' rows to merge in memory at once when
+# merging externally
+DEFAULT_PARTITION_SIZE = 64 * 1024 * 1024
+
+# maximum number of partitions written at once, to stay below the limit of open
+# files. partitions that are still larger than the partition size are split again
+MAX_PARTITIONS = 256
+
+# maximum number of times rows are partitioned, in case many rows have the same
+# md5 and can't be split
+MAX_PARTITION_DEPTH = 3
+
 
 def merge_bucket_manifests(
     directory=".",
@@ -22,6 +41,10 @@ def merge_bucket_manifests(
     output_manifest="merged-bucket-manifest.tsv",
     continue_after_error=False,
     allow_mult_guids_per_hash=False,
+    external=False,
+    partition_size=DEFAULT_PARTITION_SIZE,
+    temp_dir=None,
+    workers=None,
     **kwargs,
 ):
     """
@@ -52,6 +75,19 @@ def merge_bucket_manifests(
             of this code is to combine such entries, however, in cases where you have
             existing GUIDs with the same md5 but still want to merge manifests
             together, this can be used.
+        external(bool): whether to merge manifests that don't fit in memory.
+            rows are streamed from the input manifests into temporary files
+            partitioned by md5, so that each partition is about
+            partition_size bytes, then each partition is merged in memory
+            and written to the output manifest. the rows are merged the same
+            way, but are written grouped by partition
+        partition_size(int): size in bytes of the rows in each partition when
+            merging externally
+        temp_dir(str): directory to write the partitions to when merging
+            externally. if not provided, the default temporary directory is used
+        workers(int): number of processes to parse the input manifests with
+            (when not merging externally). if not provided, uses a process per
+            input manifest, up to the number of CPUs
 
     Returns:
         None
@@ -64,150 +100,98 @@ def merge_bucket_manifests(
 
     logging.info(f"Merging files: {files}")
 
+    if output_manifest_file_delimiter is None:
+        output_manifest_file_ext = os.path.splitext(output_manifest)
+        if output_manifest_file_ext[-1].lower() == ".tsv":
+            output_manifest_file_delimiter = "\t"
+        else:
+            output_manifest_file_delimiter = ","
+
+    if external:
+        _merge_bucket_manifests_external(
+            files,
+            output_manifest,
+            output_manifest_file_delimiter,
+            continue_after_error,
+            allow_mult_guids_per_hash,
+            partition_size,
+            temp_dir,
+        )
+        return
+
+    if workers is None:
+        workers = min(len(files), os.cpu_count() or 1)
+
     headers = set()
     all_rows = {}
-    for manifest in files:
-        records_from_file, _ = get_and_verify_fileinfos_from_manifest(
-            manifest, include_additional_columns=True
-        )
+    for records_from_file in _get_records_from_manifests(files, workers):
         for record in records_from_file:
-            record_to_write = copy.deepcopy(record)
-            if record[MD5_STANDARD_KEY] in all_rows:
-                previous_guid_exists = False
-                # if the record already exists, let's start with existing data and
-                # update as needed
-                record_to_write = copy.deepcopy(all_rows[record[MD5_STANDARD_KEY]][-1])
-
-                if GUID_STANDARD_KEY in record:
-                    guid = record[GUID_STANDARD_KEY]
-                    if (
-                        guid
-                        and record_to_write.get(GUID_STANDARD_KEY)
-                        and guid != record_to_write.get(GUID_STANDARD_KEY)
-                    ):
-                        error_msg = (
-                            "Found two objects with the same hash but different guids,"
-                            f" could not merge. Details: object {record} could not be"
-                            f" merged with object {record_to_write} because {guid} !="
-                            f" {record_to_write.get(GUID_STANDARD_KEY)}."
-                        )
-                        logging.error(error_msg)
-
-                        if not continue_after_error and not allow_mult_guids_per_hash:
-                            raise csv.Error(error_msg)
-
-                        previous_guid_exists = True
-
-                    if guid:
-                        record_to_write[GUID_STANDARD_KEY] = guid
-
-                if SIZE_STANDARD_KEY in record:
-                    size = record[SIZE_STANDARD_KEY]
-
-                    if size != record_to_write[SIZE_STANDARD_KEY]:
-                        error_msg = (
-                            "Found two objects with the same hash but different sizes,"
-                            f" could not merge. Details: object {record} could not be"
-                            f" merged with object {record_to_write} because {size} !="
-                            f" {record_to_write[SIZE_STANDARD_KEY]}."
-                        )
-                        logging.error(error_msg)
-
-                        if not continue_after_error:
-                            raise csv.Error(error_msg)
-
-                # if there's a prev guid and we're allowing duplicates, we don't want
-                # to copy the existing url/authz/acl, so clear them out
-                if previous_guid_exists and allow_mult_guids_per_hash:
-                    record_to_write = copy.deepcopy(record)
-
-                if AUTHZ_STANDARD_KEY not in record_to_write:
-                    record_to_write[AUTHZ_STANDARD_KEY] = ""
-                if AUTHZ_STANDARD_KEY in record:
-                    authz = record[AUTHZ_STANDARD_KEY]
-                    record_to_write[AUTHZ_STANDARD_KEY] = " ".join(
-                        list(
-                            set(
-                                record_to_write[AUTHZ_STANDARD_KEY].split(" ")
-                                + authz.split(" ")
-                            )
-                        )
-                    ).strip(" ")
-
-                if ACL_STANDARD_KEY not in record_to_write:
-                    record_to_write[ACL_STANDARD_KEY] = ""
-                if ACL_STANDARD_KEY in record:
-                    acl = record[ACL_STANDARD_KEY]
-                    record_to_write[ACL_STANDARD_KEY] = " ".join(
-                        list(
-                            set(
-                                record_to_write[ACL_STANDARD_KEY].split(" ")
-                                + acl.split(" ")
-                            )
-                        )
-                    ).strip(" ")
-
-                # default value if not available
-                if URLS_STANDARD_KEY not in record_to_write:
-                    record_to_write[URLS_STANDARD_KEY] = ""
-                # if value provided, add it to existing values
-                if URLS_STANDARD_KEY in record:
-                    urls = record[URLS_STANDARD_KEY]
-                    record_to_write[URLS_STANDARD_KEY] = " ".join(
-                        list(
-                            set(
-                                record_to_write[URLS_STANDARD_KEY].split(" ")
-                                + urls.split(" ")
-                            )
-                        )
-                    ).strip(" ")
-
-                # for any column not in the standard set, either update the existing
-                # record with new data, or initialize field to data provided
-                for column_name in [
-                    key
-                    for key in record.keys()
-                    if key
-                    not in (
-                        GUID_STANDARD_KEY,
-                        SIZE_STANDARD_KEY,
-                        MD5_STANDARD_KEY,
-                        ACL_STANDARD_KEY,
-                        URLS_STANDARD_KEY,
-                        AUTHZ_STANDARD_KEY,
-                    )
-                ]:
-                    if column_name in record_to_write:
-                        record_to_write[column_name] = " ".join(
-                            list(
-                                set(
-                                    record_to_write[column_name].split(" ")
-                                    + record[column_name].split(" ")
-                                )
-                            )
-                        ).strip(" ")
-                    else:
-                        record_to_write[column_name] = record[column_name]
-
-                # if there's NOT a previous guid matching this record and we're NOT allowing
-                # duplicates, remove existing record so that we can replace with newly updated one
-                if not (previous_guid_exists and allow_mult_guids_per_hash):
-                    all_rows[record_to_write[MD5_STANDARD_KEY]] = []
-
+            record_to_write = _merge_record(
+                all_rows, record, continue_after_error, allow_mult_guids_per_hash
+            )
             for key in record_to_write.keys():
                 headers.add(key)
 
-            all_rows.setdefault(record_to_write[MD5_STANDARD_KEY], []).append(
-                record_to_write
-            )
+    _write_merged_manifest(
+        output_manifest,
+        output_manifest_file_delimiter,
+        headers,
+        (
+            _serialize_record(record)
+            for records in all_rows.values()
+            for record in records
+        ),
+    )
 
-    if output_manifest_file_delimiter is None:
-        output_manifest_file_ext = os.path.splitext(output_manifest)
-        if output_manifest_file_ext[-1].lower() == ".tsv":
-            output_manifest_file_delimiter = "\t"
-        else:
-            output_manifest_file_delimiter = ","
 
+def _get_records_from_manifests(files, workers):
+    """
+    Parse and verify the input manifests, in a pool of processes if workers is
+    more than 1
+
+    Args:
+        files(list[str]): paths of the input manifests
+        workers(int): number of processes
+
+    Yields:
+        list(dict): records from each input manifest, in the order of files
+    """
+    if workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(_get_records_from_manifest, files)
+    else:
+        for manifest in files:
+            yield _get_records_from_manifest(manifest)
+
+
+def _get_records_from_manifest(manifest):
+    """
+    Args:
+        manifest(str): path of an input manifest
+
+    Returns:
+        list(dict): records from the manifest, empty if the manifest doesn't
+            pass the validation
+    """
+    records, _ = get_and_verify_fileinfos_from_manifest(
+        manifest, include_additional_columns=True
+    )
+    return records
+
+
+def _write_merged_manifest(output_manifest, delimiter, headers, records):
+    """
+    Write the merged records to the output manifest
+
+    Args:
+        output_manifest(str): the file to write the output manifest to
+        delimiter(str): the delimiter used for writing the output manifest
+        headers(set(str)): columns of the merged records
+        records(iterable(dict)): merged records
+
+    Returns:
+        None
+    """
     # order headers with alphabetical for standard columns, followed by alphabetical for
     # non-standard columns
     stardard_headers = sorted(
@@ -231,14 +215,337 @@ def merge_bucket_manifests(
         logging.info(f"Headers {headers}")
         output_writer = csv.DictWriter(
             outfile,
-            delimiter=output_manifest_file_delimiter,
+            delimiter=delimiter,
             fieldnames=headers,
             extrasaction="ignore",
         )
         output_writer.writeheader()
 
-        for hash_code, records in all_rows.items():
-            for record in records:
-                output_writer.writerow(record)
+        for record in records:
+            output_writer.writerow(record)
 
         logging.info(f"Finished writing merged manifest to {output_manifest}")
+
+
+def _merge_bucket_manifests_external(
+    files,
+    output_manifest,
+    delimiter,
+    continue_after_error,
+    allow_mult_guids_per_hash,
+    partition_size,
+    temp_dir,
+):
+    """
+    Merge the input manifests a partition at a time, see merge_bucket_manifests
+
+    Args:
+        files(list[str]): paths of the input manifests
+        output_manifest(str): the file to write the output manifest to
+        delimiter(str): the delimiter used for writing the output manifest
+        continue_after_error(bool): see merge_bucket_manifests
+        allow_mult_guids_per_hash(bool): see merge_bucket_manifests
+        partition_size(int): size in bytes of the rows in each partition
+        temp_dir(str): directory to write the partitions to
+
+    Returns:
+        None
+    """
+    input_size = sum(os.path.getsize(manifest) for manifest in files)
+    number_of_partitions = min(
+        max(math.ceil(input_size / partition_size), 1), MAX_PARTITIONS
+    )
+
+    with tempfile.TemporaryDirectory(dir=temp_dir) as directory:
+        logging.info(
+            f"Partitioning rows from input manifests into {number_of_partitions} partitions in {directory}"
+        )
+        partitions, headers = _partition_manifests(
+            files, directory, number_of_partitions
+        )
+        merged_records = (
+            record
+            for partition in partitions
+            for record in _merge_partition(
+                partition,
+                partition_size,
+                continue_after_error,
+                allow_mult_guids_per_hash,
+            )
+        )
+        _write_merged_manifest(output_manifest, delimiter, headers, merged_records)
+
+
+def _partition_manifests(files, directory, number_of_partitions):
+    """
+    Write the records from the input manifests into partitions by md5, skipping
+    the manifests that don't pass the validation (like
+    get_and_verify_fileinfos_from_manifest)
+
+    Args:
+        files(list[str]): paths of the input manifests
+        directory(str): directory to write the partitions to
+        number_of_partitions(int): number of partitions
+
+    Returns:
+        tuple: paths of the partitions(list[str]), and columns of the records(set)
+    """
+    headers = set()
+    with _PartitionWriter(directory, "partition", number_of_partitions) as partitions:
+        for manifest in files:
+            partitions.mark()
+            manifest_headers = set()
+            pass_verification = True
+            for record, is_row_valid in iter_fileinfos_from_manifest(
+                manifest, include_additional_columns=True
+            ):
+                pass_verification = pass_verification and is_row_valid
+                if pass_verification:
+                    manifest_headers.update(record.keys())
+                    partitions.write(record[MD5_STANDARD_KEY], json.dumps(record))
+
+            if pass_verification:
+                headers.update(manifest_headers)
+            else:
+                logging.error("The manifest is not in the correct format!!!")
+                partitions.reset()
+
+    return partitions.paths, headers
+
+
+def _merge_partition(
+    partition, partition_size, continue_after_error, allow_mult_guids_per_hash, depth=1
+):
+    """
+    Merge the records in a partition in memory, splitting the partition first if
+    it's larger than partition_size. The partition is removed once merged
+
+    Args:
+        partition(str): path of the partition
+        partition_size(int): size in bytes of the rows in each partition
+        continue_after_error(bool): see merge_bucket_manifests
+        allow_mult_guids_per_hash(bool): see merge_bucket_manifests
+        depth(int): number of times the records were partitioned
+
+    Yields:
+        dict: merged records
+    """
+    size = os.path.getsize(partition)
+    if size > partition_size and depth < MAX_PARTITION_DEPTH:
+        number_of_partitions = min(math.ceil(size / partition_size), MAX_PARTITIONS)
+        logging.info(
+            f"Splitting partition {partition} into {number_of_partitions} partitions"
+        )
+        directory, filename = os.path.split(partition)
+        with _PartitionWriter(
+            directory, os.path.splitext(filename)[0], number_of_partitions, depth
+        ) as partitions:
+            with open(partition) as partition_file:
+                for line in partition_file:
+                    partitions.write(json.loads(line)[MD5_STANDARD_KEY], line[:-1])
+        os.remove(partition)
+
+        for sub_partition in partitions.paths:
+            yield from _merge_partition(
+                sub_partition,
+                partition_size,
+                continue_after_error,
+                allow_mult_guids_per_hash,
+                depth + 1,
+            )
+        return
+
+    all_rows = {}
+    with open(partition) as partition_file:
+        for line in partition_file:
+            _merge_record(
+                all_rows,
+                json.loads(line),
+                continue_after_error,
+                allow_mult_guids_per_hash,
+            )
+    os.remove(partition)
+
+    for records in all_rows.values():
+        for record in records:
+            yield _serialize_record(record)
+
+
+class _PartitionWriter(object):
+    """
+    Writes lines to files partitioned by md5
+    """
+
+    def __init__(self, directory, prefix, number_of_partitions, depth=0):
+        """
+        Args:
+            directory(str): directory to write the partitions to
+            prefix(str): prefix of the partitions' file names
+            number_of_partitions(int): number of partitions
+            depth(int): number of times the lines were already partitioned, so
+                lines are partitioned differently each time
+        """
+        self.paths = [
+            os.path.join(directory, f"{prefix}-{i}.jsonl")
+            for i in range(number_of_partitions)
+        ]
+        self._files = [open(path, "w+") for path in self.paths]
+        self._salt = f"{depth}:".encode()
+        self._positions = None
+
+    def write(self, md5, line):
+        """
+        Args:
+            md5(str): md5 of the record
+            line(str): record serialized on a single line
+        """
+        partition = zlib.crc32(self._salt + md5.encode()) % len(self._files)
+        self._files[partition].write(line + "\n")
+
+    def mark(self):
+        """
+        Remember the current end of the partitions for reset
+        """
+        self._positions = [f.tell() for f in self._files]
+
+    def reset(self):
+        """
+        Remove the lines written since mark was last called
+        """
+        for f, position in zip(self._files, self._positions):
+            f.seek(position)
+            f.truncate()
+
+    def close(self):
+        for f in self._files:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _merge_record(all_rows, record, continue_after_error, allow_mult_guids_per_hash):
+    """
+    Merge a record from an input manifest into the records merged so far.
+    Records are merged in place: values of the columns other than guid, size
+    and md5 become sets of the space separated values, that are serialized by
+    _serialize_record
+
+    Args:
+        all_rows(dict): maps md5 to the list of merged records with that md5
+        record(dict): record from an input manifest, which is stored in
+            all_rows and changed if it's the first with its md5
+        continue_after_error(bool): see merge_bucket_manifests
+        allow_mult_guids_per_hash(bool): see merge_bucket_manifests
+
+    Returns:
+        dict: the merged record
+    """
+    if record[MD5_STANDARD_KEY] not in all_rows:
+        all_rows[record[MD5_STANDARD_KEY]] = [record]
+        return record
+
+    previous_guid_exists = False
+    # if the record already exists, let's start with existing data and
+    # update as needed
+    record_to_write = all_rows[record[MD5_STANDARD_KEY]][-1]
+    guid = record.get(GUID_STANDARD_KEY)
+
+    if guid:
+        if record_to_write.get(GUID_STANDARD_KEY) and guid != record_to_write.get(
+            GUID_STANDARD_KEY
+        ):
+            error_msg = (
+                "Found two objects with the same hash but different guids,"
+                f" could not merge. Details: object {record} could not be"
+                f" merged with object {_serialize_record(record_to_write)} because"
+                f" {guid} != {record_to_write.get(GUID_STANDARD_KEY)}."
+            )
+            logging.error(error_msg)
+
+            if not continue_after_error and not allow_mult_guids_per_hash:
+                raise csv.Error(error_msg)
+
+            previous_guid_exists = True
+
+    if SIZE_STANDARD_KEY in record:
+        size = record[SIZE_STANDARD_KEY]
+
+        if size != record_to_write[SIZE_STANDARD_KEY]:
+            merged_record = _serialize_record(record_to_write)
+            if guid:
+                merged_record[GUID_STANDARD_KEY] = guid
+            error_msg = (
+                "Found two objects with the same hash but different sizes,"
+                f" could not merge. Details: object {record} could not be"
+                f" merged with object {merged_record} because {size} !="
+                f" {record_to_write[SIZE_STANDARD_KEY]}."
+            )
+            logging.error(error_msg)
+
+            if not continue_after_error:
+                raise csv.Error(error_msg)
+
+    if previous_guid_exists and allow_mult_guids_per_hash:
+        # if there's a prev guid and we're allowing duplicates, we don't want
+        # to copy the existing url/authz/acl, so start from the new record
+        record_to_write = dict(record)
+        all_rows[record[MD5_STANDARD_KEY]].append(record_to_write)
+    else:
+        # replace existing records with the updated one
+        all_rows[record[MD5_STANDARD_KEY]] = [record_to_write]
+
+    if guid:
+        record_to_write[GUID_STANDARD_KEY] = guid
+
+    # default values if not available
+    for column_name in (AUTHZ_STANDARD_KEY, ACL_STANDARD_KEY, URLS_STANDARD_KEY):
+        if column_name not in record_to_write:
+            record_to_write[column_name] = ""
+
+    # for any other column, either add the new values to the existing values,
+    # or initialize field to data provided
+    for column_name, value in record.items():
+        if column_name in (GUID_STANDARD_KEY, SIZE_STANDARD_KEY, MD5_STANDARD_KEY):
+            continue
+        if column_name in record_to_write:
+            record_to_write[column_name] = _merge_values(
+                record_to_write[column_name], value
+            )
+        else:
+            record_to_write[column_name] = value
+
+    return record_to_write
+
+
+def _merge_values(values, new_values):
+    """
+    Args:
+        values(str or dict): space separated values, or values already merged
+            (a dict used as an ordered set)
+        new_values(str): space separated values to add
+
+    Returns:
+        dict: merged values, as an ordered set
+    """
+    if isinstance(values, str):
+        values = dict.fromkeys(values.split(" "))
+    values.update(dict.fromkeys(new_values.split(" ")))
+    return values
+
+
+def _serialize_record(record):
+    """
+    Args:
+        record(dict): merged record
+
+    Returns:
+        dict: the record with merged values joined with spaces
+    """
+    return {
+        key: " ".join(v for v in value if v) if isinstance(value, dict) else value
+        for key, value in record.items()
+    }
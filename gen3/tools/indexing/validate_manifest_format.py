@@ -1,9 +1,15 @@
 """
 Module to implement is_valid_manifest_format
 """
+
 import logging
 import warnings
 import csv
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
 
 from gen3.tools.indexing.manifest_columns import (
     Columns,
@@ -15,6 +21,13 @@ from gen3.tools.indexing.manifest_columns import (
     MultiValueError,
 )
 
+# number of chunks per worker when validating in parallel, so workers that get
+# chunks that are faster to validate don't sit idle
+CHUNKS_PER_WORKER = 4
+
+# number of rows to validate at once, one column at a time
+VALIDATION_BATCH_SIZE = 10000
+
 
 def is_valid_manifest_format(
     manifest_path,
@@ -23,6 +36,7 @@ def is_valid_manifest_format(
     allow_base64_encoded_md5=False,
     error_on_empty_url=False,
     line_limit=None,
+    workers=None,
 ):
     """
     Validates the contents of a manifest of file objects and logs all errors
@@ -107,6 +121,12 @@ def is_valid_manifest_format(
         line_limit(int, optional):
             number of lines in manifest to validate including the header. if
             not provided, every line is validated
+        workers(int, optional):
+            number of processes to validate the manifest with. if more than 1,
+            the rows are split into chunks (aligned to line boundaries) that
+            are validated in parallel, errors are still logged in order with
+            the same line numbers as when validating in a single process. not
+            used along with line_limit
 
     Returns:
         bool: True if no errors were found in manifest. False otherwise
@@ -127,7 +147,16 @@ def is_valid_manifest_format(
         manifest_is_valid = _validate_manifest_column_names(
             manifest_column_names_to_validators, enums_to_validators, error_on_empty_url
         )
-        if line_limit is None or line_limit > 1:
+        if workers and workers > 1 and line_limit is None:
+            manifest_is_valid = (
+                _validate_rows_in_parallel(
+                    manifest_path,
+                    manifest_column_names_to_validators,
+                    workers,
+                )
+                and manifest_is_valid
+            )
+        elif line_limit is None or line_limit > 1:
             manifest_is_valid = (
                 _validate_rows(
                     dsv_reader, manifest_column_names_to_validators, line_limit
@@ -358,35 +387,221 @@ def _validate_rows(dsv_reader, manifest_column_names_to_validators, line_limit=N
         bool: true if no errors were found, false otherwise
     """
     rows_are_valid = True
-    for line_number, row in enumerate(dsv_reader, 2):
-        row_items = row.items()
-        if len(row_items) != len(dsv_reader.fieldnames):
-            logging.warning(
-                f"line {line_number}, number of fields ({len(row_items)}) in row is unequal to number of column names in manifest ({len(dsv_reader.fieldnames)})"
-            )
+    for log_level, line_number, message in _get_row_messages(
+        dsv_reader,
+        dsv_reader.fieldnames,
+        manifest_column_names_to_validators,
+        line_limit,
+    ):
+        if log_level == logging.ERROR:
+            rows_are_valid = False
+        logging.log(log_level, f"line {line_number}, {message}")
+
+    return rows_are_valid
+
+
+def _get_row_messages(
+    rows, column_names, manifest_column_names_to_validators, line_limit=None
+):
+    """
+    Validates manifest rows starting from line 2, see _validate_rows. Rows are
+    validated in batches of VALIDATION_BATCH_SIZE rows, one column at a time
+    with Validator.validate_batch
 
-        for column_name, value in row_items:
-            if column_name in manifest_column_names_to_validators:
-                validator = manifest_column_names_to_validators[column_name]
-                try:
-                    validator.validate(value)
-                except EmptyWarning:
-                    logging.warning(
-                        f'line {line_number}, "{column_name}" field is empty'
+    Args:
+        rows(iterable(dict)): manifest rows starting from the second row
+        column_names(list(str)): manifest column names
+        manifest_column_names_to_validators(dict): see _validate_rows
+        line_limit(int): see _validate_rows
+
+    Yields:
+        tuple: (log level, line number, message) for each warning/error found,
+            in the order of the rows and columns in the manifest
+    """
+    validated_column_names = [
+        column_name
+        for column_name in dict.fromkeys(column_names)
+        if column_name in manifest_column_names_to_validators
+    ]
+    rows = iter(rows)
+    if line_limit is not None:
+        rows = islice(rows, max(line_limit - 1, 0))
+
+    first_line_number = 2
+    batch = list(islice(rows, VALIDATION_BATCH_SIZE))
+    while batch:
+        # (line number, column position, log level, message)
+        messages = []
+        for line_number, row in enumerate(batch, first_line_number):
+            if len(row) != len(column_names):
+                messages.append(
+                    (
+                        line_number,
+                        -1,
+                        logging.WARNING,
+                        f"number of fields ({len(row)}) in row is unequal to number of column names in manifest ({len(column_names)})",
                     )
-                except MultiValueError as e:
-                    rows_are_valid = False
-                    logging.error(f'line {line_number}, "{column_name}" values {e}')
-                except ValueError as e:
-                    rows_are_valid = False
-                    logging.error(f'line {line_number}, "{column_name}" value {e}')
+                )
+
+        for column_position, column_name in enumerate(validated_column_names):
+            validator = manifest_column_names_to_validators[column_name]
+            column = [row[column_name] for row in batch]
+            for index, error in validator.validate_batch(column):
+                messages.append(
+                    (
+                        first_line_number + index,
+                        column_position,
+                        *_get_error_message(column_name, error),
+                    )
+                )
+
+        messages.sort(key=lambda message: message[:2])
+        for line_number, _, log_level, message in messages:
+            yield log_level, line_number, message
 
-        if line_number == line_limit:
-            break
+        first_line_number += len(batch)
+        batch = list(islice(rows, VALIDATION_BATCH_SIZE))
+
+
+def _get_error_message(column_name, error):
+    """
+    Args:
+        column_name(str): manifest column name
+        error(Exception): error raised when validating a value in the column
+
+    Returns:
+        tuple: (log level, message) to log for the error
+    """
+    if isinstance(error, EmptyWarning):
+        return logging.WARNING, f'"{column_name}" field is empty'
+    if isinstance(error, MultiValueError):
+        return logging.ERROR, f'"{column_name}" values {error}'
+    return logging.ERROR, f'"{column_name}" value {error}'
+
+
+def _validate_rows_in_parallel(
+    manifest_path, manifest_column_names_to_validators, workers
+):
+    """
+    Validates manifest rows like _validate_rows, but with the rows split into
+    chunks that are validated in a pool of processes. Errors are logged in
+    order, with the line number in the whole manifest.
+
+    Args:
+        manifest_path(str): path to the manifest
+        manifest_column_names_to_validators(dict): see _validate_rows
+        workers(int): number of processes
+
+    Returns:
+        bool: true if no errors were found, false otherwise
+    """
+    with open(manifest_path, "rb") as manifest_file:
+        header = manifest_file.readline()
+
+    # lines can only be split on "\n" if it's the line separator
+    if not header.endswith(b"\n") or b"\r" in header.rstrip(b"\r\n"):
+        with open(manifest_path, "r", encoding="utf-8-sig") as dsv_file:
+            return _validate_rows(
+                _get_dsv_reader(dsv_file), manifest_column_names_to_validators
+            )
+
+    chunks = _get_chunks(manifest_path, len(header), workers * CHUNKS_PER_WORKER)
+    logging.info(f"validating {len(chunks)} chunks of rows with {workers} processes")
+    validate_chunk = partial(
+        _validate_chunk,
+        manifest_path,
+        header.decode("utf-8-sig"),
+        manifest_column_names_to_validators,
+    )
+
+    rows_are_valid = True
+    # line number of the first row in the chunk
+    first_line_number = 2
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for number_of_rows, messages in executor.map(validate_chunk, chunks):
+            for log_level, line_number, message in messages:
+                if log_level == logging.ERROR:
+                    rows_are_valid = False
+                logging.log(
+                    log_level,
+                    f"line {first_line_number + line_number - 2}, {message}",
+                )
+            first_line_number += number_of_rows
 
     return rows_are_valid
 
 
+def _get_chunks(manifest_path, start, number_of_chunks):
+    """
+    Split a file into byte ranges of about the same size, aligned to the start
+    of lines
+
+    Args:
+        manifest_path(str): path to the file
+        start(int): offset to start from
+        number_of_chunks(int): number of chunks to split the file into
+
+    Returns:
+        list(tuple): (start, end) offsets of each chunk
+    """
+    file_size = os.path.getsize(manifest_path)
+    chunk_size = max((file_size - start) // number_of_chunks, 1)
+
+    chunks = []
+    with open(manifest_path, "rb") as manifest_file:
+        while start < file_size:
+            manifest_file.seek(start + chunk_size)
+            # continue to the end of the line
+            manifest_file.readline()
+            end = min(manifest_file.tell(), file_size)
+            chunks.append((start, end))
+            start = end
+
+    return chunks
+
+
+def _validate_chunk(manifest_path, header, manifest_column_names_to_validators, chunk):
+    """
+    Validate the rows in a chunk of the manifest, in a separate process
+
+    Args:
+        manifest_path(str): path to the manifest
+        header(str): the first line of the manifest
+        manifest_column_names_to_validators(dict): see _validate_rows
+        chunk(tuple): (start, end) offsets of the chunk
+
+    Returns:
+        tuple: number of rows in the chunk, and (log level, line number, message)
+            for each warning/error found, with line numbers as if the chunk
+            started at line 2
+    """
+    # validators warn about empty values, see is_valid_manifest_format
+    warnings.filterwarnings("error")
+
+    start, end = chunk
+    with open(manifest_path, "rb") as manifest_file:
+        manifest_file.seek(start)
+        rows = manifest_file.read(end - start).decode("utf-8")
+
+    # same newline handling as reading the whole manifest in text mode
+    dsv_file = io.StringIO(header + rows, newline=None)
+    dsv_reader = _get_dsv_reader(dsv_file)
+    number_of_rows = 0
+
+    def _count_rows():
+        nonlocal number_of_rows
+        for row in dsv_reader:
+            number_of_rows += 1
+            yield row
+
+    messages = list(
+        _get_row_messages(
+            _count_rows(), dsv_reader.fieldnames, manifest_column_names_to_validators
+        )
+    )
+    return number_of_rows, messages
+
+
 def _log_summary(manifest_is_valid, manifest_path, lines_validated):
     """
     Logs a short summary of validation that potentially includes number of
@@ -34,10 +34,27 @@ format:
 {guid}|{error_name}|expected {value_from_manifest}|actual {value_from_indexd}
 ex: 93d9af72-b0f1-450c-a5c6-7d3d8d2083b4|authz|expected ['']|actual ['/programs/DEV/projects/test']
 
+To spot check a very large manifest, a random sample of its rows can be verified
+instead of all of them (sample_size), and the error rates of the sample are
+reported with confidence intervals. The sample is picked in a single pass over
+the manifest with reservoir sampling, reproducibly when given a seed, and can be
+stratified by a column so every value of that column is represented
+proportionally.
+
+For very large manifests, it can be cheaper to download all of indexd once (see
+download_manifest) and verify against that snapshot offline with
+`verify_object_manifest_against_snapshot`. Both manifests are sorted by guid
+(on disk, for manifests that don't fit in memory) and then compared in a single
+pass, without any requests to indexd. The output is the same.
+
 Attributes:
     CURRENT_DIR (str): directory this file is in
     MAX_CONCURRENT_REQUESTS (int): maximum number of desired concurrent requests across
         processes/threads
+    RECORDS_BATCH_SIZE (int): number of manifest rows whose indexd records are
+        requested together in a single bulk request
+    SORT_CHUNK_SIZE (int): number of rows sorted in memory at a time when verifying
+        against a snapshot
 """
 import asyncio
 import csv
@@ -46,8 +63,21 @@ import os
 import time
 
 from gen3.index import Gen3Index
+from gen3.tools.indexing import manifest_formats
+from gen3.tools.utils import (
+    CONFIDENCE_Z,
+    AsyncPipeline,
+    get_sample_error_rates,
+    iter_batches,
+    iter_sorted,
+    log_sample_error_rates,
+    sample_items,
+)
+from gen3.utils import create_async_session
 
 MAX_CONCURRENT_REQUESTS = 24
+RECORDS_BATCH_SIZE = 500
+SORT_CHUNK_SIZE = 100000
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
 
 
@@ -190,6 +220,11 @@ async def async_verify_object_manifest(
     manifest_row_parsers=manifest_row_parsers,
     manifest_file_delimiter=None,
     output_filename=f"verify-manifest-errors-{time.time()}.log",
+    batch_size=RECORDS_BATCH_SIZE,
+    sample_size=None,
+    sample_seed=None,
+    stratify_by=None,
+    confidence_z=CONFIDENCE_Z,
 ):
     """
     Verify all file object records into a manifest csv
@@ -201,31 +236,195 @@ async def async_verify_object_manifest(
         manifest_row_parsers (Dict{indexd_field:func_to_parse_row}): Row parsers
         manifest_file_delimiter (str): delimeter in manifest_file
         output_filename (str): filename for output logs
+        batch_size (int): number of rows whose records are requested from indexd
+            in a single bulk request
+        sample_size (int, optional): only verify a random sample of this many rows
+            and report the error rates
+        sample_seed (int, optional): seed for picking the sample, the same seed
+            always picks the same rows from the same manifest
+        stratify_by (str, optional): manifest column to stratify the sample by,
+            every value of the column gets a share of the sample proportional to
+            its number of rows. Error rates are also reported for every value.
+        confidence_z (float, optional): z-score for the confidence intervals of
+            the error rates, 1.96 for 95%
+
+    Returns:
+        dict: error rates of the sample (see gen3.tools.utils.get_sample_error_rates),
+            None if not sampling
     """
     start_time = time.perf_counter()
     logging.info(f"start time: {start_time}")
 
-    # if delimter not specified, try to get based on file ext
     if not manifest_file_delimiter:
-        file_ext = os.path.splitext(manifest_file)
-        if file_ext[-1].lower() == ".tsv":
-            manifest_file_delimiter = "\t"
-        else:
-            # default, assume CSV
-            manifest_file_delimiter = ","
+        manifest_file_delimiter = _get_manifest_file_delimiter(manifest_file)
+
+    output_filename = output_filename.split("/")[-1]
+    rows = None
+    errors = None
+    if sample_size:
+        rows = _get_sample_of_rows_from_manifest(
+            manifest_file,
+            manifest_file_delimiter,
+            sample_size,
+            sample_seed,
+            stratify_by,
+        )
+        errors = {}
 
     await _verify_all_index_records_in_file(
         commons_url,
         manifest_file,
         manifest_file_delimiter,
         max_concurrent_requests,
-        output_filename.split("/")[-1],
+        output_filename,
+        batch_size,
+        rows,
+        errors,
     )
 
+    error_rates = None
+    if rows is not None:
+        error_rates = get_sample_error_rates(
+            errors,
+            [manifest_row_parsers["guid"](row) for row in rows],
+            [row.get(stratify_by) for row in rows] if stratify_by else None,
+            confidence_z,
+        )
+        log_sample_error_rates(error_rates)
+
     end_time = time.perf_counter()
     logging.info(f"end time: {end_time}")
     logging.info(f"run time: {end_time-start_time}")
 
+    return error_rates
+
+
+def verify_object_manifest_against_snapshot(
+    manifest_file,
+    snapshot_file,
+    manifest_file_delimiter=None,
+    snapshot_format=None,
+    output_filename=f"verify-manifest-errors-{time.time()}.log",
+    sort_chunk_size=SORT_CHUNK_SIZE,
+    temp_dir=None,
+):
+    """
+    Verify all file object records in a manifest against a snapshot of indexd
+    downloaded with download_manifest, without making any requests to indexd.
+
+    Both manifests are sorted by guid, in chunks of sort_chunk_size rows written to
+    temporary files if they don't fit in a single chunk, and then merge-joined on
+    guid. The output has the same errors as async_verify_object_manifest, ordered
+    by guid.
+
+    Args:
+        manifest_file (str): the file to verify
+        snapshot_file (str): manifest downloaded from indexd with download_manifest
+        manifest_file_delimiter (str): delimeter in manifest_file
+        snapshot_format (str, optional): one of manifest_formats.OUTPUT_FORMATS,
+            determined from the extension of snapshot_file if not specified
+        output_filename (str): filename for output logs
+        sort_chunk_size (int): number of rows to sort in memory at a time
+        temp_dir (str, optional): directory for the temporary files, defaults to
+            the system temporary directory
+    """
+    start_time = time.perf_counter()
+    logging.info(f"start time: {start_time}")
+
+    if not manifest_file_delimiter:
+        manifest_file_delimiter = _get_manifest_file_delimiter(manifest_file)
+
+    def _get_guid(item):
+        return item[0] or ""
+
+    expected_rows = iter_sorted(
+        (
+            [manifest_row_parsers["guid"](row), row]
+            for row in _get_rows_from_manifest(manifest_file, manifest_file_delimiter)
+        ),
+        key=_get_guid,
+        chunk_size=sort_chunk_size,
+        temp_dir=temp_dir,
+    )
+    actual_records = iter_sorted(
+        (
+            [row.get("guid"), _get_record_from_snapshot_row(row)]
+            for row in manifest_formats.read_manifest_rows(
+                snapshot_file, snapshot_format
+            )
+        ),
+        key=_get_guid,
+        chunk_size=sort_chunk_size,
+        temp_dir=temp_dir,
+    )
+
+    output_filename = os.path.abspath(output_filename)
+    with open(output_filename, "w") as outfile:
+        actual = next(actual_records, None)
+        for guid, row in expected_rows:
+            while actual is not None and _get_guid(actual) < (guid or ""):
+                actual = next(actual_records, None)
+
+            actual_record = None
+            if guid and actual is not None and actual[0] == guid:
+                actual_record = actual[1]
+
+            for output in _get_row_errors(guid, row, actual_record).values():
+                outfile.write(output)
+                logging.error(output)
+
+    logging.info(f"done writing output to file {output_filename}")
+
+    end_time = time.perf_counter()
+    logging.info(f"end time: {end_time}")
+    logging.info(f"run time: {end_time-start_time}")
+
+
+def _get_record_from_snapshot_row(row):
+    """
+    Given a row from a manifest downloaded with download_manifest, return the
+    fields of the indexd record it was written from that are verified.
+
+    Args:
+        row (dict): column_name:row_value, lists are separated with spaces in CSV
+            and are lists in Parquet
+
+    Returns:
+        dict: indexd record
+    """
+    record = {}
+    for column in manifest_formats.LIST_COLUMNS:
+        values = row.get(column) or []
+        if isinstance(values, str):
+            values = [value.replace("%20", " ") for value in values.split(" ") if value]
+        record[column] = values
+
+    size = row.get("file_size")
+    if isinstance(size, str):
+        size = int(size) if size else None
+
+    record["size"] = size
+    record["hashes"] = {"md5": row.get("md5") or None}
+    record["file_name"] = row.get("file_name") or None
+    return record
+
+
+def _get_manifest_file_delimiter(manifest_file):
+    """
+    Get the delimiter of a manifest based on the file extension.
+
+    Args:
+        manifest_file (str): the manifest
+
+    Returns:
+        str: tab for .tsv, comma otherwise
+    """
+    file_ext = os.path.splitext(manifest_file)
+    if file_ext[-1].lower() == ".tsv":
+        return "\t"
+    # default, assume CSV
+    return ","
+
 
 async def _verify_all_index_records_in_file(
     commons_url,
@@ -233,16 +432,25 @@ async def _verify_all_index_records_in_file(
     manifest_file_delimiter,
     max_concurrent_requests,
     output_filename,
+    batch_size=RECORDS_BATCH_SIZE,
+    rows=None,
+    errors=None,
 ):
     """
     Getting indexd records and writing to a file. This function
     creates semaphores to limit the number of concurrent http connections that
     get opened to send requests to indexd.
 
-    It then uses asyncio to start a number of coroutines. Steps:
-        1) requests to indexd to get records (writes resulting records to a queue)
-        2) puts a final "DONE" in the queue to stop coroutine that will read from queue
-        3) reading those records from the queue and writing to a file
+    Rows are queued in batches of `batch_size` and the records for a whole batch
+    are requested from indexd at once, so the number of requests is the number
+    of rows divided by the batch size.
+
+    It then uses asyncio to run a pipeline of coroutines. Steps:
+        1) reads batches of rows from the manifest into a bounded queue, followed by
+           a final "DONE" to stop the coroutines that read from the queue
+        2) requests to indexd to get records for the batches (writes errors to an
+           output queue)
+        3) streams the errors from the output queue to a file as they arrive
 
     Args:
         commons_url (str): root domain for commons where indexd lives
@@ -250,165 +458,232 @@ async def _verify_all_index_records_in_file(
         manifest_file_delimiter (str): delimeter in manifest_file
         output_filename (str, optional): filename for output
         max_concurrent_requests (int): the maximum number of concurrent requests allowed
+        batch_size (int): number of rows whose records are requested from indexd
+            in a single bulk request
+        rows (List[dict], optional): rows to verify instead of all the rows in
+            manifest_file, like a sample
+        errors (Dict[str, Set[str]], optional): if provided, the names of the errors
+            of every row are also added to it by guid
     """
+    batch_size = max(int(batch_size), 1)
     max_requests = int(max_concurrent_requests)
     logging.debug(f"max concurrent requests: {max_requests}")
     lock = asyncio.Semaphore(max_requests)
-    queue = asyncio.Queue()
-    output_queue = asyncio.Queue()
+    if rows is None:
+        rows = _get_rows_from_manifest(manifest_file, manifest_file_delimiter)
+    batches = iter_batches(rows, batch_size)
+
+    # why "+ (max_concurrent_requests / 4)"?
+    # This is because the max requests at any given time could be
+    # waiting for metadata responses all at once and there's processing done
+    # before that semaphore, so this just adds a few extra processes to get
+    # through the queue up to that point of metadata requests so it's ready
+    # right away when a lock is released. Not entirely necessary but speeds
+    # things up a tiny bit to always ensure something is waiting for that lock
+    num_consumers = int(max_concurrent_requests + (max_concurrent_requests / 4))
+
+    async with AsyncPipeline(output_filename, num_consumers) as pipeline:
+        # share a single pooled session for all the requests
+        async with create_async_session(
+            max_connections_per_host=max_requests
+        ) as session:
+            index = Gen3Index(commons_url, async_session=session)
+            await pipeline.run(
+                batches,
+                lambda queue, output_queue: _parse_from_queue(
+                    queue, lock, index, commons_url, output_queue, errors
+                ),
+            )
+
 
+def _get_sample_of_rows_from_manifest(
+    manifest_file, manifest_file_delimiter, sample_size, sample_seed, stratify_by
+):
+    """
+    Pick a random sample of the rows in the manifest, in a single pass.
+
+    Args:
+        manifest_file (str): the file to verify against
+        manifest_file_delimiter (str): delimeter in manifest_file
+        sample_size (int): number of rows in the sample
+        sample_seed (int): seed for picking the sample
+        stratify_by (str): column to stratify the sample by, None for a simple
+            random sample
+
+    Returns:
+        List[dict]: sampled rows, in manifest order
+    """
+    rows = sample_items(
+        _get_rows_from_manifest(manifest_file, manifest_file_delimiter),
+        sample_size,
+        seed=sample_seed,
+        get_stratum=(lambda row: row.get(stratify_by)) if stratify_by else None,
+    )
+    logging.info(f"verifying a sample of {len(rows)} rows")
+    return rows
+
+
+def _get_rows_from_manifest(manifest_file, manifest_file_delimiter):
+    """
+    Read the manifest and yield its rows, with whitespace stripped from the column
+    names and values.
+
+    Args:
+        manifest_file (str): the file to verify against
+        manifest_file_delimiter (str): delimeter in manifest_file
+
+    Yields:
+        dict: column_name:row_value
+    """
     with open(manifest_file, encoding="utf-8-sig") as manifest:
         reader = csv.DictReader(manifest, delimiter=manifest_file_delimiter)
         for row in reader:
             new_row = {}
             for key, value in row.items():
                 new_row[key.strip()] = value.strip()
-            await queue.put(new_row)
-
-    for _ in range(0, int(max_concurrent_requests + (max_concurrent_requests / 4))):
-        await queue.put("DONE")
-
-    await asyncio.gather(
-        *(
-            _parse_from_queue(queue, lock, commons_url, output_queue)
-            # why "+ (max_concurrent_requests / 4)"?
-            # This is because the max requests at any given time could be
-            # waiting for metadata responses all at once and there's processing done
-            # before that semaphore, so this just adds a few extra processes to get
-            # through the queue up to that point of metadata requests so it's ready
-            # right away when a lock is released. Not entirely necessary but speeds
-            # things up a tiny bit to always ensure something is waiting for that lock
-            for x in range(
-                0, int(max_concurrent_requests + (max_concurrent_requests / 4))
-            )
-        )
-    )
+            yield new_row
 
-    output_filename = os.path.abspath(output_filename)
-    logging.info(
-        f"done processing, writing output queue to single file {output_filename}"
-    )
 
-    # remove existing output if it exists
-    if os.path.isfile(output_filename):
-        os.unlink(output_filename)
-
-    with open(output_filename, "w") as outfile:
-        while not output_queue.empty():
-            line = await output_queue.get()
-            outfile.write(line)
-
-    logging.info(f"done writing output to file {output_filename}")
-
-
-async def _parse_from_queue(queue, lock, commons_url, output_queue):
+async def _parse_from_queue(queue, lock, index, commons_url, output_queue, errors=None):
     """
-    Keep getting items from the queue and verifying that indexd contains the expected
-    fields from that row. If there are any issues, log errors into a file. Return
-    when nothing is left in the queue.
+    Keep getting batches of rows from the queue and verifying that indexd contains
+    the expected fields from each row. If there are any issues, log errors into a
+    file. Return when nothing is left in the queue.
 
     Args:
-        queue (asyncio.Queue): queue to read indexd records from
+        queue (asyncio.Queue): queue to read batches of manifest rows from
         lock (asyncio.Semaphore): semaphones used to limit ammount of concurrent http
             connections
+        index (Gen3Index): index client to make requests with
         commons_url (str): root domain for commons where indexd lives
         output_queue (asyncio.Queue): queue for output
+        errors (Dict[str, Set[str]], optional): if provided, the names of the errors
+            of every row are also added to it by guid
     """
-    loop = asyncio.get_event_loop()
+    rows = await queue.get()
 
-    row = await queue.get()
+    while rows != "DONE":
+        guids = [manifest_row_parsers["guid"](row) for row in rows]
+        actual_records = await _get_records_from_indexd(guids, index, commons_url, lock)
 
-    while row != "DONE":
-        guid = manifest_row_parsers["guid"](row)
-        authz = manifest_row_parsers["authz"](row)
-        acl = manifest_row_parsers["acl"](row)
-        file_size = manifest_row_parsers["file_size"](row)
-        md5 = manifest_row_parsers["md5"](row)
-        urls = manifest_row_parsers["urls"](row)
-        file_name = manifest_row_parsers["file_name"](row)
+        for guid, row in zip(guids, rows):
+            row_errors = _get_row_errors(guid, row, actual_records.get(guid))
+            if row_errors and errors is not None:
+                errors.setdefault(guid, set()).update(row_errors)
 
-        actual_record = await _get_record_from_indexd(guid, commons_url, lock)
-        if not actual_record:
-            output = f"{guid}|no_record|expected {row}|actual None\n"
-            await output_queue.put(output)
-            logging.error(output)
-        else:
-            logging.info(f"verifying {guid}...")
-
-            if sorted(authz) != sorted(actual_record["authz"]):
-                output = (
-                    f"{guid}|authz|expected {authz}|actual {actual_record['authz']}\n"
-                )
+            for output in row_errors.values():
                 await output_queue.put(output)
                 logging.error(output)
 
-            if sorted(acl) != sorted(actual_record["acl"]):
-                output = f"{guid}|acl|expected {acl}|actual {actual_record['acl']}\n"
-                await output_queue.put(output)
-                logging.error(output)
+        rows = await queue.get()
 
-            if file_size != actual_record["size"]:
-                if (
-                    not file_size
-                    and file_size != 0
-                    and not actual_record["size"]
-                    and actual_record["size"] != 0
-                ):
-                    # actual and expected are both either empty string or None
-                    # so even though they're not equal, they represent null value so
-                    # we don't need to consider this an error in validation
-                    pass
-                else:
-                    output = f"{guid}|file_size|expected {file_size}|actual {actual_record['size']}\n"
-                    await output_queue.put(output)
-                    logging.error(output)
-
-            if md5 != actual_record["hashes"].get("md5"):
-                if (
-                    not md5
-                    and md5 != 0
-                    and not actual_record["hashes"].get("md5")
-                    and actual_record["hashes"].get("md5") != 0
-                ):
-                    # actual and expected are both either empty string or None
-                    # so even though they're not equal, they represent null value so
-                    # we don't need to consider this an error in validation
-                    pass
-                else:
-                    output = f"{guid}|md5|expected {md5}|actual {actual_record['hashes'].get('md5')}\n"
-                    await output_queue.put(output)
-                    logging.error(output)
-            urls = [url.replace("%20", " ") for url in urls]
-            if sorted(urls) != sorted(actual_record["urls"]):
-                output = f"{guid}|urls|expected {urls}|actual {actual_record['urls']}\n"
-                await output_queue.put(output)
-                logging.error(output)
 
-            if not actual_record["file_name"] and file_name:
-                # if the actual record name is "" or None but something was specified
-                # in the manifest, we have a problem
-                output = f"{guid}|file_name|expected {file_name}|actual {actual_record['file_name']}\n"
-                await output_queue.put(output)
-                logging.error(output)
+def _get_row_errors(guid, row, actual_record):
+    """
+    Compare a row from the manifest with the indexd record for its guid.
+
+    Args:
+        guid (str): indexd record globally unique id
+        row (dict): column_name:row_value
+        actual_record (dict): the indexd record for the guid, None if it
+            doesn't exist
+
+    Returns:
+        Dict[str, str]: error name (the field that doesn't match, or "no_record")
+            to its output line
+    """
+    if not actual_record:
+        return {"no_record": f"{guid}|no_record|expected {row}|actual None\n"}
+
+    logging.info(f"verifying {guid}...")
+    errors = {}
+
+    authz = manifest_row_parsers["authz"](row)
+    acl = manifest_row_parsers["acl"](row)
+    file_size = manifest_row_parsers["file_size"](row)
+    md5 = manifest_row_parsers["md5"](row)
+    urls = manifest_row_parsers["urls"](row)
+    file_name = manifest_row_parsers["file_name"](row)
+
+    if sorted(authz) != sorted(actual_record["authz"]):
+        errors["authz"] = (
+            f"{guid}|authz|expected {authz}|actual {actual_record['authz']}\n"
+        )
+
+    if sorted(acl) != sorted(actual_record["acl"]):
+        errors["acl"] = f"{guid}|acl|expected {acl}|actual {actual_record['acl']}\n"
+
+    if file_size != actual_record["size"]:
+        if (
+            not file_size
+            and file_size != 0
+            and not actual_record["size"]
+            and actual_record["size"] != 0
+        ):
+            # actual and expected are both either empty string or None
+            # so even though they're not equal, they represent null value so
+            # we don't need to consider this an error in validation
+            pass
+        else:
+            errors["file_size"] = (
+                f"{guid}|file_size|expected {file_size}|actual {actual_record['size']}\n"
+            )
 
-        row = await queue.get()
+    if md5 != actual_record["hashes"].get("md5"):
+        if (
+            not md5
+            and md5 != 0
+            and not actual_record["hashes"].get("md5")
+            and actual_record["hashes"].get("md5") != 0
+        ):
+            # actual and expected are both either empty string or None
+            # so even though they're not equal, they represent null value so
+            # we don't need to consider this an error in validation
+            pass
+        else:
+            errors["md5"] = (
+                f"{guid}|md5|expected {md5}|actual {actual_record['hashes'].get('md5')}\n"
+            )
 
+    urls = [url.replace("%20", " ") for url in urls]
+    if sorted(urls) != sorted(actual_record["urls"]):
+        errors["urls"] = f"{guid}|urls|expected {urls}|actual {actual_record['urls']}\n"
+
+    if not actual_record["file_name"] and file_name:
+        # if the actual record name is "" or None but something was specified
+        # in the manifest, we have a problem
+        errors["file_name"] = (
+            f"{guid}|file_name|expected {file_name}|actual {actual_record['file_name']}\n"
+        )
 
-async def _get_record_from_indexd(guid, commons_url, lock):
+    return errors
+
+
+async def _get_records_from_indexd(guids, index, commons_url, lock):
     """
-    Gets a semaphore then requests a record for the given guid
+    Gets a semaphore then requests the records for the given guids from indexd
+    in a single bulk request
 
     Args:
-        guid (str): indexd record globally unique id
+        guids (List[str]): indexd record globally unique ids
+        index (Gen3Index): index client to make requests with
         commons_url (str): root domain for commons where indexd lives
         lock (asyncio.Semaphore): semaphones used to limit ammount of concurrent http
             connections
+
+    Returns:
+        Dict{str: dict}: guid to indexd record, guids without a record are left out
     """
-    index = Gen3Index(commons_url)
+    dids = list(dict.fromkeys(guid for guid in guids if guid))
+    if not dids:
+        return {}
+
     async with lock:
         # default ssl handling unless it's explicitly http://
         ssl = None
         if "https" not in commons_url:
             ssl = False
 
-        return await index.async_get_record(guid, _ssl=ssl)
+        records = await index.async_get_records(dids, _ssl=ssl)
+
+    return {record["did"]: record for record in records or []}
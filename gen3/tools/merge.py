@@ -1,5 +1,8 @@
 import os
 import csv
+import gzip
+import io
+from array import array
 from collections import OrderedDict
 from pathlib import Path
 import sys
@@ -9,6 +12,17 @@ import base64
 from datetime import datetime
 import logging
 
+# length of the substrings of the keys from the indexing manifest that are
+# indexed to find partial matches
+PARTIAL_MATCH_NGRAM_SIZE = 4
+
+# number of rows of the merged manifest buffered in memory before they're written
+# to the output file
+DEFAULT_OUTPUT_FLUSH_SIZE = 10000
+
+# supported compressions of the merged manifest
+OUTPUT_COMPRESSIONS = [None, "gzip"]
+
 
 def _get_guids_for_manifest_row(row, data_from_indexing_manifest, config, **kwargs):
     """
@@ -41,18 +55,22 @@ def _get_guids_for_manifest_row(row, data_from_indexing_manifest, config, **kwar
 
 
 def get_guids_for_manifest_row_partial_match(
-    row, data_from_indexing_manifest, config, **kwargs
+    row, data_from_indexing_manifest, config, partial_match_index=None, **kwargs
 ):
     """
     Given a row from the manifest, return the guid to use for the metadata object by
     partially matching against the keys.
 
-    WARNING: This iterates over the entire data_from_indexing_manifest dict EVERY TIME
-             IT'S CALLED. So this is O(n2).
+    With a partial_match_index (merge_guids_into_metadata builds one before going
+    through the rows), keys are looked up in an index of the substrings of length
+    PARTIAL_MATCH_NGRAM_SIZE of the keys in data_from_indexing_manifest, so only
+    the keys sharing the least common substring with the key from the row are
+    compared. Otherwise, or for keys from rows shorter than
+    PARTIAL_MATCH_NGRAM_SIZE, the key from the row is compared against every key.
 
-    ANOTHER WARNING: This does not support GUIDs matching multiple rows
-                     of metadata, it only supports metadata matching multiple
-                     GUIDs.
+    WARNING: This does not support GUIDs matching multiple rows
+             of metadata, it only supports metadata matching multiple
+             GUIDs.
 
     Example:
         row = {"submitted_sample_id": "123", "foo": "bar", "fizz": "buzz"}
@@ -61,6 +79,14 @@ def get_guids_for_manifest_row_partial_match(
             "456": {"guid": "56e908b2-12df-434e-be9b-023edf66814b"}
         }
 
+    Args:
+        row (dict): row from the metadata manifest
+        data_from_indexing_manifest (dict): maps a key to a list of rows from the
+            indexing manifest, matched keys are deleted from it
+        config (dict): columns to match the manifests on
+        partial_match_index (_PartialMatchIndex, optional): index of
+            data_from_indexing_manifest, built once it had all of its keys
+
     Returns:
         List: guids
     """
@@ -72,21 +98,23 @@ def get_guids_for_manifest_row_partial_match(
     row_key = config.get("row_column_name")
     key_from_row = row.get(row_key).strip()
 
-    matching_guids = []
-    matching_keys = []
-    logging.info(
+    logging.debug(
         f"{len(data_from_indexing_manifest)} unmatched records remaining in indexing manifest file."
     )
-    for key, matching_rows in data_from_indexing_manifest.items():
-        if key_from_row in key and matching_rows:
-            matching_keys.append(key)
-            matching_guids.extend(
-                [
-                    row.get(guid_column_name)
-                    for row in matching_rows
-                    if row.get(guid_column_name)
-                ]
-            )
+    if partial_match_index is not None:
+        matching_keys = partial_match_index.get_matching_keys(key_from_row)
+    else:
+        matching_keys = _get_matching_keys(data_from_indexing_manifest, key_from_row)
+
+    matching_guids = []
+    for key in matching_keys:
+        matching_guids.extend(
+            [
+                row.get(guid_column_name)
+                for row in data_from_indexing_manifest[key]
+                if row.get(guid_column_name)
+            ]
+        )
 
     # no need to search already matched records
     for key in matching_keys:
@@ -95,6 +123,89 @@ def get_guids_for_manifest_row_partial_match(
     return matching_guids
 
 
+def _get_matching_keys(data_from_indexing_manifest, key_from_row):
+    """
+    Get the keys that contain key_from_row and still have rows, by comparing it
+    to every key
+    """
+    return [
+        key
+        for key, matching_rows in data_from_indexing_manifest.items()
+        if key_from_row in key and matching_rows
+    ]
+
+
+class _PartialMatchIndex(object):
+    """
+    Index of the substrings of length PARTIAL_MATCH_NGRAM_SIZE of the keys in
+    data_from_indexing_manifest, to find the keys that contain a string
+    without comparing it to every key.
+
+    Keys deleted from data_from_indexing_manifest after the index is built are
+    skipped, but keys added to it aren't indexed, so build the index once the
+    dict is complete.
+    """
+
+    def __init__(self, data_from_indexing_manifest):
+        """
+        Args:
+            data_from_indexing_manifest (dict): maps a key to a list of rows
+                from the indexing manifest
+        """
+        start_time = time.perf_counter()
+        self.data_from_indexing_manifest = data_from_indexing_manifest
+        # keys in the order of data_from_indexing_manifest, the index maps
+        # ngrams to positions in this list
+        self.keys = list(data_from_indexing_manifest)
+        self.ngram_to_positions = {}
+        for position, key in enumerate(self.keys):
+            for ngram in {
+                key[i : i + PARTIAL_MATCH_NGRAM_SIZE]
+                for i in range(len(key) - PARTIAL_MATCH_NGRAM_SIZE + 1)
+            }:
+                positions = self.ngram_to_positions.get(ngram)
+                if positions is None:
+                    positions = self.ngram_to_positions[ngram] = array("I")
+                positions.append(position)
+        logging.debug(
+            f"indexed {len(self.keys)} keys from indexing manifest file into "
+            f"{len(self.ngram_to_positions)} substrings in "
+            f"{time.perf_counter() - start_time} seconds"
+        )
+
+    def get_matching_keys(self, key_from_row):
+        """
+        Get the keys that contain key_from_row and still have rows, in the
+        order of data_from_indexing_manifest
+
+        Args:
+            key_from_row (str): string to look for in the keys
+
+        Returns:
+            List: matching keys
+        """
+        if len(key_from_row) < PARTIAL_MATCH_NGRAM_SIZE:
+            return _get_matching_keys(self.data_from_indexing_manifest, key_from_row)
+
+        candidates = None
+        for i in range(len(key_from_row) - PARTIAL_MATCH_NGRAM_SIZE + 1):
+            positions = self.ngram_to_positions.get(
+                key_from_row[i : i + PARTIAL_MATCH_NGRAM_SIZE]
+            )
+            if positions is None:
+                return []
+            if candidates is None or len(positions) < len(candidates):
+                candidates = positions
+
+        matching_keys = []
+        for position in candidates:
+            key = self.keys[position]
+            if key_from_row in key and self.data_from_indexing_manifest.get(key):
+                matching_keys.append(key)
+
+        return matching_keys
+
+
 def _get_data_from_indexing_manifest(
     manifest_file,
     config,
@@ -160,7 +271,39 @@ def merge_guids_into_metadata(
     manifests_mapping_config=manifests_mapping_config,
     output_filename="merged-metadata-manifest.tsv",
     include_all_indexing_cols_in_output=True,
+    output_flush_size=DEFAULT_OUTPUT_FLUSH_SIZE,
+    output_compression=None,
 ):
+    """
+    Merge the guids (and optionally the other columns) from an indexing manifest
+    into a metadata manifest, see the README for details.
+
+    Args:
+        indexing_manifest (str): path to the indexing manifest
+        metadata_manifest (str): path to the metadata manifest
+        indexing_manifest_file_delimiter (str): delimiter of the indexing
+            manifest, based on the file extension if not provided
+        metadata_manifest_file_delimiter (str): delimiter of the metadata
+            manifest, based on the file extension if not provided
+        manifest_row_parsers (dict): functions to get the data from the indexing
+            manifest and the guids matching a row of the metadata manifest
+        manifests_mapping_config (dict): columns to match the manifests on
+        output_filename (str): path to the merged manifest, a TSV
+        include_all_indexing_cols_in_output (bool): whether to include the
+            columns of the indexing manifest in the merged manifest
+        output_flush_size (int): number of rows buffered in memory before
+            they're written to the merged manifest
+        output_compression (str): None, or "gzip" to compress the merged
+            manifest
+
+    Returns:
+        None
+    """
+    if output_compression not in OUTPUT_COMPRESSIONS:
+        raise ValueError(
+            f"Unsupported output compression {output_compression}, expecting one of {OUTPUT_COMPRESSIONS}"
+        )
+
     start_time = time.perf_counter()
     logging.info(f"start time: {start_time}")
 
@@ -184,6 +327,16 @@ def merge_guids_into_metadata(
         include_all_indexing_cols_in_output=include_all_indexing_cols_in_output,
     )
 
+    # index the keys for partial matching once, for all the rows
+    guids_for_manifest_row_kwargs = {}
+    if (
+        manifest_row_parsers["guids_for_manifest_row"]
+        is get_guids_for_manifest_row_partial_match
+    ):
+        guids_for_manifest_row_kwargs["partial_match_index"] = _PartialMatchIndex(
+            data_from_indexing_manifest
+        )
+
     logging.debug(
         f"Iterating over {metadata_manifest} and finding matches using dict created "
         f"from {indexing_manifest}."
@@ -208,65 +361,57 @@ def merge_guids_into_metadata(
         headers = unique_headers
 
         logging.debug(f"writing headers to {output_filename}: {headers}")
-        write_header_to_file(
-            filename=output_filename, fieldnames=headers, delimiter="\t"
+        output_file = _MergedManifestWriter(
+            output_filename,
+            fieldnames=headers,
+            delimiter="\t",
+            flush_size=output_flush_size,
+            compression=output_compression,
         )
 
         logging.debug(f"beginning iteration over rows in {metadata_manifest}")
-        for row in reader:
-            guids = manifest_row_parsers["guids_for_manifest_row"](
-                row, data_from_indexing_manifest, config=manifests_mapping_config
-            )
+        with output_file:
+            for row in reader:
+                guids = manifest_row_parsers["guids_for_manifest_row"](
+                    row,
+                    data_from_indexing_manifest,
+                    config=manifests_mapping_config,
+                    **guids_for_manifest_row_kwargs,
+                )
 
-            if not guids:
-                # warning but write to output anyway
-                row.update({"guid": ""})
-
-                if include_all_indexing_cols_in_output:
-                    row_key = manifests_mapping_config.get("row_column_name")
-                    key_id_from_row = row.get(row_key, "").strip()
-                    rows_to_add = data_from_indexing_manifest.get(key_id_from_row, {})
-
-                    for new_row in rows_to_add:
-                        new_row.update(row)
-                        append_row_to_file(
-                            filename=output_filename,
-                            row=new_row,
-                            fieldnames=headers,
-                            delimiter="\t",
+                if not guids:
+                    # warning but write to output anyway
+                    row.update({"guid": ""})
+
+                    if include_all_indexing_cols_in_output:
+                        row_key = manifests_mapping_config.get("row_column_name")
+                        key_id_from_row = row.get(row_key, "").strip()
+                        rows_to_add = data_from_indexing_manifest.get(
+                            key_id_from_row, {}
                         )
-                else:
-                    append_row_to_file(
-                        filename=output_filename,
-                        row=row,
-                        fieldnames=headers,
-                        delimiter="\t",
-                    )
-            else:
-                logging.debug(f"found guids {guids} matching row: {row}")
-
-            for guid in guids:
-                row.update({"guid": guid})
-
-                if include_all_indexing_cols_in_output:
-                    row_key = manifests_mapping_config.get("row_column_name")
-                    key_id_from_row = row.get(row_key, "").strip()
-                    for new_row in data_from_indexing_manifest.get(key_id_from_row, {}):
-                        if new_row.get("guid") == guid:
+
+                        for new_row in rows_to_add:
                             new_row.update(row)
-                            append_row_to_file(
-                                filename=output_filename,
-                                row=new_row,
-                                fieldnames=headers,
-                                delimiter="\t",
-                            )
+                            output_file.writerow(new_row)
+                    else:
+                        output_file.writerow(row)
                 else:
-                    append_row_to_file(
-                        filename=output_filename,
-                        row=row,
-                        fieldnames=headers,
-                        delimiter="\t",
-                    )
+                    logging.debug(f"found guids {guids} matching row: {row}")
+
+                for guid in guids:
+                    row.update({"guid": guid})
+
+                    if include_all_indexing_cols_in_output:
+                        row_key = manifests_mapping_config.get("row_column_name")
+                        key_id_from_row = row.get(row_key, "").strip()
+                        for new_row in data_from_indexing_manifest.get(
+                            key_id_from_row, {}
+                        ):
+                            if new_row.get("guid") == guid:
+                                new_row.update(row)
+                                output_file.writerow(new_row)
+                    else:
+                        output_file.writerow(row)
 
     end_time = time.perf_counter()
     logging.info(f"end time: {end_time}")
@@ -285,6 +430,77 @@ def _get_delimiter_from_extension(filename):
     return file_delimiter
 
 
+class _MergedManifestWriter(object):
+    """
+    Writes the rows of the merged manifest through a single file handle. Rows
+    are formatted as they're written (rows can be changed afterwards) and
+    written to the file in batches of flush_size rows
+    """
+
+    def __init__(
+        self,
+        filename,
+        fieldnames,
+        delimiter="\t",
+        flush_size=DEFAULT_OUTPUT_FLUSH_SIZE,
+        compression=None,
+    ):
+        """
+        Open the file and write the header
+
+        Args:
+            filename (str): path to the file
+            fieldnames (list): columns of the file
+            delimiter (str): delimiter used to separate columns
+            flush_size (int): number of rows buffered before they're written
+            compression (str): None, or "gzip" to compress the file
+        """
+        if compression == "gzip":
+            self._file = gzip.open(filename, mode="wt", encoding="utf-8-sig")
+        else:
+            self._file = open(filename, mode="w", encoding="utf-8-sig")
+        self._flush_size = flush_size
+        self._buffer = io.StringIO()
+        self._buffered_rows = 0
+        self._writer = csv.DictWriter(
+            self._buffer,
+            delimiter=delimiter,
+            fieldnames=fieldnames,
+            extrasaction="ignore",
+        )
+        self._writer.writeheader()
+
+    def writerow(self, row):
+        """
+        Args:
+            row (dict): row of the merged manifest, values of columns not in
+                fieldnames are ignored
+        """
+        self._writer.writerow(row)
+        self._buffered_rows += 1
+        if self._buffered_rows >= self._flush_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered rows to the file
+        """
+        self._file.write(self._buffer.getvalue())
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._buffered_rows = 0
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 def write_header_to_file(filename, fieldnames, delimiter="\t"):
     """
     Writes to a file in TSV format.
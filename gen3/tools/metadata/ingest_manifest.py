@@ -18,6 +18,11 @@ Attributes:
             like indexd (by querying)
 
     MAX_CONCURRENT_REQUESTS (int): Maximum concurrent requests to mds for ingestion
+
+With a batch_size, rows are ingested in batches: the guids of a batch are looked up
+in indexd with a single request and the metadata for the whole batch is created (or
+overwritten) in mds with a single batch create. Only rows that the batch create
+doesn't report as created or updated are retried one at a time.
 """
 import aiohttp
 import asyncio
@@ -30,6 +35,8 @@ import urllib.parse
 
 from gen3.index import Gen3Index
 from gen3.metadata import Gen3Metadata
+from gen3.tools.utils import AsyncPipeline, iter_batches
+from gen3.utils import create_async_session
 
 TMP_FOLDER = os.path.abspath("./tmp") + "/"
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -149,6 +156,7 @@ async def async_ingest_metadata_manifest(
     manifest_file_delimiter=None,
     output_filename=f"ingest-metadata-manifest-errors-{time.time()}.log",
     get_guid_from_file=True,
+    batch_size=None,
 ):
     """
     Ingest all metadata records into a manifest csv
@@ -167,6 +175,10 @@ async def async_ingest_metadata_manifest(
             NOTE: When this is True, will use the function in
                   manifest_row_parsers["guid_for_row"] to determine the GUID
                   (usually just a specific column in the file row like "guid")
+        batch_size (int, optional): ingest rows in batches of this many (ex: 100),
+            with a single batch create in mds per batch that overwrites existing
+            metadata. By default every row is created (or updated, if it already
+            exists) with its own requests.
     """
     # if delimter not specified, try to get based on file ext
     if not manifest_file_delimiter:
@@ -186,6 +198,7 @@ async def async_ingest_metadata_manifest(
         max_concurrent_requests,
         output_filename.split("/")[-1],
         get_guid_from_file,
+        batch_size,
     )
 
 
@@ -198,15 +211,17 @@ async def _ingest_all_metadata_in_file(
     max_concurrent_requests,
     output_filename,
     get_guid_from_file,
+    batch_size=None,
 ):
     """
     Ingest metadata from file into metadata service. This function
     creates semaphores to limit the number of concurrent http connections that
     get opened to send requests to mds.
 
-    It then uses asyncio to start a number of coroutines. Steps:
-        1) reads given metadata file (writes resulting rows to a queue)
-        2) posts/puts to mds to write metadata for rows
+    It then uses asyncio to run a pipeline of coroutines. Steps:
+        1) reads given metadata file (writes resulting rows to a bounded queue)
+        2) posts/puts to mds to write metadata for rows (logs to an output queue)
+        3) streams the logs from the output queue to a file as they arrive
 
     Args:
         commons_url (str): root domain for commons where mds lives
@@ -221,18 +236,77 @@ async def _ingest_all_metadata_in_file(
             NOTE: When this is True, will use the function in
                   manifest_row_parsers["guid_for_row"] to determine the GUID
                   (usually just a specific column in the file row like "guid")
+        batch_size (int, optional): ingest rows in batches of this many, None to
+            ingest every row with its own requests
     """
     max_requests = int(max_concurrent_requests)
     logging.debug(f"max concurrent requests: {max_requests}")
     lock = asyncio.Semaphore(max_requests)
-    queue = asyncio.Queue()
-    output_queue = asyncio.Queue()
+    rows = _get_rows_from_manifest(manifest_file, manifest_file_delimiter)
+    parse_from_queue = _parse_from_queue
+    if batch_size:
+        rows = iter_batches(rows, int(batch_size))
+        parse_from_queue = _parse_batches_from_queue
+
+    # why "+ (max_concurrent_requests / 4)"?
+    # This is because the max requests at any given time could be
+    # waiting for metadata responses all at once and there's processing done
+    # before that semaphore, so this just adds a few extra processes to get
+    # through the queue up to that point of metadata requests so it's ready
+    # right away when a lock is released. Not entirely necessary but speeds
+    # things up a tiny bit to always ensure something is waiting for that lock
+    num_consumers = int(max_concurrent_requests + (max_concurrent_requests / 4))
+
+    async with AsyncPipeline(
+        output_filename, num_consumers, line_ending="\n"
+    ) as pipeline:
+        start_time = time.perf_counter()
+        msg = f"start time: {start_time}"
+        logging.info(msg)
+        await pipeline.output_queue.put(msg)
+
+        # share a single pooled session for all the requests
+        async with create_async_session(
+            max_connections_per_host=max_requests
+        ) as session:
+            mds = Gen3Metadata(commons_url, auth_provider=auth, async_session=session)
+            index = Gen3Index(commons_url, async_session=session)
+            await pipeline.run(
+                rows,
+                lambda queue, output_queue: parse_from_queue(
+                    queue,
+                    lock,
+                    commons_url,
+                    output_queue,
+                    mds,
+                    index,
+                    get_guid_from_file,
+                    metadata_source,
+                ),
+            )
 
-    start_time = time.perf_counter()
-    msg = f"start time: {start_time}"
-    logging.info(msg)
-    await output_queue.put(msg)
+        end_time = time.perf_counter()
+        msg = f"end time: {end_time}"
+        logging.info(msg)
+        await pipeline.output_queue.put(msg)
+
+        msg = f"run time: {end_time-start_time}"
+        logging.info(msg)
+        await pipeline.output_queue.put(msg)
+
+
+def _get_rows_from_manifest(manifest_file, manifest_file_delimiter):
+    """
+    Read the manifest and yield its rows, with whitespace and redundant quoting
+    stripped from the column names and values.
+
+    Args:
+        manifest_file (str): the file to ingest
+        manifest_file_delimiter (str): delimeter in manifest_file
 
+    Yields:
+        dict: column_name:row_value
+    """
     with open(manifest_file, encoding="utf-8-sig") as manifest:
         reader = csv.DictReader(manifest, delimiter=manifest_file_delimiter)
         for row in reader:
@@ -246,65 +320,23 @@ async def _ingest_all_metadata_in_file(
                 if value:
                     value = value.strip().strip("'").strip('"').replace("''", "'")
                 new_row[key.strip()] = value
-            await queue.put(new_row)
-
-    await asyncio.gather(
-        *(
-            _parse_from_queue(
-                queue,
-                lock,
-                commons_url,
-                output_queue,
-                auth,
-                get_guid_from_file,
-                metadata_source,
-            )
-            # why "+ (max_concurrent_requests / 4)"?
-            # This is because the max requests at any given time could be
-            # waiting for metadata responses all at once and there's processing done
-            # before that semaphore, so this just adds a few extra processes to get
-            # through the queue up to that point of metadata requests so it's ready
-            # right away when a lock is released. Not entirely necessary but speeds
-            # things up a tiny bit to always ensure something is waiting for that lock
-            for x in range(
-                0, int(max_concurrent_requests + (max_concurrent_requests / 4))
-            )
-        )
-    )
-
-    end_time = time.perf_counter()
-    msg = f"end time: {end_time}"
-    logging.info(msg)
-    await output_queue.put(msg)
-
-    msg = f"run time: {end_time-start_time}"
-    logging.info(msg)
-    await output_queue.put(msg)
-
-    output_filename = os.path.abspath(output_filename)
-    logging.info(
-        f"done processing, writing output queue to single file {output_filename}"
-    )
-
-    # remove existing output if it exists
-    if os.path.isfile(output_filename):
-        os.unlink(output_filename)
-
-    with open(output_filename, "w") as outfile:
-        while not output_queue.empty():
-            line = await output_queue.get()
-            outfile.write(line + "\n")
-
-    logging.info(f"done writing output to file {output_filename}")
+            yield new_row
 
 
 async def _parse_from_queue(
-    queue, lock, commons_url, output_queue, auth, get_guid_from_file, metadata_source
+    queue,
+    lock,
+    commons_url,
+    output_queue,
+    mds,
+    index,
+    get_guid_from_file,
+    metadata_source,
 ):
     """
     Keep getting items from the queue and checking if indexd contains a record with
     that guid. Then create/update metadta for that GUID in the metadata service.
-    Also log to output queue. Return when nothing is left in the queue.
+    Also log to output queue. Return when "DONE" is read from the queue.
 
     Args:
         queue (asyncio.Queue): queue to read metadata from
@@ -312,7 +344,8 @@ async def _parse_from_queue(
             connections
         commons_url (str): root domain for commons where mds lives
         output_queue (asyncio.Queue): queue for logging output
-        auth (Gen3Auth): Gen3 auth or tuple with basic auth name and password
+        mds (Gen3Metadata): metadata client to make requests with
+        index (Gen3Index): index client to make requests with
         get_guid_from_file (bool): whether or not to get the guid for metadata from file
             NOTE: When this is True, will use the function in
                   manifest_row_parsers["guid_for_row"] to determine the GUID
@@ -320,13 +353,13 @@ async def _parse_from_queue(
         metadata_source (str): the name of the source of metadata (used to namespace
             in the metadata service) ex: dbgap
     """
-    while not queue.empty():
-        row = await queue.get()
+    row = await queue.get()
 
+    while row != "DONE":
         if get_guid_from_file:
             guid = manifest_row_parsers["guid_for_row"](commons_url, row, lock)
             is_indexed_file_object = await _is_indexed_file_object(
-                guid, commons_url, lock
+                guid, index, commons_url, lock
             )
         else:
             guid = await manifest_row_parsers["indexed_file_object_guid"](
@@ -335,77 +368,265 @@ async def _parse_from_queue(
             is_indexed_file_object = True
 
         if guid:
-            # construct metadata from rows, don't include redundant guid column
-            logging.debug(f"row: {row}")
-            metadata_from_file = {}
+            metadata = await _get_metadata_from_row(
+                row, is_indexed_file_object, metadata_source, output_queue
+            )
+            await _create_or_update_metadata(
+                guid, metadata, mds, commons_url, lock, output_queue
+            )
+        else:
+            await _put_invalid_guid_message(guid, row, output_queue)
 
-            for key, value in row.items():
-                try:
-                    new_value = json.loads(value)
-                except json.decoder.JSONDecodeError as exc:
-                    if "}" in value or "{" in value or "[" in value or "]" in value:
-                        msg = (
-                            f"Unable to json.loads a string that looks like json: {value}. "
-                            f"adding as a string instead of nested json. Exception: {exc}"
-                        )
-                        logging.warning(msg)
-                        await output_queue.put(msg)
-                    new_value = value
-
-                metadata_from_file[key] = new_value
-
-            if COLUMN_TO_USE_AS_GUID in metadata_from_file.keys():
-                del metadata_from_file[COLUMN_TO_USE_AS_GUID]
-
-            logging.debug(f"metadata from file: {metadata_from_file}")
-
-            # namespace by metadata source
-            metadata = {metadata_source: metadata_from_file}
-
-            metadata["_guid_type"] = (
-                GUID_TYPE_FOR_INDEXED_FILE_OBJECT
-                if is_indexed_file_object
-                else GUID_TYPE_FOR_NON_INDEXED_FILE_OBJECT
+        row = await queue.get()
+
+
+async def _parse_batches_from_queue(
+    queue,
+    lock,
+    commons_url,
+    output_queue,
+    mds,
+    index,
+    get_guid_from_file,
+    metadata_source,
+):
+    """
+    Keep getting batches of rows from the queue and checking which of their guids
+    indexd contains records for, with a single request. Then create/overwrite
+    metadata for the whole batch in the metadata service with a single request,
+    retrying the rows that failed one at a time. Also log to output queue. Return
+    when "DONE" is read from the queue.
+
+    Args:
+        queue (asyncio.Queue): queue to read batches of rows from
+        lock (asyncio.Semaphore): semaphones used to limit ammount of concurrent http
+            connections
+        commons_url (str): root domain for commons where mds lives
+        output_queue (asyncio.Queue): queue for logging output
+        mds (Gen3Metadata): metadata client to make requests with
+        index (Gen3Index): index client to make requests with
+        get_guid_from_file (bool): whether or not to get the guid for metadata from file
+            NOTE: When this is True, will use the function in
+                  manifest_row_parsers["guid_for_row"] to determine the GUID
+                  (usually just a specific column in the file row like "guid")
+        metadata_source (str): the name of the source of metadata (used to namespace
+            in the metadata service) ex: dbgap
+    """
+    rows = await queue.get()
+
+    while rows != "DONE":
+        if get_guid_from_file:
+            guids = [
+                manifest_row_parsers["guid_for_row"](commons_url, row, lock)
+                for row in rows
+            ]
+            indexed_guids = await _get_indexed_file_object_guids(
+                guids, index, commons_url, lock
+            )
+        else:
+            # query for the whole batch at once, the queries acquire the lock so
+            # they're still limited to the max concurrent requests
+            guids = await asyncio.gather(
+                *(
+                    manifest_row_parsers["indexed_file_object_guid"](
+                        commons_url, row, lock, output_queue
+                    )
+                    for row in rows
+                )
             )
+            indexed_guids = set(guids)
 
-            logging.debug(f"metadata: {metadata}")
+        metadata_list = []
+        for guid, row in zip(guids, rows):
+            if guid:
+                metadata = await _get_metadata_from_row(
+                    row, guid in indexed_guids, metadata_source, output_queue
+                )
+                metadata_list.append({"guid": guid, "data": metadata})
+            else:
+                await _put_invalid_guid_message(guid, row, output_queue)
 
-            try:
-                await _create_metadata(guid, metadata, auth, commons_url, lock)
-                msg = f"Successfully created {guid}"
-                logging.info(msg)
-                await output_queue.put(msg)
-            except Exception as exc:
-                logging.debug(
-                    f"Got conflict for {guid}. Let's update instead of create..."
+        if metadata_list:
+            await _batch_create_or_update_metadata(
+                metadata_list, mds, commons_url, lock, output_queue
+            )
+
+        rows = await queue.get()
+
+
+async def _get_metadata_from_row(
+    row, is_indexed_file_object, metadata_source, output_queue
+):
+    """
+    Construct the metadata for a row, namespaced by the metadata source.
+
+    Args:
+        row (dict): column_name:row_value
+        is_indexed_file_object (bool): whether the guid has a record in indexd
+        metadata_source (str): the name of the source of metadata (used to namespace
+            in the metadata service) ex: dbgap
+        output_queue (asyncio.Queue): queue for logging output
+
+    Returns:
+        dict: metadata for the guid of the row
+    """
+    # construct metadata from rows, don't include redundant guid column
+    logging.debug(f"row: {row}")
+    metadata_from_file = {}
+
+    for key, value in row.items():
+        try:
+            new_value = json.loads(value)
+        except json.decoder.JSONDecodeError as exc:
+            if "}" in value or "{" in value or "[" in value or "]" in value:
+                msg = (
+                    f"Unable to json.loads a string that looks like json: {value}. "
+                    f"adding as a string instead of nested json. Exception: {exc}"
                 )
-                await _update_metadata(guid, metadata, auth, commons_url, lock)
-                msg = f"Successfully updated {guid}"
-                logging.info(msg)
+                logging.warning(msg)
                 await output_queue.put(msg)
+            new_value = value
+
+        metadata_from_file[key] = new_value
+
+    if COLUMN_TO_USE_AS_GUID in metadata_from_file.keys():
+        del metadata_from_file[COLUMN_TO_USE_AS_GUID]
+
+    logging.debug(f"metadata from file: {metadata_from_file}")
+
+    # namespace by metadata source
+    metadata = {metadata_source: metadata_from_file}
+
+    metadata["_guid_type"] = (
+        GUID_TYPE_FOR_INDEXED_FILE_OBJECT
+        if is_indexed_file_object
+        else GUID_TYPE_FOR_NON_INDEXED_FILE_OBJECT
+    )
+
+    logging.debug(f"metadata: {metadata}")
+    return metadata
+
+
+async def _put_invalid_guid_message(guid, row, output_queue):
+    msg = (
+        f"Did not add a metadata object for row because an invalid "
+        f"GUID was parsed or no record with this GUID was found in "
+        f"indexd: {guid}.\nRow: {row}"
+    )
+    logging.warning(msg)
+    await output_queue.put(msg)
+
+
+async def _create_or_update_metadata(
+    guid, metadata, mds, commons_url, lock, output_queue
+):
+    """
+    Create metadata for guid, or update it if it already exists, and log to
+    output queue.
+
+    Args:
+        guid (str): indexd record globally unique id
+        metadata (str): the metadata to add
+        mds (Gen3Metadata): metadata client to make requests with
+        commons_url (str): root domain for commons where metadata service lives
+        lock (asyncio.Semaphore): semaphones used to limit ammount of concurrent http
+            connections
+        output_queue (asyncio.Queue): queue for logging output
+    """
+    try:
+        await _create_metadata(guid, metadata, mds, commons_url, lock)
+        msg = f"Successfully created {guid}"
+        logging.info(msg)
+        await output_queue.put(msg)
+    except Exception as exc:
+        logging.debug(f"Got conflict for {guid}. Let's update instead of create...")
+        await _update_metadata(guid, metadata, mds, commons_url, lock)
+        msg = f"Successfully updated {guid}"
+        logging.info(msg)
+        await output_queue.put(msg)
+
+
+async def _batch_create_or_update_metadata(
+    metadata_list, mds, commons_url, lock, output_queue
+):
+    """
+    Create or overwrite the metadata for a batch of guids with a single request,
+    then create or update the guids that weren't created or updated by it one at
+    a time. Logs to output queue.
+
+    Args:
+        metadata_list (List[Dict{"guid": "", "data": {}}]): metadata to add
+        mds (Gen3Metadata): metadata client to make requests with
+        commons_url (str): root domain for commons where metadata service lives
+        lock (asyncio.Semaphore): semaphones used to limit ammount of concurrent http
+            connections
+        output_queue (asyncio.Queue): queue for logging output
+    """
+    try:
+        response = await _batch_create_metadata(metadata_list, mds, commons_url, lock)
+    except Exception as exc:
+        logging.warning(
+            f"Failed to batch create metadata for {len(metadata_list)} guids, "
+            f"creating them one at a time instead. Exception: {exc}"
+        )
+        response = {}
+
+    created = set(response.get("created") or [])
+    updated = set(response.get("updated") or [])
+
+    for item in metadata_list:
+        guid = item["guid"]
+        if guid in created:
+            msg = f"Successfully created {guid}"
+        elif guid in updated:
+            msg = f"Successfully updated {guid}"
         else:
-            msg = (
-                f"Did not add a metadata object for row because an invalid "
-                f"GUID was parsed or no record with this GUID was found in "
-                f"indexd: {guid}.\nRow: {row}"
+            await _create_or_update_metadata(
+                guid, item["data"], mds, commons_url, lock, output_queue
             )
-            logging.warning(msg)
-            await output_queue.put(msg)
+            continue
+
+        logging.info(msg)
+        await output_queue.put(msg)
+
+
+async def _batch_create_metadata(metadata_list, mds, commons_url, lock):
+    """
+    Gets a semaphore then creates metadata for a batch of guids, overwriting
+    existing metadata
 
+    Args:
+        metadata_list (List[Dict{"guid": "", "data": {}}]): metadata to add
+        mds (Gen3Metadata): metadata client to make requests with
+        commons_url (str): root domain for commons where metadata service lives
+        lock (asyncio.Semaphore): semaphones used to limit ammount of concurrent http
+            connections
 
-async def _create_metadata(guid, metadata, auth, commons_url, lock):
+    Returns:
+        Dict{"created": [], "updated": [], "conflict": []}: guids by outcome
+    """
+    async with lock:
+        # default ssl handling unless it's explicitly http://
+        ssl = None
+        if "https" not in commons_url:
+            ssl = False
+
+        response = await mds.async_batch_create(metadata_list, overwrite=True, _ssl=ssl)
+        return response
+
+
+async def _create_metadata(guid, metadata, mds, commons_url, lock):
     """
     Gets a semaphore then creates metadata for guid
 
     Args:
         guid (str): indexd record globally unique id
         metadata (str): the metadata to add
-        auth (Gen3Auth): Gen3 auth or tuple with basic auth name and password
+        mds (Gen3Metadata): metadata client to make requests with
         commons_url (str): root domain for commons where metadata service lives
         lock (asyncio.Semaphore): semaphones used to limit ammount of concurrent http
             connections
     """
-    mds = Gen3Metadata(commons_url, auth_provider=auth)
     async with lock:
         # default ssl handling unless it's explicitly http://
         ssl = None
@@ -416,19 +637,18 @@ async def _create_metadata(guid, metadata, auth, commons_url, lock):
         return response
 
 
-async def _update_metadata(guid, metadata, auth, commons_url, lock):
+async def _update_metadata(guid, metadata, mds, commons_url, lock):
     """
     Gets a semaphore then updates metadata for guid
 
     Args:
         guid (str): indexd record globally unique id
         metadata (str): the metadata to add
-        auth (Gen3Auth): Gen3 auth or tuple with basic auth name and password
+        mds (Gen3Metadata): metadata client to make requests with
         commons_url (str): root domain for commons where metadata service lives
         lock (asyncio.Semaphore): semaphones used to limit ammount of concurrent http
             connections
     """
-    mds = Gen3Metadata(commons_url, auth_provider=auth)
     async with lock:
         # default ssl handling unless it's explicitly http://
         ssl = None
@@ -439,17 +659,17 @@ async def _update_metadata(guid, metadata, auth, commons_url, lock):
         return response
 
 
-async def _is_indexed_file_object(guid, commons_url, lock):
+async def _is_indexed_file_object(guid, index, commons_url, lock):
     """
     Gets a semaphore then requests a record for the given guid
 
     Args:
         guid (str): indexd record globally unique id
+        index (Gen3Index): index client to make requests with
         commons_url (str): root domain for commons where mds lives
         lock (asyncio.Semaphore): semaphones used to limit ammount of concurrent http
             connections
     """
-    index = Gen3Index(commons_url)
     async with lock:
         # default ssl handling unless it's explicitly http://
         ssl = None
@@ -465,6 +685,50 @@ async def _is_indexed_file_object(guid, commons_url, lock):
         return bool(record)
 
 
+async def _get_indexed_file_object_guids(guids, index, commons_url, lock):
+    """
+    Gets a semaphore then requests the records for the given guids with a single
+    request. If that request fails, the records are requested one at a time
+
+    Args:
+        guids (List[str]): indexd record globally unique ids
+        index (Gen3Index): index client to make requests with
+        commons_url (str): root domain for commons where mds lives
+        lock (asyncio.Semaphore): semaphones used to limit ammount of concurrent http
+            connections
+
+    Returns:
+        Set[str]: the guids that have a record in indexd
+    """
+    dids = list(dict.fromkeys(guid for guid in guids if guid))
+    if not dids:
+        return set()
+
+    # default ssl handling unless it's explicitly http://
+    ssl = None
+    if "https" not in commons_url:
+        ssl = False
+
+    try:
+        async with lock:
+            records = await index.async_get_records(dids, _ssl=ssl)
+    except Exception as exc:
+        # don't assume the whole batch does not exist, look the guids up one at a
+        # time instead
+        logging.warning(
+            f"unable to request the records for a batch of {len(dids)} guids, "
+            f"requesting them one at a time. Error: {exc}"
+        )
+        is_indexed_file_object = await asyncio.gather(
+            *(_is_indexed_file_object(did, index, commons_url, lock) for did in dids)
+        )
+        return {
+            did for did, is_indexed in zip(dids, is_indexed_file_object) if is_indexed
+        }
+
+    return {record.get("did") for record in records or []}
+
+
 async def async_query_urls_from_indexd(pattern, commons_url, lock):
     """
     Gets a semaphore then requests a record for the given pattern
@@ -17,6 +17,10 @@ format:
 
 {guid}|{mismatched_field}|expected {value_from_manifest}|actual {value_from_mds}
 
+To spot check a very large manifest, a random sample of its rows can be verified
+instead of all of them (sample_size), and the error rates of the sample are
+reported with confidence intervals. See gen3.tools.indexing.verify_manifest.
+
 Attributes:
     CURRENT_DIR (str): directory this file is in
     MAX_CONCURRENT_REQUESTS (int): maximum number of desired concurrent requests across
@@ -33,6 +37,14 @@ import os
 import time
 
 from gen3.metadata import Gen3Metadata
+from gen3.tools.utils import (
+    CONFIDENCE_Z,
+    AsyncPipeline,
+    get_sample_error_rates,
+    log_sample_error_rates,
+    sample_items,
+)
+from gen3.utils import create_async_session
 
 MAX_CONCURRENT_REQUESTS = 24
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -86,6 +98,10 @@ async def async_verify_metadata_manifest(
     manifest_row_parsers=manifest_row_parsers,
     manifest_file_delimiter=None,
     output_filename=f"verify-metadata-errors-{time.time()}.log",
+    sample_size=None,
+    sample_seed=None,
+    stratify_by=None,
+    confidence_z=CONFIDENCE_Z,
 ):
     """
     Verify all file object records
@@ -99,6 +115,19 @@ async def async_verify_metadata_manifest(
         manifest_row_parsers (Dict{mds_field:func_to_parse_row}): Row parsers
         manifest_file_delimiter (str): delimeter in manifest_file
         output_filename (str): filename for output logs
+        sample_size (int, optional): only verify a random sample of this many rows
+            and report the error rates
+        sample_seed (int, optional): seed for picking the sample, the same seed
+            always picks the same rows from the same manifest
+        stratify_by (str, optional): manifest column to stratify the sample by,
+            every value of the column gets a share of the sample proportional to
+            its number of rows. Error rates are also reported for every value.
+        confidence_z (float, optional): z-score for the confidence intervals of
+            the error rates, 1.96 for 95%
+
+    Returns:
+        dict: error rates of the sample (see gen3.tools.utils.get_sample_error_rates),
+            None if not sampling
     """
     start_time = time.perf_counter()
     logging.info(f"start time: {start_time}")
@@ -112,6 +141,18 @@ async def async_verify_metadata_manifest(
             # default, assume CSV
             manifest_file_delimiter = ","
 
+    rows = None
+    errors = None
+    if sample_size:
+        rows = sample_items(
+            _get_rows_from_manifest(manifest_file, manifest_file_delimiter),
+            sample_size,
+            seed=sample_seed,
+            get_stratum=(lambda row: row.get(stratify_by)) if stratify_by else None,
+        )
+        logging.info(f"verifying a sample of {len(rows)} rows")
+        errors = {}
+
     await _verify_all_metadata_records_in_file(
         commons_url,
         manifest_file,
@@ -119,12 +160,26 @@ async def async_verify_metadata_manifest(
         max_concurrent_requests,
         output_filename,
         metadata_source,
+        rows,
+        errors,
     )
 
+    error_rates = None
+    if rows is not None:
+        error_rates = get_sample_error_rates(
+            errors,
+            [manifest_row_parsers["guid"](row) for row in rows],
+            [row.get(stratify_by) for row in rows] if stratify_by else None,
+            confidence_z,
+        )
+        log_sample_error_rates(error_rates)
+
     end_time = time.perf_counter()
     logging.info(f"end time: {end_time}")
     logging.info(f"run time: {end_time-start_time}")
 
+    return error_rates
+
 
 async def _verify_all_metadata_records_in_file(
     commons_url,
@@ -133,15 +188,19 @@ async def _verify_all_metadata_records_in_file(
     max_concurrent_requests,
     output_filename,
     metadata_source,
+    rows=None,
+    errors=None,
 ):
     """
     Getting mds records and write output to a file. This function
     creates semaphores to limit the number of concurrent http connections that
     get opened to send requests to mds.
 
-    It then uses asyncio to start a number of coroutines. Steps:
-        1) requests to mds to get records (writes resulting records to a queue)
-        2) reading those records from the queue and writing to a file
+    It then uses asyncio to run a pipeline of coroutines. Steps:
+        1) reads rows from the manifest into a bounded queue
+        2) requests to mds to get records for the rows (writes errors to an output
+           queue)
+        3) streams the errors from the output queue to a file as they arrive
 
     Args:
         commons_url (str): root domain for commons where mds lives
@@ -151,79 +210,91 @@ async def _verify_all_metadata_records_in_file(
         max_concurrent_requests (int): the maximum number of concurrent requests allowed
         metadata_source (str): the source of the metadata you are verifying, in practice
             this means the first nested section in the metadata service
+        rows (List[dict], optional): rows to verify instead of all the rows in
+            manifest_file, like a sample
+        errors (Dict[str, Set[str]], optional): if provided, the names of the errors
+            of every row are also added to it by guid
     """
     max_requests = int(max_concurrent_requests)
     logging.debug(f"max concurrent requests: {max_requests}")
     lock = asyncio.Semaphore(max_requests)
-    queue = asyncio.Queue()
-    output_queue = asyncio.Queue()
+    if rows is None:
+        rows = _get_rows_from_manifest(manifest_file, manifest_file_delimiter)
+
+    # why "+ (max_concurrent_requests / 4)"?
+    # This is because the max requests at any given time could be
+    # waiting for metadata responses all at once and there's processing done
+    # before that semaphore, so this just adds a few extra processes to get
+    # through the queue up to that point of metadata requests so it's ready
+    # right away when a lock is released. Not entirely necessary but speeds
+    # things up a tiny bit to always ensure something is waiting for that lock
+    num_consumers = int(max_concurrent_requests + (max_concurrent_requests / 4))
+
+    async with AsyncPipeline(output_filename, num_consumers) as pipeline:
+        # share a single pooled session for all the requests
+        async with create_async_session(
+            max_connections_per_host=max_requests
+        ) as session:
+            mds = Gen3Metadata(commons_url, async_session=session)
+            await pipeline.run(
+                rows,
+                lambda queue, output_queue: _parse_from_queue(
+                    queue, lock, mds, commons_url, output_queue, metadata_source, errors
+                ),
+            )
+
+
+def _get_rows_from_manifest(manifest_file, manifest_file_delimiter):
+    """
+    Read the manifest and yield its rows, with whitespace stripped from the column
+    names and values.
+
+    Args:
+        manifest_file (str): the file to verify against
+        manifest_file_delimiter (str): delimeter in manifest_file
 
+    Yields:
+        dict: column_name:row_value
+    """
     with open(manifest_file, encoding="utf-8-sig") as manifest:
         reader = csv.DictReader(manifest, delimiter=manifest_file_delimiter)
         for row in reader:
             new_row = {}
             for key, value in row.items():
                 new_row[key.strip()] = value.strip()
-            await queue.put(new_row)
-
-    await asyncio.gather(
-        *(
-            _parse_from_queue(queue, lock, commons_url, output_queue, metadata_source)
-            # why "+ (max_concurrent_requests / 4)"?
-            # This is because the max requests at any given time could be
-            # waiting for metadata responses all at once and there's processing done
-            # before that semaphore, so this just adds a few extra processes to get
-            # through the queue up to that point of metadata requests so it's ready
-            # right away when a lock is released. Not entirely necessary but speeds
-            # things up a tiny bit to always ensure something is waiting for that lock
-            for x in range(
-                0, int(max_concurrent_requests + (max_concurrent_requests / 4))
-            )
-        )
-    )
-
-    output_filename = os.path.abspath(output_filename)
-    logging.info(
-        f"done processing, writing output queue to single file {output_filename}"
-    )
-
-    # remove existing output if it exists
-    if os.path.isfile(output_filename):
-        os.unlink(output_filename)
+            yield new_row
 
-    with open(output_filename, "w") as outfile:
-        while not output_queue.empty():
-            line = await output_queue.get()
-            outfile.write(line)
 
-    logging.info(f"done writing output to file {output_filename}")
-
-
-async def _parse_from_queue(queue, lock, commons_url, output_queue, metadata_source):
+async def _parse_from_queue(
+    queue, lock, mds, commons_url, output_queue, metadata_source, errors=None
+):
     """
     Keep getting items from the queue and verifying that mds contains the expected
     fields from that row. If there are any issues, log errors into a file. Return
-    when nothing is left in the queue.
+    when "DONE" is read from the queue.
 
     Args:
         queue (asyncio.Queue): queue to read mds records from
         lock (asyncio.Semaphore): semaphones used to limit ammount of concurrent http
             connections
+        mds (Gen3Metadata): metadata client to make requests with
         commons_url (str): root domain for commons where mds lives
         output_queue (asyncio.Queue): queue for output
         metadata_source (str): the source of the metadata you are verifying, in practice
             this means the first nested section in the metadata service
+        errors (Dict[str, Set[str]], optional): if provided, the names of the errors
+            of every row are also added to it by guid
     """
-    loop = asyncio.get_event_loop()
-
-    while not queue.empty():
-        row = await queue.get()
+    row = await queue.get()
 
+    while row != "DONE":
         guid = manifest_row_parsers["guid"](row)
         metadata = manifest_row_parsers["metadata"](row)
 
-        actual_record = await _get_record_from_mds(guid, commons_url, lock)
+        actual_record = await _get_record_from_mds(guid, mds, commons_url, lock)
         if not actual_record:
+            if errors is not None:
+                errors.setdefault(guid, set()).add("no_record")
             output = f"{guid}|no_record|expected {row}|actual None\n"
             await output_queue.put(output)
             logging.error(output)
@@ -249,10 +320,16 @@ async def _parse_from_queue(queue, lock, commons_url, output_queue, metadata_sou
                     isinstance(expected_value, Mapping)
                     and not _are_matching_dicts(expected_value, actual_value)
                 ) or (actual_value != expected_value):
+                    if errors is not None:
+                        errors.setdefault(guid, set()).add(
+                            f"{metadata_source}.{expected_key}"
+                        )
                     output = f"{guid}|{metadata_source}.{expected_key}|expected {expected_value}|actual {actual_value}\n"
                     await output_queue.put(output)
                     logging.error(output)
 
+        row = await queue.get()
+
 
 def _are_matching_dicts(dict_a, dict_b):
     if len(dict_a.keys()) != len(dict_b.keys()):
@@ -266,17 +343,17 @@ def _are_matching_dicts(dict_a, dict_b):
     return True
 
 
-async def _get_record_from_mds(guid, commons_url, lock):
+async def _get_record_from_mds(guid, mds, commons_url, lock):
     """
     Gets a semaphore then requests a record for the given guid
 
     Args:
         guid (str): mds record globally unique id
+        mds (Gen3Metadata): metadata client to make requests with
         commons_url (str): root domain for commons where mds lives
         lock (asyncio.Semaphore): semaphones used to limit ammount of concurrent http
             connections
     """
-    mds = Gen3Metadata(commons_url)
     async with lock:
         # default ssl handling unless it's explicitly http://
         ssl = None
@@ -0,0 +1,409 @@
+"""
+Utilities shared by the tools.
+
+Attributes:
+    QUEUE_SIZE_PER_CONSUMER (int): default number of items allowed in a pipeline's
+        queues per consumer, this bounds how much of a manifest is held in memory
+    SORT_CHUNK_SIZE (int): default number of items sorted in memory at a time by
+        iter_sorted, before they're written to a temporary file
+    CONFIDENCE_Z (float): default z-score for confidence intervals, 1.96 for 95%
+    MAX_STRATA (int): default maximum number of strata in a stratified sample, this
+        bounds how many items sample_items holds in memory
+"""
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import tempfile
+
+QUEUE_SIZE_PER_CONSUMER = 4
+SORT_CHUNK_SIZE = 100000
+CONFIDENCE_Z = 1.96
+MAX_STRATA = 100
+
+
+class AsyncPipeline(object):
+    """
+    Bounded producer/consumer pipeline that streams output lines to a file.
+
+    A reader feeds items (like the rows of a manifest) into a bounded queue while
+    the consumers are reading from it, and everything the consumers put in the
+    output queue is written to the output file as it arrives. So memory stays flat
+    no matter how big the input is and results show up in the output file right
+    away.
+
+    Consumers are coroutine functions that take (queue, output_queue). They should
+    keep getting items from the queue until they get "DONE" and put lines for the
+    output file in the output queue.
+
+    Example:
+        async with AsyncPipeline("output.log", num_consumers=10) as pipeline:
+            await pipeline.output_queue.put("start")
+            await pipeline.run(rows, _parse_from_queue)
+
+    Args:
+        output_filename (str): file to stream the output lines to, an existing file
+            is overwritten
+        num_consumers (int): number of consumers reading from the queue
+        queue_size (int, optional): maximum number of items in each queue, defaults
+            to QUEUE_SIZE_PER_CONSUMER items per consumer
+        line_ending (str, optional): appended to every output line written
+    """
+
+    def __init__(self, output_filename, num_consumers, queue_size=None, line_ending=""):
+        self.output_filename = os.path.abspath(output_filename)
+        self.num_consumers = max(int(num_consumers), 1)
+        self.queue_size = queue_size or self.num_consumers * QUEUE_SIZE_PER_CONSUMER
+        self.line_ending = line_ending
+        self.queue = None
+        self.output_queue = None
+        self._sink = None
+
+    async def __aenter__(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.output_queue = asyncio.Queue(maxsize=self.queue_size)
+        self._sink = asyncio.ensure_future(self._write_output())
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if not self._sink.done():
+            done = asyncio.ensure_future(self.output_queue.put("DONE"))
+            # the sink could fail while waiting for room in the output queue
+            await asyncio.wait([done, self._sink], return_when=asyncio.FIRST_COMPLETED)
+            done.cancel()
+
+        # raises the exception of the sink if writing the output failed
+        await self._sink
+        logging.info(f"done writing output to file {self.output_filename}")
+
+    async def run(self, items, consumer):
+        """
+        Feed the items to the consumers and wait until they're all processed.
+
+        If the reader, any of the consumers or writing the output fails, the others
+        are cancelled and the exception is raised.
+
+        Args:
+            items (iterable): items to put in the queue, read as the consumers make
+                room for them
+            consumer (function): coroutine function taking (queue, output_queue)
+        """
+        tasks = [asyncio.ensure_future(self._fill_queue(items))] + [
+            asyncio.ensure_future(consumer(self.queue, self.output_queue))
+            for _ in range(self.num_consumers)
+        ]
+        work = asyncio.gather(*tasks)
+        try:
+            # the sink only finishes early if it failed, consumers would then block
+            # forever on the full output queue
+            await asyncio.wait([work, self._sink], return_when=asyncio.FIRST_COMPLETED)
+            if not work.done():
+                await self._sink
+            await work
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            work.cancel()
+            raise
+
+    async def _fill_queue(self, items):
+        """
+        Put all the items in the queue, followed by a "DONE" for every consumer.
+        Waits for room in the queue whenever it's full.
+        """
+        for item in items:
+            await self.queue.put(item)
+
+        for _ in range(self.num_consumers):
+            await self.queue.put("DONE")
+
+    async def _write_output(self):
+        """
+        Write lines from the output queue to the output file until "DONE". The file
+        is flushed whenever the queue is drained so output shows up as it's produced.
+        """
+        logging.info(f"streaming output to file {self.output_filename}")
+        with open(self.output_filename, "w") as outfile:
+            line = await self.output_queue.get()
+            while line != "DONE":
+                outfile.write(line + self.line_ending)
+                if self.output_queue.empty():
+                    outfile.flush()
+                line = await self.output_queue.get()
+
+
+def iter_batches(items, batch_size):
+    """
+    Group items into batches.
+
+    Args:
+        items (iterable): items to group
+        batch_size (int): number of items in a batch, the last batch may have fewer
+
+    Yields:
+        list: batch of items
+    """
+    items = iter(items)
+    batch = list(itertools.islice(items, batch_size))
+    while batch:
+        yield batch
+        batch = list(itertools.islice(items, batch_size))
+
+
+def iter_sorted(items, key, chunk_size=SORT_CHUNK_SIZE, temp_dir=None):
+    """
+    Sort items that may not fit in memory (external merge sort).
+
+    Items are sorted in chunks of chunk_size in memory and every chunk is written
+    to a temporary file, the sorted chunks are then merged while reading them
+    back. If all the items fit in a single chunk, nothing is written to disk.
+
+    Args:
+        items (iterable): items to sort, must be JSON serializable and the same
+            after a round trip through JSON (ex: lists rather than tuples)
+        key (function): function of an item returning the value to sort by
+        chunk_size (int, optional): number of items to sort in memory at a time
+        temp_dir (str, optional): directory for the temporary files, defaults to
+            the system temporary directory
+
+    Yields:
+        items in sorted order
+    """
+    chunk_size = max(int(chunk_size), 1)
+    items = iter(items)
+    chunk = _get_sorted_chunk(items, key, chunk_size)
+    if len(chunk) < chunk_size:
+        yield from chunk
+        return
+
+    with tempfile.TemporaryDirectory(dir=temp_dir) as directory:
+        chunk_files = []
+        while chunk:
+            chunk_file = os.path.join(directory, f"{len(chunk_files)}.jsonl")
+            with open(chunk_file, "w", encoding="utf-8") as output:
+                for item in chunk:
+                    output.write(json.dumps(item) + "\n")
+            chunk_files.append(chunk_file)
+            chunk = _get_sorted_chunk(items, key, chunk_size)
+
+        logging.debug(f"merging {len(chunk_files)} sorted chunks")
+        with contextlib.ExitStack() as stack:
+            chunks = [
+                map(json.loads, stack.enter_context(open(chunk_file, encoding="utf-8")))
+                for chunk_file in chunk_files
+            ]
+            yield from heapq.merge(*chunks, key=key)
+
+
+def _get_sorted_chunk(items, key, chunk_size):
+    """
+    Get the next chunk_size items (or fewer if there aren't that many left), sorted.
+    """
+    chunk = list(itertools.islice(items, chunk_size))
+    chunk.sort(key=key)
+    return chunk
+
+
+def sample_items(items, size, seed=None, get_stratum=None, max_strata=MAX_STRATA):
+    """
+    Pick a random sample of items without holding all of them in memory (reservoir
+    sampling), in a single pass.
+
+    For a stratified sample, a reservoir of up to size items is kept for every
+    stratum. Once all items are read, the sample size is split between the strata
+    proportionally to how many items each had (largest remainder) and each
+    reservoir is sampled down to its share. So memory is size items per stratum,
+    which is why the number of strata is capped at max_strata.
+
+    Args:
+        items (iterable): items to sample from
+        size (int): number of items in the sample, all the items are returned if
+            there are fewer
+        seed (int, optional): seed for the random number generator, the same seed
+            and items always give the same sample
+        get_stratum (function, optional): function of an item returning its stratum
+            (ex: a column of a manifest row), for a stratified sample
+        max_strata (int, optional): maximum number of strata in a stratified sample
+
+    Returns:
+        list: the sampled items, in the same order as in items
+
+    Raises:
+        ValueError: if there are more than max_strata strata
+    """
+    size = int(size)
+    rng = random.Random(seed)
+    reservoirs = {}
+    counts = {}
+
+    for index, item in enumerate(items):
+        stratum = get_stratum(item) if get_stratum else None
+        if stratum not in reservoirs:
+            if len(reservoirs) >= max_strata:
+                raise ValueError(
+                    f"More than {max_strata} strata to sample from, stratify by a "
+                    "column with fewer distinct values"
+                )
+            reservoirs[stratum] = []
+        reservoir = reservoirs[stratum]
+        count = counts.get(stratum, 0)
+        counts[stratum] = count + 1
+
+        if count < size:
+            reservoir.append((index, item))
+        else:
+            replace = rng.randrange(count + 1)
+            if replace < size:
+                reservoir[replace] = (index, item)
+
+    sample = []
+    for stratum, allocation in _allocate_sample(size, counts).items():
+        reservoir = reservoirs[stratum]
+        if allocation < len(reservoir):
+            reservoir = rng.sample(reservoir, allocation)
+        sample.extend(reservoir)
+
+    sample.sort(key=lambda indexed_item: indexed_item[0])
+    return [item for _, item in sample]
+
+
+def _allocate_sample(size, counts):
+    """
+    Split the sample size between strata proportionally to their counts, using the
+    largest remainder method.
+
+    Args:
+        size (int): number of items in the sample
+        counts (Dict[object, int]): number of items in every stratum
+
+    Returns:
+        Dict[object, int]: number of items to sample from every stratum
+    """
+    total = sum(counts.values())
+    if total <= size:
+        return dict(counts)
+
+    allocations = {}
+    remainders = []
+    for stratum, count in counts.items():
+        share = size * count / total
+        allocations[stratum] = int(share)
+        remainders.append((share - int(share), count, stratum))
+
+    left = size - sum(allocations.values())
+    # sort on remainder then count only, strata may not be comparable
+    for _, _, stratum in sorted(remainders, key=lambda r: r[:2], reverse=True)[:left]:
+        allocations[stratum] += 1
+    return allocations
+
+
+def wilson_interval(count, total, z=CONFIDENCE_Z):
+    """
+    Wilson score confidence interval for a proportion, which behaves well for small
+    samples and proportions close to 0 (like error rates).
+
+    Args:
+        count (int): number of items with the property (ex: rows with errors)
+        total (int): number of items
+        z (float, optional): z-score for the confidence level, 1.96 for 95%
+
+    Returns:
+        Tuple[float, float]: lower and upper bound of the proportion
+    """
+    if not total:
+        return (0.0, 1.0)
+
+    proportion = count / total
+    denominator = 1 + z * z / total
+    center = (proportion + z * z / (2 * total)) / denominator
+    margin = (
+        z
+        * math.sqrt(proportion * (1 - proportion) / total + z * z / (4 * total * total))
+        / denominator
+    )
+    return (max(0.0, center - margin), min(1.0, center + margin))
+
+
+def get_sample_error_rates(errors, guids, strata=None, z=CONFIDENCE_Z):
+    """
+    Get the error rates of a verified sample of manifest rows, with confidence
+    intervals, from the errors the verification found.
+
+    Args:
+        errors (Dict[str, Set[str]]): names of the errors (ex: the field that
+            doesn't match) of every row with errors, by guid
+        guids (List[str]): guid of every row verified
+        strata (List[object], optional): stratum of every row verified, to also get
+            the error rates for every stratum
+        z (float, optional): z-score for the confidence level, 1.96 for 95%
+
+    Returns:
+        dict: error rates, ex:
+            {
+                "rows": 1000,
+                "rows_with_errors": 12,
+                "error_rate": 0.012,
+                "confidence_interval": (0.0069, 0.0208),
+                "fields": {"authz": {"rows_with_errors": 10, ...}},
+                "strata": {"/programs/DEV": {"rows": 800, ...}},
+            }
+    """
+    rows_errors = [errors.get(guid, set()) for guid in guids]
+    error_rates = _get_error_rates(rows_errors, z)
+
+    fields = sorted({field for row_errors in rows_errors for field in row_errors})
+    error_rates["fields"] = {
+        field: _get_error_rates([{field} & row_errors for row_errors in rows_errors], z)
+        for field in fields
+    }
+
+    if strata is not None:
+        rows_errors_by_stratum = {}
+        for stratum, row_errors in zip(strata, rows_errors):
+            rows_errors_by_stratum.setdefault(stratum, []).append(row_errors)
+        error_rates["strata"] = {
+            stratum: _get_error_rates(stratum_rows_errors, z)
+            for stratum, stratum_rows_errors in rows_errors_by_stratum.items()
+        }
+
+    return error_rates
+
+
+def _get_error_rates(rows_errors, z):
+    rows = len(rows_errors)
+    rows_with_errors = sum(1 for row_errors in rows_errors if row_errors)
+    return {
+        "rows": rows,
+        "rows_with_errors": rows_with_errors,
+        "error_rate": rows_with_errors / rows if rows else 0.0,
+        "confidence_interval": wilson_interval(rows_with_errors, rows, z),
+    }
+
+
+def log_sample_error_rates(error_rates):
+    """
+    Log the error rates from get_sample_error_rates.
+
+    Args:
+        error_rates (dict): error rates from get_sample_error_rates
+    """
+
+    def _log(name, rates):
+        low, high = rates["confidence_interval"]
+        logging.info(
+            f"{name}: {rates['rows_with_errors']}/{rates['rows']} rows with errors, "
+            f"error rate {rates['error_rate']:.4%} "
+            f"(confidence interval {low:.4%} - {high:.4%})"
+        )
+
+    _log("sample", error_rates)
+    for field, rates in error_rates["fields"].items():
+        _log(f"field {field}", rates)
+    for stratum, rates in error_rates.get("strata", {}).items():
+        _log(f"stratum {stratum}", rates)
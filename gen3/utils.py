@@ -1,4 +1,8 @@
+import aiohttp
+import asyncio
+import functools
 import logging
+import requests
 import sys
 import re
 
@@ -6,6 +10,8 @@ from urllib.parse import urlunsplit
 from urllib.parse import urlencode
 from urllib.parse import urlsplit
 from urllib.parse import parse_qs
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 UUID_FORMAT = (
@@ -17,6 +23,18 @@ ACL_FORMAT = r"^.*$"
 URL_FORMAT = r"^.*$"
 AUTHZ_FORMAT = r"^.*$"
 
+# Default connection pool and retry settings for the requests.Session shared by
+# the synchronous methods of the service clients
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_STATUSES = (502, 503, 504)
+
+# Default connection pool settings for the aiohttp sessions shared by the
+# async_* methods of the service clients
+DEFAULT_ASYNC_MAX_CONNECTIONS_PER_HOST = 24
+DEFAULT_ASYNC_KEEPALIVE_TIMEOUT = 30
+
 
 def append_query_params(original_url, **kwargs):
     """
@@ -38,6 +56,248 @@ def append_query_params(original_url, **kwargs):
     return new_url
 
 
+def create_session(
+    pool_connections=DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize=DEFAULT_POOL_MAXSIZE,
+    max_retries=DEFAULT_MAX_RETRIES,
+    backoff_factor=0.5,
+    status_forcelist=DEFAULT_RETRY_STATUSES,
+):
+    """
+    Create a requests.Session with a pooled, retrying adapter mounted for http
+    and https, so connections (and TLS handshakes) get reused across calls.
+
+    Retries only happen for connection errors and the given statuses on
+    idempotent methods, after the retries are exhausted the last response is
+    returned as-is so callers can still raise_for_status().
+
+    Args:
+        pool_connections (int, optional): number of host connection pools to cache
+        pool_maxsize (int, optional): maximum number of connections kept alive
+            per host, should be at least the number of threads sharing the session
+        max_retries (int, optional): number of retries, 0 to disable
+        backoff_factor (float, optional): exponential backoff factor between
+            retries
+        status_forcelist (tuple, optional): HTTP statuses to retry on
+
+    Returns:
+        requests.Session: session to close when you're done with it
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class SessionMixin:
+    """
+    Gives a service client a pooled requests.Session shared by all of its
+    synchronous methods, along with a context manager lifecycle.
+
+    Examples:
+        >>> with Gen3Metadata(endpoint, auth) as mds:
+        ...     records = [mds.get(guid) for guid in guids]
+
+    A session can also be created by the caller (see create_session) and passed
+    in, in which case it's shared with the caller and the caller is responsible
+    for closing it.
+    """
+
+    def _init_session(
+        self,
+        session=None,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        max_retries=DEFAULT_MAX_RETRIES,
+    ):
+        """
+        Args:
+            session (requests.Session, optional): session to use instead of
+                creating one, it will NOT be closed by this client
+            pool_maxsize (int, optional): maximum number of connections kept
+                alive per host
+            max_retries (int, optional): number of retries for connection errors
+                and 502/503/504 responses, 0 to disable
+        """
+        self._owns_session = session is None
+        self._session = session or create_session(
+            pool_maxsize=pool_maxsize, max_retries=max_retries
+        )
+
+    def close(self):
+        """
+        Close the shared session if this client created it.
+        """
+        if self._owns_session:
+            self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def create_async_session(
+    max_connections_per_host=DEFAULT_ASYNC_MAX_CONNECTIONS_PER_HOST,
+    keepalive_timeout=DEFAULT_ASYNC_KEEPALIVE_TIMEOUT,
+):
+    """
+    Create an aiohttp.ClientSession backed by a pooled connector, so connections
+    (and their TCP/TLS handshakes) get reused across requests.
+
+    NOTE: aiohttp sessions are bound to an event loop, so this must be called
+          from within a coroutine.
+
+    Args:
+        max_connections_per_host (int, optional): maximum number of simultaneous
+            connections to the same host, 0 for no limit
+        keepalive_timeout (float, optional): seconds to keep an idle connection
+            open for reuse
+
+    Returns:
+        aiohttp.ClientSession: session to close when you're done with it
+    """
+    connector = aiohttp.TCPConnector(
+        # only bound connections per host, clients talk to one or two hosts
+        limit=0,
+        limit_per_host=max_connections_per_host,
+        keepalive_timeout=keepalive_timeout,
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+class AsyncSessionMixin:
+    """
+    Gives a service client a pooled aiohttp.ClientSession shared by all of its
+    async_* methods, created lazily on first use, along with an async context
+    manager lifecycle.
+
+    Examples:
+        >>> async with Gen3Index(endpoint) as index:
+        ...     records = await asyncio.gather(
+        ...         *(index.async_get_record(guid) for guid in guids)
+        ...     )
+
+    A session can also be created by the caller (see create_async_session) and
+    passed in, in which case it's shared with the caller and the caller is
+    responsible for closing it.
+    """
+
+    def _init_async_session(
+        self,
+        async_session=None,
+        max_connections_per_host=DEFAULT_ASYNC_MAX_CONNECTIONS_PER_HOST,
+        keepalive_timeout=DEFAULT_ASYNC_KEEPALIVE_TIMEOUT,
+    ):
+        """
+        Args:
+            async_session (aiohttp.ClientSession, optional): session to use instead
+                of creating one, it will NOT be closed by this client
+            max_connections_per_host (int, optional): maximum number of
+                simultaneous connections to the same host, 0 for no limit
+            keepalive_timeout (float, optional): seconds to keep an idle
+                connection open for reuse
+        """
+        self._async_session = async_session
+        self._owns_async_session = async_session is None
+        self._async_session_loop = None
+        self._max_connections_per_host = max_connections_per_host
+        self._keepalive_timeout = keepalive_timeout
+
+    async def _get_async_session(self):
+        """
+        Return the shared session, creating it if it doesn't exist yet (or if
+        the one we created belongs to a different event loop).
+
+        Returns:
+            aiohttp.ClientSession: session to use for requests, do NOT close it
+        """
+        if not self._owns_async_session:
+            return self._async_session
+
+        loop = asyncio.get_event_loop()
+        if (
+            self._async_session is None
+            or self._async_session.closed
+            or self._async_session_loop is not loop
+        ):
+            self._async_session = create_async_session(
+                max_connections_per_host=self._max_connections_per_host,
+                keepalive_timeout=self._keepalive_timeout,
+            )
+            self._async_session_loop = loop
+
+        return self._async_session
+
+    async def _async_request(self, method, url, auth=None, **kwargs):
+        """
+        Make a request with the shared session, authorized with the given auth.
+
+        aiohttp only allows basic auth with their built in auth, so JWT auth is
+        added as a header from auth.async_get_auth_header(). If the request fails
+        with a 401/403, the token it was sent with is invalidated and the request
+        is retried once with a new one.
+
+        Args:
+            method (str): HTTP method
+            url (str): URL to request
+            auth (Gen3Auth|tuple, optional): Gen3 auth or tuple with basic auth
+                name and password
+            **kwargs: passed on to aiohttp.ClientSession.request
+
+        Returns:
+            aiohttp.ClientResponse: response, use it with "async with" so it gets
+                released
+        """
+        session = await self._get_async_session()
+        headers = dict(kwargs.pop("headers", None) or {})
+
+        if isinstance(auth, tuple):
+            kwargs["auth"] = aiohttp.BasicAuth(*auth)
+        elif auth is not None:
+            headers.update(await auth.async_get_auth_header(session))
+
+        response = await session.request(method, url, headers=headers, **kwargs)
+
+        if response.status in (401, 403) and hasattr(auth, "async_get_auth_header"):
+            response.release()
+            failed_auth_value = headers.get("Authorization", "")
+            auth._invalidate_access_token(failed_auth_value[len("Bearer ") :])
+            headers.update(await auth.async_get_auth_header(session))
+            response = await session.request(method, url, headers=headers, **kwargs)
+
+        return response
+
+    async def async_close(self):
+        """
+        Close the shared session if this client created it.
+        """
+        if (
+            self._owns_async_session
+            and self._async_session is not None
+            and not self._async_session.closed
+        ):
+            await self._async_session.close()
+        if self._owns_async_session:
+            self._async_session = None
+            self._async_session_loop = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.async_close()
+
+
 def split_url_and_query_params(url):
     """
     Given a url, return the url (no query params) and the split out the
@@ -101,14 +361,20 @@ def exception_do_not_retry(error):
     return False
 
 
+@functools.lru_cache(maxsize=None)
+def _compile_format(format):
+    """
+    Compile a format pattern once, and reuse it for every value it's verified
+    against
+    """
+    return re.compile(format)
+
+
 def _verify_format(s, format):
     """
     Make sure the input is in the right format
     """
-    r = re.compile(format)
-    if r.match(s) is not None:
-        return True
-    return False
+    return _compile_format(format).match(s) is not None
 
 
 def _standardize_str(s):
@@ -118,17 +384,57 @@ def _standardize_str(s):
     Ex. "abc    d" -> "abc d"
         "abc, d" -> "abc d"
     """
-    memory = []
     s = s.replace(",", " ")
-    res = ""
-    for c in s:
-        if c != " ":
-            res += c
-            memory = []
-        elif not memory:
-            res += c
-            memory.append(" ")
-    return res
+    # each replace at least halves every run of spaces
+    while "  " in s:
+        s = s.replace("  ", " ")
+    return s
+
+
+# a list from a manifest is its items separated by runs of spaces and commas, and
+# optionally in brackets, surrounded by any whitespace and commas
+_LIST_STR_START = re.compile(r"[\s,]*\[*")
+# matched against the reversed list, so the end is found without a search
+_LIST_STR_END = re.compile(r"[\s,]*\]*")
+_LIST_STR_SEPARATOR = re.compile(r"[ ,]+")
+
+
+def _split_list_str(s):
+    """
+    Split a list from a manifest into its items, as-is. Lists are separated by
+    spaces or commas and optionally in brackets
+
+    The bounds of the items are found first and then split on the separators, so
+    the list is only split once instead of being copied by every step of a
+    replace/strip/split chain.
+
+    Ex. "[a, 'b']" -> ["a", "'b'"]
+        "a b" -> ["a", "b"]
+    """
+    start = _LIST_STR_START.match(s).end()
+    end = len(s) - _LIST_STR_END.match(s[::-1]).end()
+    return _LIST_STR_SEPARATOR.split(s[start:end])
+
+
+def _parse_list_str(s, unescape_spaces=False):
+    """
+    Split a list from a manifest into its items, stripping whitespace and quotes
+    from each one
+
+    Args:
+        s (str): list from a manifest, see _split_list_str
+        unescape_spaces (bool): replace "%20" in items with spaces
+
+    Ex. "['a', 'b%20c']" -> ["a", "b c"] (with unescape_spaces)
+    """
+    if unescape_spaces:
+        return [
+            item.strip().replace("'", "").replace('"', "").replace("%20", " ")
+            for item in _split_list_str(s)
+        ]
+    return [
+        item.strip().replace("'", "").replace('"', "") for item in _split_list_str(s)
+    ]
 
 
 # Default settings to control usage of backoff library.
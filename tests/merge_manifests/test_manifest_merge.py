@@ -98,6 +98,65 @@ def test_size_mismatch():
         )
 
 
+def test_merge_with_multiple_workers():
+    """
+    Test that the input manifests can be parsed in parallel.
+    """
+    merge_bucket_manifests(
+        directory="tests/merge_manifests/multiple_guids_per_hash/input",
+        output_manifest="merged-output-test-manifest.tsv",
+        allow_mult_guids_per_hash=True,
+        workers=2,
+    )
+    assert _get_tsv_data("merged-output-test-manifest.tsv") == _get_tsv_data(
+        "tests/merge_manifests/multiple_guids_per_hash/expected-merged-output-manifest.tsv"
+    )
+
+
+@pytest.mark.parametrize("partition_size", [1024 * 1024, 100])
+@pytest.mark.parametrize(
+    "directory,allow_mult_guids_per_hash",
+    [
+        ("regular", False),
+        ("multiple_guids_per_hash", True),
+        ("same_guid_for_same_hash", True),
+        ("multiple_urls", False),
+        ("duplicate_values", False),
+    ],
+)
+def test_external_merge(tmpdir, directory, allow_mult_guids_per_hash, partition_size):
+    """
+    Test that merging externally, with a single partition or with partitions
+    small enough to be split again, produces the same output manifest.
+    """
+    merge_bucket_manifests(
+        directory=f"tests/merge_manifests/{directory}/input",
+        output_manifest="merged-output-test-manifest.tsv",
+        allow_mult_guids_per_hash=allow_mult_guids_per_hash,
+        external=True,
+        partition_size=partition_size,
+        temp_dir=str(tmpdir),
+    )
+    assert _get_tsv_data("merged-output-test-manifest.tsv") == _get_tsv_data(
+        f"tests/merge_manifests/{directory}/expected-merged-output-manifest.tsv"
+    )
+    # temporary partitions are removed
+    assert tmpdir.listdir() == []
+
+
+def test_external_merge_size_mismatch():
+    """
+    Test that an error is raised when merging externally two manifests with rows
+    with same md5 but different sizes.
+    """
+    with pytest.raises(csv.Error):
+        merge_bucket_manifests(
+            directory="tests/merge_manifests/size_mismatch/input",
+            output_manifest="merged-output-test-manifest.tsv",
+            external=True,
+        )
+
+
 def _get_tsv_data(manifest, delimiter="\t"):
     """
     Returns a list of rows sorted by md5 for the given manifest.
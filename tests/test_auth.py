@@ -1,7 +1,18 @@
+import asyncio
+import base64
+import json
+import pickle
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
-from unittest.mock import patch
+import requests
+from aiohttp import web
+from unittest.mock import MagicMock, patch
 
 from gen3.auth import Gen3Auth
+from gen3.jobs import Gen3Jobs
 
 
 def test_auth_init_outside_workspace():
@@ -40,3 +51,173 @@ def test_auth_init_in_workspace(monkeypatch):
         mock_request.get().status_code = 200
         auth = Gen3Auth()
         assert auth._use_wts == True
+
+
+def _mock_access_token(expires_in):
+    """
+    Return an unsigned JWT expiring in the given number of seconds
+    """
+    payload = {"exp": int(time.time()) + expires_in, "jti": str(uuid.uuid4())}
+    encoded_payload = (
+        base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+    )
+    return f"eyJhbGciOiJSUzI1NiJ9.{encoded_payload}.signature"
+
+
+def _mock_fence_response(access_token):
+    response = MagicMock(requests.Response)
+    response.status_code = 200
+    response.json.return_value = {"access_token": access_token}
+    return response
+
+
+def test_auth_refreshes_token_before_expiration():
+    """
+    Test that a token is reused until it's about to expire, then refreshed
+    without waiting for a request to fail
+    """
+    auth = Gen3Auth(endpoint="https://example.com", refresh_token={"api_key": "x"})
+    expiring_token = _mock_access_token(expires_in=10)
+    new_token = _mock_access_token(expires_in=1200)
+
+    with patch("gen3.auth.requests.post") as mock_post:
+        mock_post.side_effect = [
+            _mock_fence_response(expiring_token),
+            _mock_fence_response(new_token),
+        ]
+        assert auth._get_auth_value() == "Bearer " + expiring_token
+        # expires within TOKEN_EXPIRATION_BUFFER so gets refreshed
+        assert auth._get_auth_value() == "Bearer " + new_token
+        assert auth._get_auth_value() == "Bearer " + new_token
+        assert mock_post.call_count == 2
+
+
+def test_auth_concurrent_refresh():
+    """
+    Test that concurrent threads needing a token only get one from Fence
+    """
+    auth = Gen3Auth(endpoint="https://example.com", refresh_token={"api_key": "x"})
+    token = _mock_access_token(expires_in=1200)
+
+    def _slow_fence_response(*args, **kwargs):
+        time.sleep(0.1)
+        return _mock_fence_response(token)
+
+    with patch("gen3.auth.requests.post") as mock_post:
+        mock_post.side_effect = _slow_fence_response
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            auth_values = list(
+                executor.map(lambda _: auth._get_auth_value(), range(10))
+            )
+
+    assert auth_values == ["Bearer " + token] * 10
+    assert mock_post.call_count == 1
+
+
+def test_auth_token_cache_file(tmp_path):
+    """
+    Test that instances sharing a cache file share a token, and that a token
+    rejected by a service isn't read back from the cache
+    """
+    cache_file = str(tmp_path / "token.json")
+    first_token = _mock_access_token(expires_in=1200)
+    second_token = _mock_access_token(expires_in=1200)
+
+    with patch("gen3.auth.requests.post") as mock_post:
+        mock_post.side_effect = [
+            _mock_fence_response(first_token),
+            _mock_fence_response(second_token),
+        ]
+        auth = Gen3Auth(
+            endpoint="https://example.com",
+            refresh_token={"api_key": "x"},
+            token_cache_file=cache_file,
+        )
+        # e.g. the same credentials in another process
+        other_auth = pickle.loads(pickle.dumps(auth))
+
+        assert auth._get_auth_value() == "Bearer " + first_token
+        assert other_auth._get_auth_value() == "Bearer " + first_token
+        assert mock_post.call_count == 1
+
+        other_auth._invalidate_access_token(first_token)
+        assert other_auth._get_auth_value() == "Bearer " + second_token
+        assert mock_post.call_count == 2
+        # the old token is kept until it's rejected or about to expire
+        assert auth._get_auth_value() == "Bearer " + first_token
+
+    with open(cache_file) as f:
+        assert json.load(f) == {"access_token": second_token}
+
+
+def test_async_get_auth_header_single_refresh():
+    """
+    Test that concurrent coroutines needing a token only get one from Fence,
+    without using the blocking requests library
+    """
+    auth = Gen3Auth(endpoint="https://example.com", refresh_token={"api_key": "x"})
+    token = _mock_access_token(expires_in=1200)
+    fetches = []
+
+    async def _mock_fetch(session=None):
+        fetches.append(session)
+        await asyncio.sleep(0.1)
+        return token
+
+    async def _get_headers():
+        return await asyncio.gather(*(auth.async_get_auth_header() for _ in range(20)))
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    with patch.object(auth, "_async_fetch_access_token", side_effect=_mock_fetch):
+        with patch("gen3.auth.requests.post") as mock_post:
+            headers = loop.run_until_complete(_get_headers())
+            mock_post.assert_not_called()
+
+    assert headers == [{"Authorization": "Bearer " + token}] * 20
+    assert len(fetches) == 1
+
+
+def test_async_request_retries_with_new_token_on_401():
+    """
+    Test that an aiohttp request rejected with a 401 is retried once with a new
+    token, against a local server only accepting the second token
+    """
+    auth = Gen3Auth(endpoint="https://example.com", refresh_token={"api_key": "x"})
+    expired_token = _mock_access_token(expires_in=1200)
+    valid_token = _mock_access_token(expires_in=1200)
+    tokens = [expired_token, valid_token]
+
+    async def _mock_fetch(session=None):
+        return tokens.pop(0)
+
+    async def _handler(request):
+        if request.headers.get("Authorization") != "Bearer " + valid_token:
+            return web.Response(status=401)
+        return web.json_response({"status": "ok"})
+
+    async def _request():
+        app = web.Application()
+        app.router.add_get("/status", _handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        try:
+            async with Gen3Jobs(f"http://localhost:{port}") as jobs:
+                response = await jobs._async_request(
+                    "GET", f"http://127.0.0.1:{port}/status", auth=auth
+                )
+                async with response:
+                    return response.status, await response.json()
+        finally:
+            await runner.cleanup()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    with patch.object(auth, "_async_fetch_access_token", side_effect=_mock_fetch):
+        status, body = loop.run_until_complete(_request())
+
+    assert (status, body) == (200, {"status": "ok"})
+    assert auth._access_token == valid_token
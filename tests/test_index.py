@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from requests import HTTPError
 
@@ -82,6 +83,42 @@ def test_bulk(gen3_index):
     assert drec._deleted
 
 
+def test_iter_all_records(gen3_index):
+    """
+
+    Test iter_all_records and async_iter_all_records stream every record,
+    page by page, and can resume after a given did
+
+    """
+    dids = sorted(
+        gen3_index.create_record(
+            hashes={"md5": f"{i}74c12456782738abcfe387492837483"}, size=i
+        )["did"]
+        for i in range(5)
+    )
+
+    assert [rec["did"] for rec in gen3_index.iter_all_records(limit=2)] == dids
+    assert [
+        rec["did"] for rec in gen3_index.get_all_records(limit=2, paginate=True)
+    ] == dids
+    assert [
+        rec["did"] for rec in gen3_index.iter_all_records(limit=2, start=dids[1])
+    ] == dids[2:]
+
+    async def _async_dids():
+        return [
+            rec["did"]
+            async for rec in gen3_index.async_iter_all_records(limit=2, start=dids[0])
+        ]
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    assert loop.run_until_complete(_async_dids()) == dids[1:]
+
+    for did in dids:
+        gen3_index.delete_record(did)
+
+
 def test_get_with_params(gen3_index):
     """
 
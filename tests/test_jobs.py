@@ -1,3 +1,4 @@
+import asyncio
 import os
 import glob
 import sys
@@ -14,8 +15,8 @@ from gen3.utils import split_url_and_query_params
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
 
 
-@patch("gen3.jobs.requests.get")
-@patch("gen3.jobs.requests.post")
+@patch("gen3.jobs.requests.Session.get")
+@patch("gen3.jobs.requests.Session.post")
 def test_full_job_flow(requests_post_mock, requests_get_mock):
     """
     Test whole flow of creating a job, polling status, and getting output
@@ -94,7 +95,7 @@ def test_full_job_flow(requests_post_mock, requests_get_mock):
     assert get_output.get("output") == "foobar"
 
 
-@patch("gen3.jobs.requests.get")
+@patch("gen3.jobs.requests.Session.get")
 def test_is_healthy(requests_mock):
     """
     Test is healthy response
@@ -118,7 +119,7 @@ def test_is_healthy(requests_mock):
     assert response
 
 
-@patch("gen3.jobs.requests.get")
+@patch("gen3.jobs.requests.Session.get")
 def test_is_not_healthy(requests_mock):
     """
     Test is not healthy response
@@ -143,7 +144,7 @@ def test_is_not_healthy(requests_mock):
     assert not response
 
 
-@patch("gen3.jobs.requests.get")
+@patch("gen3.jobs.requests.Session.get")
 def test_get_version(requests_mock):
     """
     Test getting version
@@ -168,3 +169,72 @@ def test_get_version(requests_mock):
     response = jobs.get_version()
 
     assert response == "2020.02-1-gbf5df61"
+
+
+def test_async_run_jobs_and_wait():
+    """
+    Test that many jobs are created and waited on concurrently without
+    blocking the event loop, and that output is returned in order
+    """
+    jobs = Gen3Jobs("https://example.com")
+    status_checks = {}
+
+    async def _mock_create_job(job_name, job_input, **kwargs):
+        return {"uid": job_input["id"], "name": job_name, "status": "Unknown"}
+
+    async def _mock_get_status(job_id, **kwargs):
+        # each job reports "Running" twice before completing
+        status_checks[job_id] = status_checks.get(job_id, 0) + 1
+        if status_checks[job_id] < 3:
+            return {"uid": job_id, "status": "Running"}
+        return {"uid": job_id, "status": "Completed"}
+
+    async def _mock_get_output(job_id, **kwargs):
+        return {"output": job_id}
+
+    jobs.async_create_job = MagicMock(side_effect=_mock_create_job)
+    jobs.async_get_status = MagicMock(side_effect=_mock_get_status)
+    jobs.async_get_output = MagicMock(side_effect=_mock_get_output)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    start = loop.time()
+    output = loop.run_until_complete(
+        jobs.async_run_jobs_and_wait(
+            [(DBGAP_METADATA_JOB, {"id": str(i)}) for i in range(50)],
+            initial_delay=0.1,
+            max_delay=0.2,
+        )
+    )
+    elapsed = loop.time() - start
+
+    assert output == [{"output": str(i)} for i in range(50)]
+    assert all(checks == 3 for checks in status_checks.values())
+    # waits are concurrent, 50 jobs waiting in series would take at least 7.5s
+    assert elapsed < 2
+
+
+def test_async_run_job_and_wait_timeout():
+    """
+    Test that waiting for a job gives up after the timeout
+    """
+    jobs = Gen3Jobs("https://example.com")
+
+    async def _mock_create_job(job_name, job_input, **kwargs):
+        return {"uid": "1234", "name": job_name, "status": "Unknown"}
+
+    async def _mock_get_status(job_id, **kwargs):
+        return {"uid": job_id, "status": "Running"}
+
+    jobs.async_create_job = MagicMock(side_effect=_mock_create_job)
+    jobs.async_get_status = MagicMock(side_effect=_mock_get_status)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    with pytest.raises(asyncio.TimeoutError):
+        loop.run_until_complete(
+            jobs.async_run_job_and_wait(
+                DBGAP_METADATA_JOB, {}, timeout=0.5, initial_delay=0.1, max_delay=0.1
+            )
+        )
+    assert jobs.async_get_status.call_count >= 2
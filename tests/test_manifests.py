@@ -1,33 +1,44 @@
+import aiohttp
 import asyncio
+import csv
 import os
 import glob
+import json
 import sys
 import shutil
 import logging
 from unittest.mock import MagicMock, patch
+import pytest
+from indexclient import client
 
 from gen3.tools.indexing import async_verify_object_manifest
+from gen3.tools.indexing import verify_object_manifest_against_snapshot
+from gen3.tools.metadata import async_ingest_metadata_manifest
+from gen3.tools.metadata.verify_manifest import async_verify_metadata_manifest
 from gen3.tools.indexing import download_manifest
-from gen3.tools.indexing.download_manifest import TMP_FOLDER
 from gen3.tools.indexing import async_download_object_manifest
+from gen3.tools.indexing import manifest_formats
 from gen3.tools.indexing.index_manifest import (
     index_object_manifest,
+    async_index_object_manifest,
     get_and_verify_fileinfos_from_tsv_manifest,
+    iter_fileinfos_from_tsv_manifest,
 )
 
-
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
 
 
+@pytest.mark.parametrize("batch_size,expected_requests", [(1, 3), (2, 2), (500, 1)])
 @patch("gen3.tools.indexing.verify_manifest.Gen3Index")
-def test_verify_manifest(mock_index):
+def test_verify_manifest(mock_index, batch_size, expected_requests):
     """
     Test that verify manifest function correctly writes out log file
-    with expected error information.
+    with expected error information, requesting the records for a whole
+    batch of rows at once.
 
     NOTE: records in indexd are mocked
     """
-    mock_index.return_value.async_get_record.side_effect = _async_mock_get_guid
+    mock_index.return_value.async_get_records.side_effect = _async_mock_get_guids
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
 
@@ -37,9 +48,12 @@ def test_verify_manifest(mock_index):
             manifest_file=CURRENT_DIR + "/test_manifest.csv",
             max_concurrent_requests=3,
             output_filename="test.log",
+            batch_size=batch_size,
         )
     )
 
+    assert mock_index.return_value.async_get_records.call_count == expected_requests
+
     logs = {}
     try:
         with open("test.log") as file:
@@ -80,6 +94,368 @@ def test_verify_manifest(mock_index):
     assert "no_record" in logs["dg.TEST/9c205cd7-c399-4503-9f49-5647188bde66"]
 
 
+@patch("gen3.tools.indexing.verify_manifest.Gen3Index")
+def test_verify_manifest_sample(mock_index):
+    """
+    Test that verifying a sample of a manifest only verifies the sampled rows and
+    reports their error rates
+
+    NOTE: records in indexd are mocked
+    """
+    mock_index.return_value.async_get_records.side_effect = _async_mock_get_guids
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    error_rates = loop.run_until_complete(
+        async_verify_object_manifest(
+            "http://localhost",
+            manifest_file=CURRENT_DIR + "/test_manifest.csv",
+            output_filename="test.log",
+            sample_size=2,
+            sample_seed=1,
+            stratify_by="acl",
+        )
+    )
+
+    requested = [
+        did
+        for call in mock_index.return_value.async_get_records.call_args_list
+        for did in call[0][0]
+    ]
+    assert len(requested) == 2
+    with open("test.log") as file:
+        errors = [line.split("|")[:2] for line in file]
+    assert {guid for guid, _ in errors} <= set(requested)
+
+    # only the first record in the manifest is correct in indexd
+    rows_with_errors = len(
+        set(requested) - {"dg.TEST/f2a39f98-6ae1-48a5-8d48-825a0c52a22b"}
+    )
+    assert error_rates["rows"] == 2
+    assert error_rates["rows_with_errors"] == rows_with_errors
+    assert error_rates["error_rate"] == rows_with_errors / 2
+    low, high = error_rates["confidence_interval"]
+    assert low <= error_rates["error_rate"] <= high
+    assert sum(rates["rows"] for rates in error_rates["strata"].values()) == 2
+
+
+@patch("gen3.tools.metadata.verify_manifest.Gen3Metadata")
+def test_verify_metadata_manifest_sample(mock_metadata, tmpdir):
+    """
+    Test that the error rates of a verified sample of a metadata manifest count
+    the errors found, even when values written to the output span several lines
+
+    NOTE: records in mds are mocked
+    """
+    manifest_file = str(tmpdir.join("metadata.tsv"))
+    with open(manifest_file, "w") as manifest:
+        manifest.write("guid\tdescription\n")
+        manifest.write("guid1\tfirst\n")
+        manifest.write("guid2\tsecond\n")
+        manifest.write("guid3\tthird\n")
+
+    records = {
+        "guid1": {"dbgap": {"description": "first"}},
+        # looks like another guid's error line once written to the output
+        "guid2": {"dbgap": {"description": "changed\nguid1|authz|expected a"}},
+    }
+
+    async def _async_get(guid, _ssl=None):
+        return records.get(guid)
+
+    mock_metadata.return_value.async_get.side_effect = _async_get
+    output_filename = str(tmpdir.join("output.log"))
+
+    loop = asyncio.new_event_loop()
+    try:
+        error_rates = loop.run_until_complete(
+            async_verify_metadata_manifest(
+                "http://localhost",
+                manifest_file=manifest_file,
+                metadata_source="dbgap",
+                output_filename=output_filename,
+                sample_size=3,
+            )
+        )
+    finally:
+        loop.close()
+
+    assert error_rates["rows"] == 3
+    assert error_rates["rows_with_errors"] == 2
+    assert {
+        field: rates["rows_with_errors"]
+        for field, rates in error_rates["fields"].items()
+    } == {"dbgap.description": 1, "no_record": 1}
+
+
+@pytest.mark.parametrize("snapshot_format", ["csv", "csv.gz", "parquet"])
+@pytest.mark.parametrize("sort_chunk_size", [1, 1000])
+@patch("gen3.tools.indexing.verify_manifest.Gen3Index")
+def test_verify_manifest_against_snapshot(
+    mock_index, tmpdir, snapshot_format, sort_chunk_size
+):
+    """
+    Test that verifying a manifest against a snapshot downloaded from indexd
+    writes the same errors as verifying it against indexd, whether or not the
+    manifests are sorted on disk
+
+    NOTE: records in indexd are mocked
+    """
+    if snapshot_format == "parquet":
+        pytest.importorskip("pyarrow")
+
+    mock_index.return_value.async_get_records.side_effect = _async_mock_get_guids
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(
+        async_verify_object_manifest(
+            "http://localhost",
+            manifest_file=CURRENT_DIR + "/test_manifest.csv",
+            output_filename="test.log",
+        )
+    )
+    with open("test.log") as file:
+        expected_errors = sorted(file)
+
+    # snapshot with the same records, plus one that isn't in the manifest
+    records = [
+        _mock_get_guid(guid)
+        for guid in [
+            "dg.TEST/1e9d3103-cbe2-4c39-917c-b3abad4750d2",
+            "dg.TEST/00000000-0000-0000-0000-000000000000",
+            "dg.TEST/f2a39f98-6ae1-48a5-8d48-825a0c52a22b",
+        ]
+    ]
+    records[1] = dict(records[0], did="dg.TEST/00000000-0000-0000-0000-000000000000")
+    snapshot_file = str(tmpdir.join(f"object-manifest.{snapshot_format}"))
+    with manifest_formats.open_manifest_writer(
+        snapshot_file, snapshot_format, manifest_formats.MANIFEST_COLUMNS
+    ) as writer:
+        writer.write(manifest_formats.format_records(records, snapshot_format))
+
+    output_filename = str(tmpdir.join("snapshot.log"))
+    verify_object_manifest_against_snapshot(
+        CURRENT_DIR + "/test_manifest.csv",
+        snapshot_file,
+        output_filename=output_filename,
+        sort_chunk_size=sort_chunk_size,
+        temp_dir=str(tmpdir),
+    )
+
+    with open(output_filename) as file:
+        errors = list(file)
+    assert sorted(errors) == expected_errors
+    assert [error.split("|")[0] for error in errors] == sorted(
+        error.split("|")[0] for error in errors
+    )
+
+
+@pytest.mark.parametrize("batch_size,expected_batches", [(2, 3), (100, 1)])
+@patch("gen3.tools.metadata.ingest_manifest.Gen3Index")
+@patch("gen3.tools.metadata.ingest_manifest.Gen3Metadata")
+def test_ingest_metadata_manifest_in_batches(
+    mock_mds, mock_index, tmpdir, batch_size, expected_batches
+):
+    """
+    Test that ingesting a metadata manifest in batches creates the metadata with a
+    batch create per batch and only retries the rows that weren't created or
+    updated by it one at a time
+
+    NOTE: indexd and mds are mocked
+    """
+    guids = [f"dg.TEST/{i}" for i in range(5)]
+    manifest_file = str(tmpdir.join("metadata.tsv"))
+    with open(manifest_file, "w") as manifest:
+        manifest.write("guid\tstudy\tdetails\n")
+        for guid in guids:
+            manifest.write(f'{guid}\tstudy1\t{{"size": 1}}\n')
+
+    batches = []
+    created = []
+    updated = []
+
+    async def _mock_get_records(dids, **kwargs):
+        return [{"did": did} for did in dids if did in guids[:2]]
+
+    async def _mock_batch_create(metadata_list, overwrite=False, **kwargs):
+        assert overwrite
+        batches.append(metadata_list)
+        batch_guids = [item["guid"] for item in metadata_list]
+        return {
+            "created": [guid for guid in batch_guids if guid in guids[:2]],
+            "updated": [guid for guid in batch_guids if guid == guids[2]],
+            # guids[3] is a conflict and guids[4] isn't in the response at all
+            "conflict": [guid for guid in batch_guids if guid == guids[3]],
+        }
+
+    async def _mock_create(guid, metadata, **kwargs):
+        if guid == guids[3]:
+            raise Exception("conflict")
+        created.append(guid)
+
+    async def _mock_update(guid, metadata, **kwargs):
+        updated.append(guid)
+
+    mock_index.return_value.async_get_records.side_effect = _mock_get_records
+    mock_mds.return_value.async_batch_create.side_effect = _mock_batch_create
+    mock_mds.return_value.async_create.side_effect = _mock_create
+    mock_mds.return_value.async_update.side_effect = _mock_update
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(
+        async_ingest_metadata_manifest(
+            "http://localhost",
+            manifest_file=manifest_file,
+            metadata_source="test",
+            output_filename="test.log",
+            batch_size=batch_size,
+        )
+    )
+
+    assert len(batches) == expected_batches
+    metadata = {item["guid"]: item["data"] for batch in batches for item in batch}
+    assert metadata[guids[0]] == {
+        "test": {"study": "study1", "details": {"size": 1}},
+        "_guid_type": "indexed_file_object",
+    }
+    assert metadata[guids[4]]["_guid_type"] == "metadata_object"
+    assert mock_index.return_value.async_get_records.call_count == expected_batches
+
+    # only the rows that weren't created or updated by the batch are retried
+    assert created == [guids[4]]
+    assert updated == [guids[3]]
+    with open("test.log") as file:
+        output = file.read()
+    for guid in guids[:2] + [guids[4]]:
+        assert f"Successfully created {guid}\n" in output
+    for guid in guids[2:4]:
+        assert f"Successfully updated {guid}\n" in output
+
+
+@patch("gen3.tools.metadata.ingest_manifest.Gen3Index")
+@patch("gen3.tools.metadata.ingest_manifest.Gen3Metadata")
+def test_ingest_metadata_manifest_in_batches_lookup_failure(
+    mock_mds, mock_index, tmpdir, monkeypatch
+):
+    """
+    Test that when the request for a batch's records fails, the guids are looked
+    up one at a time instead of assuming that none of them are indexed
+
+    NOTE: indexd and mds are mocked
+    """
+    monkeypatch.chdir(tmpdir)
+    guids = [f"dg.TEST/{i}" for i in range(4)]
+    manifest_file = str(tmpdir.join("metadata.tsv"))
+    with open(manifest_file, "w") as manifest:
+        manifest.write("guid\tstudy\n")
+        for guid in guids:
+            manifest.write(f"{guid}\tstudy1\n")
+
+    batches = []
+
+    async def _mock_get_records(dids, **kwargs):
+        raise Exception("bulk request failed")
+
+    async def _mock_get_record(guid, **kwargs):
+        if guid not in guids[:2]:
+            raise Exception("not found")
+        return {"did": guid}
+
+    async def _mock_batch_create(metadata_list, overwrite=False, **kwargs):
+        batches.append(metadata_list)
+        return {"created": [item["guid"] for item in metadata_list]}
+
+    mock_index.return_value.async_get_records.side_effect = _mock_get_records
+    mock_index.return_value.async_get_record.side_effect = _mock_get_record
+    mock_mds.return_value.async_batch_create.side_effect = _mock_batch_create
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(
+            async_ingest_metadata_manifest(
+                "http://localhost",
+                manifest_file=manifest_file,
+                metadata_source="test",
+                output_filename="output.log",
+                batch_size=10,
+            )
+        )
+    finally:
+        loop.close()
+
+    guid_types = {
+        item["guid"]: item["data"]["_guid_type"] for batch in batches for item in batch
+    }
+    assert guid_types == {
+        guids[0]: "indexed_file_object",
+        guids[1]: "indexed_file_object",
+        guids[2]: "metadata_object",
+        guids[3]: "metadata_object",
+    }
+    assert mock_index.return_value.async_get_record.call_count == 4
+
+
+@patch("gen3.tools.metadata.ingest_manifest.Gen3Metadata")
+def test_ingest_metadata_manifest_in_batches_queries_concurrently(
+    mock_mds, tmpdir, monkeypatch
+):
+    """
+    Test that when ingesting in batches without guids in the file, the indexd
+    queries for the rows of a batch run concurrently, limited by the maximum
+    number of concurrent requests
+
+    NOTE: indexd and mds are mocked
+    """
+    # the output file is always written to the current directory
+    monkeypatch.chdir(tmpdir)
+    manifest_file = str(tmpdir.join("metadata.tsv"))
+    with open(manifest_file, "w") as manifest:
+        manifest.write("submitted_sample_id\tstudy\n")
+        for i in range(10):
+            manifest.write(f"sample{i}\tstudy1\n")
+
+    in_flight = []
+    max_in_flight = []
+
+    async def _mock_query_for_guid(commons_url, row, lock, output_queue):
+        async with lock:
+            in_flight.append(row)
+            max_in_flight.append(len(in_flight))
+            await asyncio.sleep(0)
+            in_flight.remove(row)
+        return f"dg.TEST/{row['submitted_sample_id']}"
+
+    async def _mock_batch_create(metadata_list, overwrite=False, **kwargs):
+        return {"created": [item["guid"] for item in metadata_list]}
+
+    mock_mds.return_value.async_batch_create.side_effect = _mock_batch_create
+
+    loop = asyncio.new_event_loop()
+    try:
+        with patch.dict(
+            "gen3.tools.metadata.ingest_manifest.manifest_row_parsers",
+            {"indexed_file_object_guid": _mock_query_for_guid},
+        ):
+            loop.run_until_complete(
+                async_ingest_metadata_manifest(
+                    "http://localhost",
+                    manifest_file=manifest_file,
+                    metadata_source="test",
+                    max_concurrent_requests=3,
+                    output_filename="output.log",
+                    get_guid_from_file=False,
+                    batch_size=10,
+                )
+            )
+    finally:
+        loop.close()
+
+    assert len(max_in_flight) == 10
+    assert max(max_in_flight) == 3
+    assert mock_mds.return_value.async_batch_create.call_count == 1
+
+
 def test_download_manifest(monkeypatch, gen3_index):
     """
     Test that dowload manifest generates a file with expected content.
@@ -198,6 +574,219 @@ def test_download_manifest(monkeypatch, gen3_index):
     ).get("file_name")
 
 
+def test_download_manifest_delta(tmpdir):
+    """
+    Test that an incremental download writes the full manifest along with a delta
+    of the records created/updated since the previous manifest and tombstones
+    for the deleted ones
+    """
+
+    def _record(did, updated_date):
+        return {
+            "did": did,
+            "urls": [f"s3://test/{did}.txt"],
+            "authz": ["/programs/DEV"],
+            "acl": ["DEV"],
+            "hashes": {"md5": "a1234567891234567890123456789012"},
+            "size": 123,
+            "file_name": None,
+            "created_date": "2020-01-01T00:00:00.000000",
+            "updated_date": updated_date,
+        }
+
+    records = [
+        _record("dg.TEST/1", "2020-01-01T00:00:00.000000"),
+        _record("dg.TEST/2", "2020-06-02T12:00:00.000000"),
+        _record("dg.TEST/4", "2020-06-02T12:00:00.000000"),
+    ]
+
+    async def _mock_get_records_after(self, start=None, limit=None, _ssl=None):
+        return [record for record in records if start is None or record["did"] > start][
+            :limit
+        ]
+
+    previous_manifest = str(tmpdir.join("previous.csv"))
+    with open(previous_manifest, "w") as file:
+        file.write("guid,urls,authz,acl,md5,file_size,file_name\n")
+        for did in ["dg.TEST/1", "dg.TEST/2", "dg.TEST/3"]:
+            file.write(f"{did},s3://test/{did}.txt,/programs/DEV,DEV,a12,123,\n")
+
+    output_filename = str(tmpdir.join("object-manifest.csv"))
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    with patch(
+        "gen3.index.Gen3Index._async_get_records_after", _mock_get_records_after
+    ):
+        loop.run_until_complete(
+            async_download_object_manifest(
+                "http://localhost:8001",
+                output_filename=output_filename,
+                previous_manifest=previous_manifest,
+                since="2020-06-01T00:00:00",
+            )
+        )
+
+    with open(output_filename) as file:
+        assert [row["guid"] for row in csv.DictReader(file)] == [
+            "dg.TEST/1",
+            "dg.TEST/2",
+            "dg.TEST/4",
+        ]
+    with open(str(tmpdir.join("object-manifest.delta.csv"))) as file:
+        assert [(row["guid"], row["change"]) for row in csv.DictReader(file)] == [
+            ("dg.TEST/2", "updated"),
+            ("dg.TEST/4", "created"),
+            ("dg.TEST/3", "deleted"),
+        ]
+
+
+@pytest.mark.parametrize("kwargs", [{"resume": True}, {"num_processes": 4}])
+def test_download_manifest_delta_unsupported_options(tmpdir, kwargs):
+    """
+    Test that an incremental download refuses options it would otherwise ignore,
+    since it's a single serial listing
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        with pytest.raises(ValueError):
+            loop.run_until_complete(
+                async_download_object_manifest(
+                    "http://localhost:8001",
+                    output_filename=str(tmpdir.join("object-manifest.csv")),
+                    previous_manifest=str(tmpdir.join("previous.csv")),
+                    since="2020-06-01T00:00:00",
+                    **kwargs,
+                )
+            )
+    finally:
+        loop.close()
+
+
+@pytest.mark.parametrize("output_format", ["csv.gz", "parquet"])
+def test_download_manifest_output_formats(tmpdir, output_format):
+    """
+    Test that the manifest can be written gzip compressed or as Parquet, and read
+    back the same
+    """
+    if output_format == "parquet":
+        pytest.importorskip("pyarrow")
+
+    records = [
+        {
+            "did": f"dg.TEST/{i}",
+            "urls": [f"s3://test/file {i}.txt"],
+            "authz": ["/programs/DEV"],
+            "acl": ["DEV", "test"],
+            "hashes": {"md5": "a1234567891234567890123456789012"},
+            "size": i,
+            "file_name": None,
+        }
+        for i in range(5)
+    ]
+
+    def _mock_get_stats(self):
+        return {"fileCount": len(records)}
+
+    async def _mock_get_records_on_page(self, page=None, limit=None, _ssl=None):
+        return records[page * limit : (page + 1) * limit]
+
+    output_filename = str(tmpdir.join(f"object-manifest.{output_format}"))
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    with patch("gen3.index.Gen3Index.get_stats", _mock_get_stats), patch(
+        "gen3.index.Gen3Index.async_get_records_on_page", _mock_get_records_on_page
+    ), patch("gen3.tools.indexing.download_manifest.INDEXD_RECORD_PAGE_SIZE", 2):
+        loop.run_until_complete(
+            async_download_object_manifest(
+                "http://localhost:8001", output_filename=output_filename
+            )
+        )
+
+    assert list(manifest_formats.read_manifest_column(output_filename, "guid")) == [
+        record["did"] for record in records
+    ]
+    acls = list(manifest_formats.read_manifest_column(output_filename, "acl"))
+    if output_format == "parquet":
+        assert acls == [["DEV", "test"]] * len(records)
+    else:
+        assert acls == ["DEV test"] * len(records)
+
+
+@pytest.mark.parametrize("output_format", ["csv", "csv.gz"])
+def test_download_manifest_resume(tmpdir, output_format):
+    """
+    Test that a download that failed part way through can be resumed from its
+    checkpoint: only the pages that weren't written are requested again, the
+    output is the same as downloading it in one go and the partial output and
+    checkpoint are removed once done
+    """
+    records = [
+        {
+            "did": f"dg.TEST/{i}",
+            "urls": [f"s3://test/file {i}.txt"],
+            "authz": ["/programs/DEV"],
+            "acl": ["DEV", "test"],
+            "hashes": {"md5": "a1234567891234567890123456789012"},
+            "size": i,
+            "file_name": None,
+        }
+        for i in range(10)
+    ]
+    requested_pages = []
+    failing_pages = set()
+
+    def _mock_get_stats(self):
+        return {"fileCount": len(records)}
+
+    async def _mock_get_records_on_page(self, page=None, limit=None, _ssl=None):
+        requested_pages.append(page)
+        if page in failing_pages:
+            raise Exception(f"failed to get page {page}")
+        return records[page * limit : (page + 1) * limit]
+
+    def _download(output_filename, resume=False):
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(
+                async_download_object_manifest(
+                    "http://localhost:8001",
+                    output_filename=output_filename,
+                    num_processes=1,
+                    max_concurrent_requests=2,
+                    resume=resume,
+                )
+            )
+        finally:
+            loop.close()
+
+    expected_filename = str(tmpdir.join(f"expected.{output_format}"))
+    output_filename = str(tmpdir.join(f"object-manifest.{output_format}"))
+    with patch("gen3.index.Gen3Index.get_stats", _mock_get_stats), patch(
+        "gen3.index.Gen3Index.async_get_records_on_page", _mock_get_records_on_page
+    ), patch("gen3.tools.indexing.download_manifest.INDEXD_RECORD_PAGE_SIZE", 2):
+        _download(expected_filename)
+
+        failing_pages.add(3)
+        with pytest.raises(Exception):
+            _download(output_filename)
+        assert not os.path.exists(output_filename)
+        assert os.path.exists(output_filename + ".partial")
+        with open(output_filename + ".checkpoint") as checkpoint:
+            assert json.load(checkpoint)["pages_written"] == 3
+
+        failing_pages.clear()
+        requested_pages.clear()
+        _download(output_filename, resume=True)
+
+    assert requested_pages == [3, 4]
+    with open(expected_filename, "rb") as expected, open(
+        output_filename, "rb"
+    ) as output:
+        assert output.read() == expected.read()
+    assert not os.path.exists(output_filename + ".partial")
+    assert not os.path.exists(output_filename + ".checkpoint")
+
+
 def _mock_get_guid(guid, **kwargs):
     if guid == "dg.TEST/f2a39f98-6ae1-48a5-8d48-825a0c52a22b":
         return {
@@ -247,6 +836,11 @@ def _mock_get_guid(guid, **kwargs):
         return None
 
 
+async def _async_mock_get_guids(dids, **kwargs):
+    records = [await _async_mock_get_guid(did) for did in dids]
+    return [record for record in records if record] or None
+
+
 async def _async_mock_get_guid(guid, **kwargs):
     if guid == "dg.TEST/f2a39f98-6ae1-48a5-8d48-825a0c52a22b":
         return {
@@ -384,6 +978,43 @@ def test_read_manifest():
     assert files[3]["urls"] == "['s3://pdcdatastore/test4.raw']"
 
 
+def test_iter_manifest(tmpdir):
+    """
+    Test that the streaming reader yields normalized rows one at a time, along
+    with whether each one passed the validation
+    """
+    manifest = str(tmpdir.join("manifest.tsv"))
+    with open(manifest, "w") as file:
+        file.write("GUID\tmd5_hash\tfile_size\turl\textra\n")
+        file.write(
+            "255e396f-f1f8-11e9-9a07-0a80fada099c\t473d83400bc1bc9dc635e334faddf33c"
+            "\t363455714\ts3://pdcdatastore/test1.raw\t foo \n"
+        )
+        file.write(
+            "255e396f-f1f8-11e9-9a07-0a80fada098c\tnot-a-md5\t343434344"
+            "\ts3://pdcdatastore/test2.raw\tbar\n"
+        )
+
+    rows = iter_fileinfos_from_tsv_manifest(manifest, include_additional_columns=True)
+    assert next(rows) == (
+        {
+            "guid": "255e396f-f1f8-11e9-9a07-0a80fada099c",
+            "md5": "473d83400bc1bc9dc635e334faddf33c",
+            "size": 363455714,
+            "urls": "s3://pdcdatastore/test1.raw",
+            "extra": "foo",
+        },
+        True,
+    )
+    row, is_row_valid = next(rows)
+    assert row["md5"] == "not-a-md5"
+    assert not is_row_valid
+    assert next(rows, None) is None
+
+    # the whole manifest fails verification if any row is invalid
+    assert get_and_verify_fileinfos_from_tsv_manifest(manifest) == ([], [])
+
+
 def test_index_manifest(gen3_index, indexd_server):
 
     rec1 = gen3_index.create_record(
@@ -428,6 +1059,347 @@ def test_index_manifest(gen3_index, indexd_server):
     assert rec6["authz"] == ["/prog ram/DEV/project/test"]
 
 
+def test_async_index_manifest(gen3_index, indexd_server):
+    """
+    Test that indexing asynchronously creates/updates the same records and
+    output as indexing with threads
+    """
+    gen3_index.create_record(
+        did="255e396f-f1f8-11e9-9a07-0a80fada099c",
+        hashes={"md5": "473d83400bc1bc9dc635e334faddf33c"},
+        acl=["DEV", "test"],
+        size=363_455_714,
+        urls=["s3://testaws/aws/test.txt", "gs://test/test.txt"],
+    )
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    files, headers = loop.run_until_complete(
+        async_index_object_manifest(
+            indexd_server.baseurl,
+            "./test.tsv",
+            max_concurrent_requests=4,
+            auth=("admin", "admin"),
+            replace_urls=False,
+        )
+    )
+    rec1 = gen3_index.get("255e396f-f1f8-11e9-9a07-0a80fada099c")
+    rec2 = gen3_index.get("255e396f-f1f8-11e9-9a07-0a80fada010c")
+    rec5 = gen3_index.get("255e396f-f1f8-11e9-9a07-0a80fada096c")
+    rec6 = gen3_index.get("255e396f-f1f8-11e9-9a07-0a80fada012c")
+    assert set(rec1["urls"]) == set(
+        [
+            "s3://testaws/aws/test.txt",
+            "gs://test/test.txt",
+            "s3://pdcdatastore/test1.raw",
+        ]
+    )
+    assert rec2["hashes"]["md5"] == "473d83400bc1bc9dc635e334fadde33c"
+    assert rec2["authz"] == ["/program/DEV/project/test"]
+    assert rec5["file_name"] == "test4_file.raw"
+    assert rec5["acl"] == ["phs0001", "phs0002"]
+    assert rec6["urls"] == ["s3://pdcdatastore/test6 space.raw"]
+    assert headers[0] == "guid"
+    assert len(files) == 6
+
+
+@patch("gen3.tools.indexing.index_manifest.client.IndexClient")
+@patch("gen3.tools.indexing.index_manifest.Gen3Index")
+def test_index_manifest_prefetches_existing_records(mock_index, mock_indexclient):
+    """
+    Test that existing records are requested in bulk up front, so the only
+    requests per row are the actual creates/updates
+    """
+    existing_record = {
+        "did": "255e396f-f1f8-11e9-9a07-0a80fada099c",
+        "rev": "abc123",
+        "hashes": {"md5": "473d83400bc1bc9dc635e334faddf33c"},
+        "size": 363_455_714,
+        "acl": ["DEV", "test"],
+        "authz": [],
+        "urls": ["s3://testaws/aws/test.txt"],
+        "urls_metadata": {},
+        "file_name": None,
+    }
+    mock_index.return_value.get_records.side_effect = lambda dids: [
+        existing_record for did in dids if did == existing_record["did"]
+    ]
+    mock_indexclient.return_value.create.side_effect = lambda **record: MagicMock(
+        did=record["did"]
+    )
+
+    with patch(
+        "gen3.tools.indexing.index_manifest.client.Document.patch"
+    ) as mock_patch, patch(
+        "gen3.tools.indexing.index_manifest.BULK_DOCUMENTS_BATCH_SIZE", 2
+    ):
+        files, _ = index_object_manifest(
+            "http://localhost", "./test.tsv", 2, ("admin", "admin"), replace_urls=False
+        )
+
+    # 6 guids in batches of 2
+    assert mock_index.return_value.get_records.call_count == 3
+    assert not mock_indexclient.return_value.get.called
+    assert mock_indexclient.return_value.create.call_count == 5
+    assert mock_patch.call_count == 1
+    assert len(files) == 6
+
+
+@patch("gen3.tools.indexing.index_manifest.Gen3Index")
+def test_async_index_manifest_prefetches_existing_records(mock_index):
+    """
+    Test that indexing asynchronously requests the existing records in bulk up
+    front and never has more than max_concurrent_requests records in flight
+    """
+    existing_record = {
+        "did": "255e396f-f1f8-11e9-9a07-0a80fada099c",
+        "rev": "abc123",
+        "hashes": {"md5": "473d83400bc1bc9dc635e334faddf33c"},
+        "size": 363_455_714,
+        "acl": ["DEV", "test"],
+        "authz": [],
+        "urls": ["s3://testaws/aws/test.txt"],
+        "urls_metadata": {},
+        "file_name": None,
+    }
+    in_flight = []
+    max_in_flight = []
+
+    async def _track_in_flight():
+        in_flight.append(1)
+        max_in_flight.append(len(in_flight))
+        await asyncio.sleep(0)
+        in_flight.pop()
+
+    async def _async_get_records(dids, _ssl=None):
+        return [existing_record for did in dids if did == existing_record["did"]]
+
+    async def _async_create_record(_ssl=None, **record):
+        await _track_in_flight()
+        return {"did": record["did"]}
+
+    async def _async_update_record(guid, rev=None, _ssl=None, **updates):
+        await _track_in_flight()
+        return {"did": guid, "rev": "def456"}
+
+    mock_index.return_value.async_get_records.side_effect = _async_get_records
+    mock_index.return_value.async_create_record.side_effect = _async_create_record
+    mock_index.return_value.async_update_record.side_effect = _async_update_record
+
+    loop = asyncio.new_event_loop()
+    try:
+        with patch("gen3.tools.indexing.index_manifest.BULK_DOCUMENTS_BATCH_SIZE", 2):
+            files, _ = loop.run_until_complete(
+                async_index_object_manifest(
+                    "http://localhost",
+                    "./test.tsv",
+                    max_concurrent_requests=2,
+                    auth=("admin", "admin"),
+                    replace_urls=False,
+                )
+            )
+    finally:
+        loop.close()
+
+    # 6 guids in batches of 2
+    assert mock_index.return_value.async_get_records.call_count == 3
+    assert not mock_index.return_value._async_request.called
+    assert mock_index.return_value.async_create_record.call_count == 5
+    assert mock_index.return_value.async_update_record.call_count == 1
+    assert max(max_in_flight) == 2
+    assert len(files) == 6
+
+
+def _write_manifest_with_repeated_guids(manifest_file):
+    """
+    Write a manifest with an existing guid and a new guid that both appear on two
+    rows, with a different url on each row
+    """
+    with open(manifest_file, "w") as manifest:
+        manifest.write("guid\tmd5\tsize\tacl\turl\n")
+        for guid, url in [
+            ("255e396f-f1f8-11e9-9a07-0a80fada099c", "s3://bucket/existing1.txt"),
+            ("255e396f-f1f8-11e9-9a07-0a80fada099c", "s3://bucket/existing2.txt"),
+            ("255e396f-f1f8-11e9-9a07-0a80fada098c", "s3://bucket/new1.txt"),
+            ("255e396f-f1f8-11e9-9a07-0a80fada098c", "s3://bucket/new2.txt"),
+        ]:
+            manifest.write(
+                f"{guid}\t473d83400bc1bc9dc635e334faddf33c\t363455714\tDEV\t{url}\n"
+            )
+
+
+@patch("gen3.tools.indexing.index_manifest.client.IndexClient")
+@patch("gen3.tools.indexing.index_manifest.Gen3Index")
+def test_index_manifest_repeated_guids(mock_index, mock_indexclient, tmpdir):
+    """
+    Test that rows with a guid created or updated by an earlier row see that
+    record instead of the prefetched one, so the guid isn't created twice and
+    isn't updated with a stale rev
+    """
+    manifest_file = str(tmpdir.join("manifest.tsv"))
+    _write_manifest_with_repeated_guids(manifest_file)
+    existing_record = {
+        "did": "255e396f-f1f8-11e9-9a07-0a80fada099c",
+        "rev": "abc123",
+        "hashes": {"md5": "473d83400bc1bc9dc635e334faddf33c"},
+        "size": 363455714,
+        "acl": ["DEV"],
+        "authz": [],
+        "urls": [],
+        "urls_metadata": {},
+        "file_name": "",
+    }
+    mock_index.return_value.get_records.side_effect = lambda dids: [
+        existing_record for did in dids if did == existing_record["did"]
+    ]
+    mock_indexclient.return_value.create.side_effect = lambda **record: MagicMock(
+        did=record["did"]
+    )
+    mock_indexclient.return_value.get.side_effect = lambda guid: client.Document(
+        mock_indexclient.return_value,
+        guid,
+        json={
+            "did": guid,
+            "rev": "def456",
+            "hashes": {"md5": "473d83400bc1bc9dc635e334faddf33c"},
+            "size": 363455714,
+            "acl": ["DEV"],
+            "urls": ["s3://bucket/new1.txt"],
+        },
+    )
+    patched_urls = []
+
+    def _patch(doc):
+        patched_urls.append((doc.did, doc.rev, doc.urls))
+
+    with patch.object(client.Document, "patch", _patch):
+        index_object_manifest(
+            "http://localhost", manifest_file, 1, ("admin", "admin"), replace_urls=False
+        )
+
+    assert mock_indexclient.return_value.create.call_count == 1
+    mock_indexclient.return_value.get.assert_called_once_with(
+        "255e396f-f1f8-11e9-9a07-0a80fada098c"
+    )
+    assert patched_urls == [
+        (
+            "255e396f-f1f8-11e9-9a07-0a80fada099c",
+            "abc123",
+            ["s3://bucket/existing1.txt"],
+        ),
+        (
+            "255e396f-f1f8-11e9-9a07-0a80fada099c",
+            "abc123",
+            ["s3://bucket/existing1.txt", "s3://bucket/existing2.txt"],
+        ),
+        (
+            "255e396f-f1f8-11e9-9a07-0a80fada098c",
+            "def456",
+            ["s3://bucket/new1.txt", "s3://bucket/new2.txt"],
+        ),
+    ]
+
+
+@patch("gen3.tools.indexing.index_manifest.Gen3Index")
+def test_async_index_manifest_repeated_guids(mock_index, tmpdir):
+    """
+    Test that when indexing asynchronously, rows with a guid created or updated by
+    an earlier row see that record and its new rev instead of the prefetched one,
+    and that an update rejected for a stale rev is retried with the current one
+    """
+    manifest_file = str(tmpdir.join("manifest.tsv"))
+    _write_manifest_with_repeated_guids(manifest_file)
+    existing_record = {
+        "did": "255e396f-f1f8-11e9-9a07-0a80fada099c",
+        "rev": "rev0",
+        "hashes": {"md5": "473d83400bc1bc9dc635e334faddf33c"},
+        "size": 363455714,
+        "acl": ["DEV"],
+        "authz": [],
+        "urls": [],
+        "urls_metadata": {},
+        "file_name": "",
+    }
+    updates = []
+
+    async def _async_get_records(dids, _ssl=None):
+        return [existing_record for did in dids if did == existing_record["did"]]
+
+    async def _async_create_record(_ssl=None, **record):
+        return {"did": record["did"], "rev": "created"}
+
+    async def _async_update_record(guid, rev=None, _ssl=None, **record_updates):
+        updates.append((guid, rev, record_updates["urls"]))
+        if rev == "stale":
+            raise aiohttp.ClientResponseError(MagicMock(), (), status=409)
+        return {"did": guid, "rev": f"rev{len(updates)}"}
+
+    async def _async_get_record(guid, _ssl=None):
+        return dict(existing_record, rev="current")
+
+    mock_index.return_value.async_get_records.side_effect = _async_get_records
+    mock_index.return_value.async_create_record.side_effect = _async_create_record
+    mock_index.return_value.async_update_record.side_effect = _async_update_record
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(
+            async_index_object_manifest(
+                "http://localhost",
+                manifest_file,
+                max_concurrent_requests=1,
+                auth=("admin", "admin"),
+                replace_urls=False,
+            )
+        )
+        assert mock_index.return_value.async_create_record.call_count == 1
+        assert updates == [
+            (
+                "255e396f-f1f8-11e9-9a07-0a80fada099c",
+                "rev0",
+                ["s3://bucket/existing1.txt"],
+            ),
+            (
+                "255e396f-f1f8-11e9-9a07-0a80fada099c",
+                "rev1",
+                ["s3://bucket/existing1.txt", "s3://bucket/existing2.txt"],
+            ),
+            (
+                "255e396f-f1f8-11e9-9a07-0a80fada098c",
+                "created",
+                ["s3://bucket/new1.txt", "s3://bucket/new2.txt"],
+            ),
+        ]
+
+        # an update with a stale rev is retried with the current record
+        existing_record["rev"] = "stale"
+        updates.clear()
+        mock_index.return_value.async_get_record.side_effect = _async_get_record
+        loop.run_until_complete(
+            async_index_object_manifest(
+                "http://localhost",
+                manifest_file,
+                max_concurrent_requests=1,
+                auth=("admin", "admin"),
+                replace_urls=False,
+            )
+        )
+        assert updates[:2] == [
+            (
+                "255e396f-f1f8-11e9-9a07-0a80fada099c",
+                "stale",
+                ["s3://bucket/existing1.txt"],
+            ),
+            (
+                "255e396f-f1f8-11e9-9a07-0a80fada099c",
+                "current",
+                ["s3://bucket/existing1.txt"],
+            ),
+        ]
+    finally:
+        loop.close()
+
+
 def test_index_manifest_with_replace_urls(gen3_index, indexd_server):
     rec1 = gen3_index.create_record(
         did="255e396f-f1f8-11e9-9a07-0a80fada099c",
@@ -0,0 +1,171 @@
+import csv
+import gzip
+import random
+
+import pytest
+
+from gen3.tools.merge import (
+    _PartialMatchIndex,
+    get_guids_for_manifest_row_partial_match,
+    merge_guids_into_metadata,
+    manifest_row_parsers,
+)
+
+CONFIG = {
+    "guid_column_name": "guid",
+    "row_column_name": "submitted_sample_id",
+    "indexing_manifest_column_name": "urls",
+}
+
+
+def _get_guids_partial_match_by_scanning(row, data_from_indexing_manifest, config):
+    """
+    Partial match by comparing the key from the row to every key, which
+    get_guids_for_manifest_row_partial_match should match the results of
+    """
+    key_from_row = row.get(config["row_column_name"]).strip()
+    matching_keys = [
+        key
+        for key, matching_rows in data_from_indexing_manifest.items()
+        if key_from_row in key and matching_rows
+    ]
+    matching_guids = []
+    for key in matching_keys:
+        matching_guids.extend(
+            row["guid"] for row in data_from_indexing_manifest[key] if row["guid"]
+        )
+        del data_from_indexing_manifest[key]
+    return matching_guids
+
+
+def _get_data_from_indexing_manifest(count):
+    random.seed(count)
+    data = {}
+    for i in range(count):
+        sample_id = f"NWD{random.randint(0, count // 2):06d}"
+        key = f"s3://bucket/{random.choice(['a', 'b'])}/{sample_id}.{random.choice(['cram', 'crai'])}"
+        data.setdefault(key, []).append(
+            {"guid": f"dg.TEST/{i}" if i % 10 else "", "urls": key}
+        )
+    return data
+
+
+@pytest.mark.parametrize("use_index", [True, False])
+def test_partial_match_same_as_scanning(use_index):
+    """
+    Test that matching with or without the index returns the same guids, and
+    deletes the same matched keys, as comparing the key from the row to every key
+    """
+    data = _get_data_from_indexing_manifest(2000)
+    expected_data = _get_data_from_indexing_manifest(2000)
+    partial_match_index = _PartialMatchIndex(data) if use_index else None
+    rows = [f"NWD{i:06d}" for i in range(0, 1000, 3)]
+    # shorter than the indexed substrings, or not in any key
+    rows += ["a", "/", "NWD", "NWD0001", "missing", "NWD0002", ""]
+
+    for sample_id in rows:
+        row = {"submitted_sample_id": f" {sample_id} "}
+        guids = get_guids_for_manifest_row_partial_match(
+            row, data, CONFIG, partial_match_index=partial_match_index
+        )
+        assert guids == _get_guids_partial_match_by_scanning(row, expected_data, CONFIG)
+        assert list(data) == list(expected_data)
+
+
+def test_partial_match_after_changing_data():
+    """
+    Test that without an index, the data is matched as it is when called, even
+    after it's changed without changing its size, or for other data
+    """
+    data = {"s3://bucket/abc": [{"guid": "1"}], "s3://bucket/abd": [{"guid": "2"}]}
+    row = {"submitted_sample_id": "abc"}
+    assert get_guids_for_manifest_row_partial_match(row, data, CONFIG) == ["1"]
+
+    data["s3://bucket/abc/again"] = [{"guid": "3"}]
+    assert get_guids_for_manifest_row_partial_match(row, data, CONFIG) == ["3"]
+
+    del data["s3://bucket/abd"]
+    data["s3://bucket/abc/new"] = [{"guid": "5"}]
+    assert get_guids_for_manifest_row_partial_match(row, data, CONFIG) == ["5"]
+
+    other_data = {"s3://other/abc": [{"guid": "4"}]}
+    assert get_guids_for_manifest_row_partial_match(row, other_data, CONFIG) == ["4"]
+
+
+def test_merge_guids_into_metadata_partial_match(tmpdir):
+    """
+    Test merging a metadata manifest with guids partially matching urls in an
+    indexing manifest
+    """
+    indexing_manifest = tmpdir.join("indexing.tsv")
+    indexing_manifest.write(
+        "guid\turls\n"
+        "dg.TEST/1\ts3://bucket/NWD000001.cram\n"
+        "dg.TEST/2\ts3://bucket/NWD000001.crai\n"
+        "dg.TEST/3\ts3://bucket/NWD000002.cram\n"
+    )
+    metadata_manifest = tmpdir.join("metadata.tsv")
+    metadata_manifest.write(
+        "submitted_sample_id\tbody_site\nNWD000001\tblood\nNWD000003\tsaliva\n"
+    )
+    output = tmpdir.join("merged.tsv")
+    parsers = dict(manifest_row_parsers)
+    parsers["guids_for_manifest_row"] = get_guids_for_manifest_row_partial_match
+    merge_guids_into_metadata(
+        str(indexing_manifest),
+        str(metadata_manifest),
+        manifest_row_parsers=parsers,
+        manifests_mapping_config=CONFIG,
+        output_filename=str(output),
+        include_all_indexing_cols_in_output=False,
+    )
+
+    with open(str(output), encoding="utf-8-sig") as merged_file:
+        rows = list(csv.DictReader(merged_file, delimiter="\t"))
+    assert [(row["guid"], row["submitted_sample_id"]) for row in rows] == [
+        ("dg.TEST/1", "NWD000001"),
+        ("dg.TEST/2", "NWD000001"),
+        ("", "NWD000003"),
+    ]
+
+
+def test_merge_guids_into_metadata_compressed_output(tmpdir):
+    """
+    Test that the merged manifest is the same when buffering few rows at a time
+    and when compressed
+    """
+    indexing_manifest = tmpdir.join("indexing.tsv")
+    indexing_manifest.write(
+        "guid\tsample_id\n"
+        + "".join(f"dg.TEST/{i}\tsample_{i % 50}\n" for i in range(100))
+    )
+    metadata_manifest = tmpdir.join("metadata.tsv")
+    metadata_manifest.write(
+        "submitted_sample_id\tbody_site\n"
+        + "".join(f"sample_{i}\tblood\n" for i in range(60))
+    )
+
+    merged_manifests = []
+    for output_filename, kwargs in [
+        ("merged.tsv", {}),
+        ("merged-flushed.tsv", {"output_flush_size": 3}),
+        ("merged.tsv.gz", {"output_compression": "gzip"}),
+    ]:
+        output = tmpdir.join(output_filename)
+        merge_guids_into_metadata(
+            str(indexing_manifest),
+            str(metadata_manifest),
+            output_filename=str(output),
+            include_all_indexing_cols_in_output=False,
+            **kwargs,
+        )
+        if output_filename.endswith(".gz"):
+            with gzip.open(str(output), "rb") as merged_file:
+                merged_manifests.append(merged_file.read())
+        else:
+            merged_manifests.append(output.read_binary())
+
+    assert merged_manifests[0].startswith(b"\xef\xbb\xbfguid\tsubmitted_sample_id")
+    assert len(merged_manifests[0].splitlines()) == 111
+    assert merged_manifests[1] == merged_manifests[0]
+    assert merged_manifests[2] == merged_manifests[0]
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import glob
 import sys
@@ -6,6 +7,7 @@ import logging
 from unittest.mock import MagicMock, patch
 import pytest
 import requests
+from aiohttp import web
 from requests.exceptions import HTTPError
 
 from gen3 import metadata
@@ -15,7 +17,7 @@ from gen3.utils import split_url_and_query_params
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
 
 
-@patch("gen3.metadata.requests.get")
+@patch("gen3.metadata.requests.Session.get")
 def test_is_healthy(requests_mock):
     """
     Test is healthy response
@@ -42,7 +44,7 @@ def test_is_healthy(requests_mock):
     assert response
 
 
-@patch("gen3.metadata.requests.get")
+@patch("gen3.metadata.requests.Session.get")
 def test_is_not_healthy(requests_mock):
     """
     Test is not healthy response
@@ -67,7 +69,7 @@ def test_is_not_healthy(requests_mock):
     assert not response
 
 
-@patch("gen3.metadata.requests.get")
+@patch("gen3.metadata.requests.Session.get")
 def test_get_version(requests_mock):
     """
     Test getting version
@@ -92,7 +94,7 @@ def test_get_version(requests_mock):
     assert response
 
 
-@patch("gen3.metadata.requests.get")
+@patch("gen3.metadata.requests.Session.get")
 def test_get_index_key_paths(requests_mock):
     """
     Test getting index key paths
@@ -117,7 +119,7 @@ def test_get_index_key_paths(requests_mock):
     assert response == expected_response
 
 
-@patch("gen3.metadata.requests.get")
+@patch("gen3.metadata.requests.Session.get")
 def test_get_index_key_paths_error(requests_mock):
     """
     Test getting key paths error
@@ -140,7 +142,7 @@ def test_get_index_key_paths_error(requests_mock):
         response = metadata.get_index_key_paths()
 
 
-@patch("gen3.metadata.requests.post")
+@patch("gen3.metadata.requests.Session.post")
 def test_create_index_key_paths(requests_mock):
     """
     Test creating index key paths
@@ -166,7 +168,7 @@ def test_create_index_key_paths(requests_mock):
     assert response == expected_response
 
 
-@patch("gen3.metadata.requests.post")
+@patch("gen3.metadata.requests.Session.post")
 def test_create_index_key_paths_error(requests_mock):
     """
     Test create index key paths error
@@ -190,7 +192,7 @@ def test_create_index_key_paths_error(requests_mock):
         response = metadata.create_index_key_path(path)
 
 
-@patch("gen3.metadata.requests.delete")
+@patch("gen3.metadata.requests.Session.delete")
 def test_delete_index_key_path(requests_mock):
     """
     Test deleting the index key path
@@ -216,7 +218,7 @@ def test_delete_index_key_path(requests_mock):
     assert response.status_code == 204
 
 
-@patch("gen3.metadata.requests.delete")
+@patch("gen3.metadata.requests.Session.delete")
 def test_delete_index_key_paths_error(requests_mock):
     """
     Test deleting the index key path error
@@ -241,7 +243,7 @@ def test_delete_index_key_paths_error(requests_mock):
         response = metadata.delete_index_key_path(path)
 
 
-@patch("gen3.metadata.requests.get")
+@patch("gen3.metadata.requests.Session.get")
 def test_query(requests_mock):
     """
     Test querying for guids
@@ -268,7 +270,7 @@ def test_query(requests_mock):
     assert response == expected_response
 
 
-@patch("gen3.metadata.requests.get")
+@patch("gen3.metadata.requests.Session.get")
 def test_query_full_metadata(requests_mock):
     """
     Test querying for guids with full data
@@ -329,7 +331,7 @@ def test_query_full_metadata(requests_mock):
     assert response == expected_response
 
 
-@patch("gen3.metadata.requests.post")
+@patch("gen3.metadata.requests.Session.post")
 def test_batch_create(requests_mock):
     """
     Test batch creation
@@ -365,7 +367,50 @@ def test_batch_create(requests_mock):
     assert response == expected_response
 
 
-@patch("gen3.metadata.requests.post")
+def test_async_batch_create():
+    """
+    Test asynchronous batch creation, against a local server
+    """
+    metadata_list = [
+        {"guid": "3c42c819-1dfe-4c3e-8d46-c3ec7eb99bf4", "data": {"foo": "bar"}},
+        {"guid": "dfa1a1dc-98f4-46be-ba8f-ae9b42b0ee50", "data": {"foo": "bar"}},
+    ]
+    expected_response = {
+        "created": ["3c42c819-1dfe-4c3e-8d46-c3ec7eb99bf4"],
+        "updated": ["dfa1a1dc-98f4-46be-ba8f-ae9b42b0ee50"],
+        "conflict": [],
+    }
+    requests = []
+
+    async def _handler(request):
+        requests.append((request.path, dict(request.query), await request.json()))
+        return web.json_response(expected_response, status=201)
+
+    async def _batch_create():
+        app = web.Application()
+        app.router.add_post("/mds-admin/metadata", _handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        try:
+            async with Gen3Metadata(f"http://127.0.0.1:{port}") as metadata:
+                return await metadata.async_batch_create(metadata_list)
+        finally:
+            await runner.cleanup()
+
+    loop = asyncio.new_event_loop()
+    try:
+        response = loop.run_until_complete(_batch_create())
+    finally:
+        loop.close()
+
+    assert response == expected_response
+    assert requests == [("/mds-admin/metadata", {"overwrite": "True"}, metadata_list)]
+
+
+@patch("gen3.metadata.requests.Session.post")
 def test_create(requests_mock):
     """
     Test creating for guids
@@ -392,7 +437,7 @@ def test_create(requests_mock):
     assert response == expected_response
 
 
-@patch("gen3.metadata.requests.put")
+@patch("gen3.metadata.requests.Session.put")
 def test_update(requests_mock):
     """
     Test updating for guids
@@ -419,7 +464,7 @@ def test_update(requests_mock):
     assert response == expected_response
 
 
-@patch("gen3.metadata.requests.delete")
+@patch("gen3.metadata.requests.Session.delete")
 def test_delete(requests_mock):
     """
     Test deleting guids
@@ -443,3 +488,27 @@ def test_delete(requests_mock):
     response = metadata.delete(guid=guid)
 
     assert response == expected_response
+
+
+def test_session_is_shared_and_only_closed_when_owned():
+    """
+    Test that an injected session is used for requests and left open on close,
+    while a session created by the client gets closed
+    """
+    session = MagicMock(requests.Session)
+    mocked_response = MagicMock(requests.Response)
+    mocked_response.status_code = 200
+    mocked_response.json.return_value = {"foo": "bar"}
+    session.get.return_value = mocked_response
+
+    with Gen3Metadata("https://example.com", session=session) as metadata:
+        assert metadata.get("1234") == {"foo": "bar"}
+        assert metadata.get("5678") == {"foo": "bar"}
+
+    assert session.get.call_count == 2
+    session.close.assert_not_called()
+
+    with patch("gen3.utils.requests.Session.close") as close_mock:
+        with Gen3Metadata("https://example.com") as metadata:
+            pass
+        close_mock.assert_called_once()
@@ -11,7 +11,7 @@ def test_get(sub):
     get_dictionary_all
 
     """
-    with patch("gen3.submission.requests") as mock_request:
+    with patch.object(sub, "_session") as mock_request:
         mock_request.status_code = 200
         mock_request.get().text = '{ "key": "value" }'
         assert sub.get_programs()
@@ -31,7 +31,7 @@ def test_export_node(sub):
     export_node
 
     """
-    with patch("gen3.submission.requests") as mock_request:
+    with patch.object(sub, "_session") as mock_request:
         mock_request.status_code = 200
         mock_request.get().text = '{ "key": "value" }'
         resp = sub.export_node("DEV", "test", "experiment", "json", "node_file.json")
@@ -42,7 +42,7 @@ def test_export_node(sub):
 
 def test_create_program(sub):
 
-    with patch("gen3.submission.requests") as mock_request:
+    with patch.object(sub, "_session") as mock_request:
         mock_request.status_code = 200
         mock_request.json.return_value = '{ "key": "value" }'
         p = sub.create_program(
@@ -57,7 +57,7 @@ def test_create_program(sub):
 
 def test_delete_program(sub):
 
-    with patch("gen3.submission.requests") as mock_request:
+    with patch.object(sub, "_session") as mock_request:
         mock_request.status_code = 200
         mock_request.json.return_value = '{ "key": "value" }'
         sub.delete_program("programmjm")
@@ -65,7 +65,7 @@ def test_delete_program(sub):
 
 def test_create_project(sub):
 
-    with patch("gen3.submission.requests") as mock_request:
+    with patch.object(sub, "_session") as mock_request:
         mock_request.status_code = 200
         mock_request.json.return_value = '{ "key": "value" }'
         pj = sub.create_project(
@@ -84,21 +84,21 @@ def test_create_project(sub):
 
 def test_delete_project(sub):
 
-    with patch("gen3.submission.requests") as mock_request:
+    with patch.object(sub, "_session") as mock_request:
         mock_request.status_code = 200
         mock_request.json.return_value = '{ "key": "value" }'
         dpj = sub.delete_project("programmjm", "projectmjm")
 
 
 def test_open_project(sub):
-    with patch("gen3.submission.requests") as mock_request:
+    with patch.object(sub, "_session") as mock_request:
         mock_request.status_code = 200
         mock_request.json.return_value = '{ "key": "value" }'
         assert sub.open_project("programmjm", "projectmjm")
 
 
 def test_submit_record(sub):
-    with patch("gen3.submission.requests") as mock_request:
+    with patch.object(sub, "_session") as mock_request:
         mock_request.status_code = 200
         mock_request.json.return_value = '{ "key": "value" }'
         rec = sub.submit_record(
@@ -114,7 +114,7 @@ def test_submit_record(sub):
 
 
 def test_export_record(sub):
-    with patch("gen3.submission.requests") as mock_request:
+    with patch.object(sub, "_session") as mock_request:
         mock_request.status_code = 200
         mock_request.get().text = '{ "key": "value" }'
         sub.export_record("prog1", "proj1", "id", "json", "record_file.json")
@@ -124,14 +124,14 @@ def test_export_record(sub):
 
 
 def test_delete_record(sub):
-    with patch("gen3.submission.requests") as mock_request:
+    with patch.object(sub, "_session") as mock_request:
         mock_request.status_code = 200
         mock_request.json.return_value = '{ "key": "value" }'
         sub.delete_record("prog1", "proj1", "id")
 
 
-@patch("gen3.jobs.requests.post")
-@patch("gen3.jobs.requests.delete")
+@patch("gen3.submission.requests.Session.post")
+@patch("gen3.submission.requests.Session.delete")
 def test_delete_nodes(requests_delete_mock, requests_post_mock, sub):
     def get_mocked_query_response(node_name, uuids):
         content = {"data": {node_name: [{"id": uuid} for uuid in uuids]}}
@@ -168,7 +168,7 @@ def test_delete_nodes(requests_delete_mock, requests_post_mock, sub):
 
 
 def test_query(sub):
-    with patch("gen3.submission.requests") as mock_request:
+    with patch.object(sub, "_session") as mock_request:
         mock_request.status_code = 200
         mock_request.post().text = '{ "key": "value" }'
         res = sub.query("{ experiment { submitter_id } }")
@@ -0,0 +1,209 @@
+import asyncio
+import random
+
+import pytest
+
+from gen3.tools.utils import (
+    AsyncPipeline,
+    get_sample_error_rates,
+    iter_sorted,
+    sample_items,
+    wilson_interval,
+)
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_pipeline_streams_output(tmpdir):
+    """
+    Test that the pipeline only reads ahead as far as the bounded queue allows and
+    writes every consumer output line to the output file.
+    """
+    output_filename = str(tmpdir.join("output.log"))
+    read = []
+    read_when_first_processed = []
+
+    def _items():
+        for item in range(100):
+            read.append(item)
+            yield item
+
+    async def _consumer(queue, output_queue):
+        item = await queue.get()
+        while item != "DONE":
+            if not read_when_first_processed:
+                read_when_first_processed.append(len(read))
+            await output_queue.put(f"processed {item}")
+            item = await queue.get()
+
+    async def _pipeline():
+        async with AsyncPipeline(
+            output_filename, num_consumers=2, queue_size=4, line_ending="\n"
+        ) as pipeline:
+            await pipeline.output_queue.put("start")
+            await pipeline.run(_items(), _consumer)
+
+    _run(_pipeline())
+
+    assert read_when_first_processed[0] <= 5
+    with open(output_filename) as output:
+        lines = output.read().splitlines()
+    assert lines[0] == "start"
+    assert sorted(lines[1:]) == sorted(f"processed {item}" for item in range(100))
+
+
+def test_pipeline_consumer_failure(tmpdir):
+    """
+    Test that a failing consumer stops the pipeline and raises instead of hanging,
+    and that the output produced until then is written.
+    """
+    output_filename = str(tmpdir.join("output.log"))
+
+    async def _consumer(queue, output_queue):
+        item = await queue.get()
+        while item != "DONE":
+            if item == 3:
+                raise ValueError("failed to process")
+            await output_queue.put(f"processed {item}")
+            item = await queue.get()
+
+    async def _pipeline():
+        async with AsyncPipeline(output_filename, num_consumers=1) as pipeline:
+            await pipeline.run(range(1000), _consumer)
+
+    with pytest.raises(ValueError):
+        _run(_pipeline())
+
+    with open(output_filename) as output:
+        assert output.read() == "processed 0processed 1processed 2"
+
+
+@pytest.mark.parametrize("queue_size", [1, 100])
+def test_pipeline_output_failure(tmpdir, queue_size):
+    """
+    Test that failing to write the output stops the pipeline and raises instead
+    of the consumers blocking forever on the full output queue.
+    """
+    output_filename = str(tmpdir.join("missing", "output.log"))
+    processed = []
+
+    async def _consumer(queue, output_queue):
+        item = await queue.get()
+        while item != "DONE":
+            processed.append(item)
+            await output_queue.put(f"processed {item}")
+            item = await queue.get()
+
+    async def _pipeline():
+        async with AsyncPipeline(
+            output_filename, num_consumers=2, queue_size=queue_size
+        ) as pipeline:
+            await pipeline.run(range(1000), _consumer)
+
+    with pytest.raises(FileNotFoundError):
+        _run(asyncio.wait_for(_pipeline(), 10))
+
+    assert len(processed) < 1000
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 100, 1000])
+def test_iter_sorted(tmpdir, chunk_size):
+    """
+    Test that items are sorted the same whether they fit in a single chunk or are
+    sorted in chunks on disk, and that the temporary files are removed.
+    """
+    items = [[f"guid{random.randint(0, 50)}", {"index": i}] for i in range(100)]
+
+    assert list(
+        iter_sorted(
+            items, key=lambda item: item[0], chunk_size=chunk_size, temp_dir=str(tmpdir)
+        )
+    ) == sorted(items, key=lambda item: item[0])
+    assert tmpdir.listdir() == []
+
+
+def test_sample_items():
+    """
+    Test that a sample has the requested size, keeps the order of the items and is
+    the same for the same seed.
+    """
+    sample = sample_items(iter(range(10000)), 100, seed=42)
+
+    assert len(sample) == 100
+    assert sample == sorted(set(sample))
+    assert sample == sample_items(range(10000), 100, seed=42)
+    assert sample != sample_items(range(10000), 100, seed=43)
+    assert sample_items(range(10), 100) == list(range(10))
+
+
+def test_sample_items_stratified():
+    """
+    Test that every stratum gets a share of a stratified sample proportional to its
+    number of items.
+    """
+    items = [{"project": "big"}] * 9000 + [{"project": "small"}] * 990
+    items += [{"project": "tiny"}] * 10
+    sample = sample_items(items, 100, seed=1, get_stratum=lambda item: item["project"])
+
+    assert len(sample) == 100
+    assert [item["project"] for item in sample].count("big") == 90
+    assert [item["project"] for item in sample].count("small") == 10
+
+
+def test_sample_items_too_many_strata():
+    """
+    Test that a stratified sample refuses more strata than it's allowed to hold a
+    reservoir for, instead of growing without bounds.
+    """
+    items = [{"guid": f"guid{i}"} for i in range(20)]
+
+    assert len(sample_items(items, 5, get_stratum=lambda item: item["guid"])) == 5
+    with pytest.raises(ValueError):
+        sample_items(items, 5, get_stratum=lambda item: item["guid"], max_strata=10)
+
+
+def test_wilson_interval():
+    """
+    Test the Wilson score interval against known values.
+    """
+    low, high = wilson_interval(12, 1000)
+    assert low == pytest.approx(0.00688, abs=1e-5)
+    assert high == pytest.approx(0.02086, abs=1e-5)
+
+    low, high = wilson_interval(0, 100)
+    assert low == 0.0
+    assert high == pytest.approx(0.03699, abs=1e-5)
+
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+
+
+def test_get_sample_error_rates():
+    """
+    Test that error rates count rows with any error, overall and for every field
+    and stratum.
+    """
+    errors = {"guid1": {"authz", "md5"}, "guid3": {"no_record"}}
+
+    error_rates = get_sample_error_rates(
+        errors, ["guid1", "guid2", "guid3", "guid4"], ["a", "a", "b", "b"]
+    )
+
+    assert error_rates["rows"] == 4
+    assert error_rates["rows_with_errors"] == 2
+    assert error_rates["error_rate"] == 0.5
+    assert error_rates["confidence_interval"] == wilson_interval(2, 4)
+    assert {
+        field: rates["rows_with_errors"]
+        for field, rates in error_rates["fields"].items()
+    } == {"authz": 1, "md5": 1, "no_record": 1}
+    assert {
+        stratum: (rates["rows"], rates["rows_with_errors"])
+        for stratum, rates in error_rates["strata"].items()
+    } == {"a": (2, 1), "b": (2, 1)}
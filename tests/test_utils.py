@@ -0,0 +1,260 @@
+import asyncio
+import threading
+from unittest.mock import patch
+
+import pytest
+from aiohttp import web
+
+from gen3.index import Gen3Index
+from gen3.utils import _parse_list_str, _split_list_str, create_async_session
+
+
+def _run(coroutine, loop=None):
+    """
+    Run the coroutine in a new event loop, closed afterwards, or in the given one
+    """
+    if loop is not None:
+        return loop.run_until_complete(coroutine)
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_async_session_is_reused_and_closed():
+    """
+    Test that a client creates a single session for all of its requests and
+    closes it in async_close.
+    """
+
+    async def _test():
+        index = Gen3Index("http://localhost")
+        session = await index._get_async_session()
+        assert await index._get_async_session() is session
+        assert not session.closed
+
+        await index.async_close()
+        assert session.closed
+
+        # a new session is created if the client is used again
+        new_session = await index._get_async_session()
+        assert new_session is not session
+        await index.async_close()
+        assert new_session.closed
+
+    _run(_test())
+
+
+def test_async_session_closed_on_exit():
+    """
+    Test that the session a client created is closed when leaving its async
+    context manager.
+    """
+
+    async def _test():
+        async with Gen3Index("http://localhost") as index:
+            session = await index._get_async_session()
+            assert not session.closed
+        return session
+
+    assert _run(_test()).closed
+
+
+def test_injected_async_session_is_not_closed():
+    """
+    Test that a session passed in by the caller is used for requests and never
+    closed by the client.
+    """
+
+    async def _test():
+        async with create_async_session() as session:
+            async with Gen3Index("http://localhost", async_session=session) as index:
+                assert await index._get_async_session() is session
+                await index.async_close()
+                assert not session.closed
+                assert await index._get_async_session() is session
+            assert not session.closed
+        assert session.closed
+
+    _run(_test())
+
+
+def test_async_session_created_for_new_event_loop():
+    """
+    Test that a new session is created when a client is used from a different
+    event loop, since aiohttp sessions are bound to the loop they were created in.
+    """
+    index = Gen3Index("http://localhost")
+    first_loop = asyncio.new_event_loop()
+    second_loop = asyncio.new_event_loop()
+    try:
+        first_session = _run(index._get_async_session(), first_loop)
+        assert _run(index._get_async_session(), first_loop) is first_session
+
+        second_session = _run(index._get_async_session(), second_loop)
+        assert second_session is not first_session
+        assert not first_session.closed
+
+        _run(index.async_close(), second_loop)
+        assert second_session.closed
+        _run(first_session.close(), first_loop)
+    finally:
+        first_loop.close()
+        second_loop.close()
+
+
+def test_iter_all_records_closed_early():
+    """
+    Test that closing the records generator early doesn't wait for the request
+    for the next page, which is already running in the background
+    """
+    next_page_requested = threading.Event()
+    release_next_page = threading.Event()
+    next_page_returned = threading.Event()
+
+    def _get_records_after(start=None, limit=None):
+        if start is None:
+            return [{"did": "guid1"}, {"did": "guid2"}]
+        next_page_requested.set()
+        release_next_page.wait(5)
+        next_page_returned.set()
+        return []
+
+    index = Gen3Index("http://localhost")
+    with patch.object(index, "_get_records_after", _get_records_after):
+        records = index.iter_all_records(limit=2)
+        assert next(records) == {"did": "guid1"}
+        assert next_page_requested.wait(10)
+
+        records.close()
+        assert not next_page_returned.is_set()
+        release_next_page.set()
+
+
+@pytest.mark.parametrize(
+    "list_str,expected",
+    [
+        # bracketed, comma separated
+        ("[a, b]", ["a", "b"]),
+        ("[a,b]", ["a", "b"]),
+        ("  [a ,  b]  ", ["a", "b"]),
+        # quoted
+        ("['a', 'b']", ["'a'", "'b'"]),
+        ('["a", "b"]', ['"a"', '"b"']),
+        # space separated
+        ("a b", ["a", "b"]),
+        ("a    b", ["a", "b"]),
+        ("a, ,b", ["a", "b"]),
+        ("a", ["a"]),
+        # only spaces and commas separate items, other whitespace is kept
+        ("a\tb", ["a\tb"]),
+        ("[\ta]", ["\ta"]),
+        # whatever is left between the brackets and the items is an empty item
+        ("[ a, b ]", ["", "a", "b", ""]),
+        ("[[a]]", ["a"]),
+        ("[ ]", ["", ""]),
+        ("[]", [""]),
+        ("", [""]),
+        (" , ", [""]),
+    ],
+)
+def test_split_list_str(list_str, expected):
+    """
+    Test that lists from manifests are split the same way they always have been
+    """
+    assert _split_list_str(list_str) == expected
+
+
+@pytest.mark.parametrize(
+    "list_str,expected,expected_unescaped",
+    [
+        ("[a, b]", ["a", "b"], ["a", "b"]),
+        ("['a', \"b\"]", ["a", "b"], ["a", "b"]),
+        ("a b", ["a", "b"], ["a", "b"]),
+        ("[\ta, 'b' ]", ["a", "b", ""], ["a", "b", ""]),
+        (
+            "[s3://bucket/file%20name.txt, 'gs://bucket/file.txt']",
+            ["s3://bucket/file%20name.txt", "gs://bucket/file.txt"],
+            ["s3://bucket/file name.txt", "gs://bucket/file.txt"],
+        ),
+        # quotes are removed before unescaping and whitespace is stripped before
+        # both, so an escaped space at the end of an item is kept
+        ("a%2'0 b%20", ["a%20", "b%20"], ["a ", "b "]),
+        ("", [""], [""]),
+    ],
+)
+def test_parse_list_str(list_str, expected, expected_unescaped):
+    """
+    Test that items of lists from manifests are stripped of whitespace and quotes,
+    and spaces unescaped, the same way they always have been
+    """
+    assert _parse_list_str(list_str) == expected
+    assert _parse_list_str(list_str, unescape_spaces=True) == expected_unescaped
+
+
+def test_async_get_records_retries_failed_requests():
+    """
+    Test that a bulk request for records that fails with a server error is
+    retried, against a local server failing the first request
+    """
+    requests = []
+
+    async def _handler(request):
+        requests.append(await request.json())
+        if len(requests) == 1:
+            return web.Response(status=500)
+        return web.json_response([{"did": did} for did in requests[-1]])
+
+    async def _get_records():
+        app = web.Application()
+        app.router.add_post("/index/bulk/documents", _handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        try:
+            async with Gen3Index(f"http://127.0.0.1:{port}") as index:
+                return await index.async_get_records(["guid1", "guid2"])
+        finally:
+            await runner.cleanup()
+
+    assert _run(_get_records()) == [{"did": "guid1"}, {"did": "guid2"}]
+    assert requests == [["guid1", "guid2"]] * 2
+
+
+def test_async_get_record_not_found():
+    """
+    Test that requesting a record that doesn't exist returns None, without
+    retrying, against a local server only knowing about one record
+    """
+    requests = []
+
+    async def _handler(request):
+        guid = request.match_info["guid"]
+        requests.append(guid)
+        if guid != "guid1":
+            return web.Response(status=404)
+        return web.json_response({"did": guid, "rev": "abc123"})
+
+    async def _get_record():
+        app = web.Application()
+        app.router.add_get("/index/index/{guid}", _handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        try:
+            async with Gen3Index(f"http://127.0.0.1:{port}") as index:
+                return (
+                    await index.async_get_record("guid1"),
+                    await index.async_get_record("guid2"),
+                )
+        finally:
+            await runner.cleanup()
+
+    assert _run(_get_record()) == ({"did": "guid1", "rev": "abc123"}, None)
+    assert requests == ["guid1", "guid2"]
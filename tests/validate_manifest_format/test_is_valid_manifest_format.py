@@ -331,3 +331,53 @@ def test_is_valid_manifest_with_missing_url_column_and_error_on_empty_url(caplog
     )
     assert missing_size_message in caplog.text
     assert result == False
+
+
+@pytest.mark.parametrize(
+    "manifest",
+    [
+        "tests/validate_manifest_format/manifests/manifest_with_many_types_of_errors.tsv",
+        "tests/validate_manifest_format/manifests/manifest_with_invalid_urls.tsv",
+        "tests/validate_manifest_format/manifests/manifest_with_empty_url.tsv",
+        "tests/validate_manifest_format/manifests/manifest_with_wide_row.tsv",
+        "tests/test_manifest.csv",
+    ],
+)
+def test_is_valid_manifest_format_using_workers(caplog, manifest):
+    """
+    Test that validating with multiple processes logs the same warnings and
+    errors, in the same order, as validating in a single process
+    """
+    logging.getLogger().setLevel(logging.WARNING)
+    result = is_valid_manifest_format(manifest)
+    serial_messages = [record.getMessage() for record in caplog.records]
+    caplog.clear()
+
+    assert is_valid_manifest_format(manifest, workers=2) == result
+    assert [record.getMessage() for record in caplog.records] == serial_messages
+
+
+def test_is_valid_manifest_format_using_workers_with_many_chunks(caplog, tmpdir):
+    """
+    Test that line numbers of errors are correct when the manifest is split
+    into many chunks
+    """
+    manifest = tmpdir.join("manifest.tsv")
+    lines = ["md5\tsize\turl\tauthz"]
+    for i in range(1000):
+        md5 = "invalid_md5" if i % 97 == 0 else f"{i:032x}"
+        size = "invalid_int" if i % 101 == 0 else str(i)
+        lines.append(f"{md5}\t{size}\ts3://bucket/key_{i}\t/programs/DEV")
+        if i % 250 == 0:
+            # blank lines are skipped and not counted as a line
+            lines.append("")
+    manifest.write("\n".join(lines) + "\n")
+
+    result = is_valid_manifest_format(str(manifest))
+    serial_messages = [record.getMessage() for record in caplog.records]
+    caplog.clear()
+
+    assert result == False
+    assert 'line 2, "md5" value "invalid_md5"' in serial_messages[0]
+    assert is_valid_manifest_format(str(manifest), workers=4) == result
+    assert [record.getMessage() for record in caplog.records] == serial_messages
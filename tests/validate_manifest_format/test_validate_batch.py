@@ -0,0 +1,95 @@
+import warnings
+
+import pandas as pd
+import pytest
+
+from gen3.tools.indexing.manifest_columns import (
+    MD5Validator,
+    SizeValidator,
+    URLValidator,
+    AuthzValidator,
+    EmptyWarning,
+    MultiValueError,
+)
+
+VALUES = [
+    "1596f493ba9ec53023fca640fb69bd3b",  # pragma: allowlist secret
+    '"1596f493ba9ec53023fca640fb69bd3B"',  # pragma: allowlist secret
+    "FZbUk4unsFAj/KZA+rNvWQ==",  # pragma: allowlist secret
+    "FZbUk4unsFAj/KZA+rNvWR==",  # pragma: allowlist secret
+    "invalid_md5",
+    "42",
+    '"42"',
+    " 42",
+    "-1",
+    "3.4",
+    "",
+    None,
+    "s3://bucket/key",
+    "S3://bucket/key",
+    "['s3://bucket/key', 'gs://bucket/key']",
+    "[s3://bucket/key, wrong://bucket/key]",
+    "s3://bucket/ http://bucket/key",
+    "s3://bucket/key;params",
+    "[]",
+    "/programs/DEV",
+    "//programs//DEV//",
+    "/programs//DEV",
+    "['/programs/DEV', 'invalid_authz']",
+]
+
+
+def validate(validator, value):
+    """
+    Validate a single value, returning the error raised if any
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", EmptyWarning)
+        try:
+            validator.validate("" if value is None else value)
+        except (EmptyWarning, ValueError) as e:
+            return e
+
+
+@pytest.mark.parametrize(
+    "validator",
+    [
+        MD5Validator(),
+        MD5Validator(allow_base64_encoding=True),
+        SizeValidator(),
+        URLValidator(),
+        URLValidator(allowed_protocols=["s3", "http"], error_on_empty=True),
+        AuthzValidator(),
+    ],
+)
+def test_validate_batch(validator):
+    """
+    Test that validate_batch returns the same errors as validating each value
+    one at a time
+    """
+    expected = [
+        (index, type(error), str(error))
+        for index, error in (
+            (index, validate(validator, value)) for index, value in enumerate(VALUES)
+        )
+        if error is not None
+    ]
+    errors = validator.validate_batch(VALUES)
+    assert [(index, type(error), str(error)) for index, error in errors] == expected
+
+
+def test_validate_batch_with_series():
+    """
+    Test that validate_batch returns the index labels of a pandas.Series, and
+    treats missing values as empty
+    """
+    values = pd.Series(
+        ["/programs/DEV", "invalid_authz", float("nan"), "['/a', 'b', 'c']"],
+        index=[10, 20, 30, 40],
+    )
+    errors = AuthzValidator().validate_batch(values)
+
+    assert [index for index, _ in errors] == [20, 30, 40]
+    assert type(errors[0][1]) is ValueError
+    assert type(errors[1][1]) is EmptyWarning
+    assert type(errors[2][1]) is MultiValueError